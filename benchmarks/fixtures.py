@@ -0,0 +1,119 @@
+"""Deterministic fixtures for the memory benchmark.
+
+The feeds mimic arXiv's RSS format (one item per announced paper, abstract in the
+description). Recorded feeds can be used instead, e.g. the gzipped snapshots kept
+by the notifier's feed archive (see memory.py --feeds-dir).
+"""
+import gzip
+import hashlib
+import hmac
+import importlib.util
+import json
+import os
+import random
+import sys
+from typing import Dict, List
+from xml.sax.saxutils import escape
+
+NOTIFIER_SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "services", "notifier", "src")
+
+_WORDS = (
+    "model learning network data graph neural spatial temporal traffic mobility privacy federated "
+    "representation synthetic urban trajectory prediction transformer attention diffusion optimization "
+    "benchmark robust efficient scalable framework method analysis empirical theoretical bound"
+).split()
+# マッチング段階の負荷を実運用に近づけるため、一部のエントリはデフォルトプロファイルに一致させる
+_MATCHING_TITLES = ("Graph Neural Network for Traffic Prediction", "Transformer models of Human Mobility")
+
+LLM_RESPONSE = json.dumps({
+    "summary": "要約1行目\n要約2行目\n要約3行目",
+    "importance": 4,
+    "theme_id": 1,
+    "reason": "ベンチマーク用の記録済み応答",
+}, ensure_ascii=False)
+
+
+def _sentence(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(_WORDS) for _ in range(words))
+
+
+def arxiv_feed(category: str, entries: int, match_rate: float = 0.05, seed: int = 0) -> bytes:
+    """Builds an arXiv-style RSS document with `entries` items (~1.3 KB abstract each)."""
+    rng = random.Random(f"{category}:{seed}")
+    items = []
+    for i in range(entries):
+        arxiv_id = f"2601.{i:05d}"
+        title = rng.choice(_MATCHING_TITLES) if rng.random() < match_rate else _sentence(rng, 8).title()
+        abstract = _sentence(rng, 180)
+        items.append(
+            "<item>"
+            f"<title>{escape(title)}</title>"
+            f"<link>https://arxiv.org/abs/{arxiv_id}</link>"
+            f"<description>arXiv:{arxiv_id}v1 Announce Type: new \nAbstract: {escape(abstract)}</description>"
+            f"<guid isPermaLink=\"false\">oai:arXiv.org:{arxiv_id}v1</guid>"
+            f"<category>{category}.LG</category>"
+            "<pubDate>Mon, 19 Jan 2026 00:00:00 -0500</pubDate>"
+            "<arxiv:announce_type>new</arxiv:announce_type>"
+            f"<dc:creator>{escape(_sentence(rng, 4).title())}</dc:creator>"
+            "</item>"
+        )
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<rss xmlns:arxiv="http://arxiv.org/schemas/atom" xmlns:dc="http://purl.org/dc/elements/1.1/" version="2.0">'
+        f"<channel><title>{category} updates on arXiv.org</title>{''.join(items)}</channel></rss>"
+    ).encode("utf-8")
+
+
+def recorded_feeds(directory: str) -> List[bytes]:
+    """Reads recorded feed bodies (plain or .gz) from a directory, in file name order."""
+    feeds = []
+    for name in sorted(os.listdir(directory)):
+        path = os.path.join(directory, name)
+        opener = gzip.open if name.endswith(".gz") else open
+        with opener(path, "rb") as f:
+            feeds.append(f.read())
+    return feeds
+
+
+def create_notifier_store(path: str) -> None:
+    """Creates the shared database with the notifier's schema (the listener only requires it)."""
+    sys.path.append(NOTIFIER_SRC)
+    try:
+        spec = importlib.util.spec_from_file_location("notifier_storage", os.path.join(NOTIFIER_SRC, "storage.py"))
+        storage = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(storage)
+    finally:
+        sys.path.remove(NOTIFIER_SRC)
+    storage.PaperStore(path).close()
+
+
+def sheet_column(rows: int) -> Dict[str, List[List[str]]]:
+    """A values().get() response with one arXiv URL per row."""
+    return {"values": [[f"https://arxiv.org/abs/2512.{i:05d}"] for i in range(rows)]}
+
+
+def signed_reaction_events(
+    signing_secret: str, message_ts: List[str], events: int, timestamp: int, seed: int = 0,
+) -> List[Dict[str, object]]:
+    """API Gateway events for reaction_added/removed, signed like Slack does."""
+    rng = random.Random(seed)
+    result = []
+    for i in range(events):
+        body = json.dumps({
+            "type": "event_callback",
+            "event_id": f"Ev{i:08d}",
+            "event": {
+                "type": "reaction_added" if rng.random() < 0.8 else "reaction_removed",
+                "user": f"U{rng.randrange(50):04d}",
+                "reaction": rng.choice(["tada", "eyes", "+1", "fire"]),
+                "item": {"type": "message", "channel": "CBENCH", "ts": rng.choice(message_ts)},
+            },
+        })
+        basestring = f"v0:{timestamp}:{body}".encode("utf-8")
+        signature = "v0=" + hmac.new(signing_secret.encode("utf-8"), basestring, hashlib.sha256).hexdigest()
+        # 同一署名はリプレイとして拒否されるため、イベントごとに本文 (event_id) を変えている
+        result.append({
+            "headers": {"X-Slack-Request-Timestamp": str(timestamp), "X-Slack-Signature": signature},
+            "body": body,
+        })
+    return result
@@ -0,0 +1,466 @@
+"""Memory benchmark and Lambda memory sizing for the notifier and listener.
+
+Each service runs in fresh interpreters (so import costs are measured from a
+cold start) against recorded fixtures, with Slack, OpenAI, Google Sheets and the
+feed downloads faked:
+
+    python benchmarks/memory.py                       # both services, checked against the baseline
+    python benchmarks/memory.py --service listener
+    python benchmarks/memory.py --feeds-dir <dir>     # recorded feeds (e.g. feed archive snapshots)
+    python benchmarks/memory.py --update-baseline
+
+Every service is measured twice:
+
+- stages: each step on its own under tracemalloc, for the Python allocations it
+  adds (stable between runs, used for attribution and the regression check).
+- invocation: a cold invocation of lambda_handler without tracing (tracemalloc
+  inflates both RSS and CPU time), sampling the RSS that Lambda bills as
+  "Max Memory Used" and the CPU time of one invocation.
+
+The recommended memory size is the smallest Lambda size that keeps headroom
+above the invocation's RSS peak and finishes its CPU work within the service's
+target, given that Lambda allocates CPU in proportion to memory (one full vCPU
+at 1769 MB).
+
+The exit status is 1 when a stage's traced growth or the invocation's RSS peak
+grew past --threshold compared with benchmarks/memory_baseline.json.
+"""
+import argparse
+import json
+import logging
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from types import SimpleNamespace
+from typing import Any, Dict, Iterator, List, Optional
+from unittest.mock import MagicMock, patch
+
+import fixtures
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "memory_baseline.json")
+SERVICES = ("notifier", "listener")
+MB = 1024 * 1024
+
+LAMBDA_SIZES_MB = (128, 256, 512, 1024, 1536, 2048, 3008)
+FULL_VCPU_MB = 1769
+# 現在の設定 (docs/ARCHITECTURE.md)
+CONFIGURED_MB = {"notifier": 512, "listener": 128}
+# 1回の呼び出しのCPU時間の目標 (割り当てられたCPUでの時間。listener は Slack の3秒制限より十分短く)
+CPU_TARGET_SEC = {"notifier": 30.0, "listener": 0.25}
+# 計測ノイズ (GC のタイミング、RSS のサンプリング間隔) を回帰とみなさないための絶対値の余裕
+ABSOLUTE_SLACK_MB = 2.0
+
+
+def rss_bytes() -> int:
+    """Current resident set size (falls back to the peak where /proc is unavailable)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+class RssSampler(threading.Thread):
+    """Samples the RSS in the background and keeps the peak since the last reset."""
+
+    def __init__(self, interval_sec: float = 0.005):
+        super().__init__(daemon=True)
+        self.interval_sec = interval_sec
+        self._peak = rss_bytes()
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+
+    def run(self) -> None:
+        while not self._stop_event.wait(self.interval_sec):
+            self.sample()
+
+    def sample(self) -> None:
+        current = rss_bytes()
+        with self._lock:
+            self._peak = max(self._peak, current)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._peak = rss_bytes()
+
+    def peak(self) -> int:
+        self.sample()
+        with self._lock:
+            return self._peak
+
+    def stop(self) -> None:
+        self._stop_event.set()
+
+
+class StageMeter:
+    """Measures consecutive stages in this process.
+
+    Args:
+        traced (bool): Record Python allocations with tracemalloc. Otherwise only
+            the RSS peak and CPU time are recorded.
+    """
+
+    def __init__(self, traced: bool):
+        self.traced = traced
+        self.stages: List[Dict[str, Any]] = []
+        self.sampler = RssSampler()
+        self.sampler.start()
+        if traced:
+            tracemalloc.start()
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        if self.traced:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+        self.sampler.reset()
+        cpu_started = time.process_time()
+        yield
+        record: Dict[str, Any] = {"stage": name, "cpu_sec": round(time.process_time() - cpu_started, 3)}
+        if self.traced:
+            current, peak = tracemalloc.get_traced_memory()
+            # growth: この段階のピークまでの増分、retained: 段階の終了後も残った分
+            record["traced_growth_mb"] = round((peak - before) / MB, 2)
+            record["retained_mb"] = round((current - before) / MB, 2)
+        else:
+            record["rss_peak_mb"] = round(self.sampler.peak() / MB, 1)
+        self.stages.append(record)
+
+    def close(self) -> None:
+        self.sampler.stop()
+        if self.traced:
+            tracemalloc.stop()
+
+
+# ---------------------------------------------------------------------------
+# Fakes
+# ---------------------------------------------------------------------------
+
+def fake_openai_client(**kwargs: Any) -> Any:
+    """openai.OpenAI replacement that answers every request with the recorded response."""
+    message = SimpleNamespace(content=fixtures.LLM_RESPONSE)
+    response = SimpleNamespace(choices=[SimpleNamespace(message=message)])
+    return SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=lambda **_: response)))
+
+
+def fake_sheets_build(values: Dict[str, Any]) -> MagicMock:
+    """googleapiclient build() replacement whose values().get() returns the recorded rows."""
+    service = MagicMock()
+    service.spreadsheets.return_value.values.return_value.get.return_value.execute.return_value = values
+    return MagicMock(return_value=service)
+
+
+class FakeFeedResponse:
+    status_code = 200
+
+    def __init__(self, content: bytes):
+        self.content = content
+        self.headers: Dict[str, str] = {}
+
+
+class FakeSlack:
+    def __init__(self):
+        self.posts = 0
+
+    def chat_postMessage(self, **kwargs: Any) -> Dict[str, Any]:
+        self.posts += 1
+        return {"ts": f"1768000000.{self.posts:06d}", "channel": "CBENCH"}
+
+
+class FakeContext:
+    def get_remaining_time_in_millis(self) -> int:
+        return 900000
+
+
+def _service_env(service: str, tmp: str) -> None:
+    """Points the service at temporary state and dummy credentials."""
+    for name in ("SLACK_API_TOKEN", "POSTED_REGISTRY_PATH", "AWS_LAMBDA_FUNCTION_NAME"):
+        os.environ.pop(name, None)
+    os.environ.update({
+        "PAPER_DB_PATH": os.path.join(tmp, "papers.sqlite3"),
+        "SPREADSHEET_ID": "bench-spreadsheet",
+        "GOOGLE_SERVICE_ACCOUNT_JSON": "{}",
+    })
+    if service == "notifier":
+        os.environ.update({
+            "OPENAI_API_KEY": "bench",
+            "FEED_ARCHIVE_DIR": os.path.join(tmp, "feed_archive"),
+            "FULLTEXT_CACHE_DIR": os.path.join(tmp, "pdf_cache"),
+            "EXPORT_DIR": os.path.join(tmp, "export"),
+        })
+    else:
+        os.environ.update({"SLACK_SIGNING_SECRET": "bench-secret", "LOG_SAMPLE_RATE": "0"})
+    sys.path.insert(0, os.path.join(ROOT, "services", service, "src"))
+
+
+# ---------------------------------------------------------------------------
+# Scenarios (run in the child process)
+# ---------------------------------------------------------------------------
+
+def measure_notifier(args: argparse.Namespace, meter: StageMeter, invocation: bool) -> Dict[str, Any]:
+    with meter.stage("imports"):
+        import main
+
+    if args.feeds_dir:
+        raw_feeds = fixtures.recorded_feeds(args.feeds_dir)[:len(main.RSS_FEEDS)]
+    else:
+        raw_feeds = [fixtures.arxiv_feed(url.rsplit("/", 1)[-1], args.entries) for url in main.RSS_FEEDS]
+    feed_urls = main.RSS_FEEDS[:len(raw_feeds)]
+    sheet_values = fixtures.sheet_column(args.sheet_rows)
+    inputs = {
+        "feeds": len(raw_feeds),
+        "feed_mb": round(sum(len(raw) for raw in raw_feeds) / MB, 1),
+        "recorded": bool(args.feeds_dir),
+        "sheet_rows": args.sheet_rows,
+    }
+
+    if not invocation:
+        with meter.stage("feed parse"):
+            feeds = [(url, main.feedparser.parse(raw).entries) for url, raw in zip(feed_urls, raw_feeds)]
+        with meter.stage("candidate list"):
+            matched = main.match_profiles(feeds, main.load_profiles())
+        candidates = [paper for reservoir in matched.values() for paper in reservoir.items()]
+        with meter.stage("LLM responses"), patch.object(main.openai, "OpenAI", fake_openai_client):
+            for paper in candidates[:args.llm_calls]:
+                main.generate_paper_summary(paper.title, paper.summary)
+        with meter.stage("Sheets reads"), \
+                patch.object(main, "build", fake_sheets_build(sheet_values)), \
+                patch.object(main.service_account.Credentials, "from_service_account_info"):
+            main.get_existing_paper_ids()
+        return {"inputs": {**inputs, "llm_calls": min(args.llm_calls, len(candidates))}}
+
+    # 1回の通知実行 (取得 → 照合 → 要約 → 投稿 → 保存) を丸ごと計測する。Sheets の書き込み (ミラー) は対象外
+    responses = dict(zip(feed_urls, raw_feeds))
+    slack = FakeSlack()
+    with meter.stage("handler"), \
+            patch.object(main, "RSS_FEEDS", feed_urls), \
+            patch.object(main.requests, "get", lambda url, **_: FakeFeedResponse(responses[url])), \
+            patch.object(main.openai, "OpenAI", fake_openai_client), \
+            patch.object(main, "build", fake_sheets_build(sheet_values)), \
+            patch.object(main.service_account.Credentials, "from_service_account_info"), \
+            patch.object(main, "mirror_to_sheets"), \
+            patch.object(main, "publish_registry"), \
+            patch.object(main.time, "sleep"), \
+            patch.object(main, "slack_client", slack):
+        main.lambda_handler({}, FakeContext())
+    return {"inputs": {**inputs, "posts": slack.posts}, "invocation_cpu_sec": meter.stages[-1]["cpu_sec"]}
+
+
+def measure_listener(args: argparse.Namespace, meter: StageMeter, invocation: bool) -> Dict[str, Any]:
+    with meter.stage("imports"):
+        import main
+
+    message_ts = [f"1768000000.{i:06d}" for i in range(args.sheet_rows)]
+    fixtures.create_notifier_store(main.PAPER_DB_PATH)
+    store = main.ReactionStore(main.PAPER_DB_PATH)
+    with store.conn:
+        store.conn.executemany(
+            "INSERT INTO papers (entry_id, profile, title, theme_id, slack_ts, channel, created_at)"
+            " VALUES (?, 'default', ?, 1, ?, 'CBENCH', '2026-01-19T00:00:00+00:00')",
+            [(f"https://arxiv.org/abs/2601.{i:05d}", f"Paper {i}", ts) for i, ts in enumerate(message_ts)])
+    store.close()
+    events = fixtures.signed_reaction_events("bench-secret", message_ts, args.events, int(time.time()))
+
+    # ウォームコンテナが連続したイベントを処理する状況 (1回の呼び出しのCPU時間はその平均)
+    with meter.stage("handler"):
+        for event in events:
+            main.lambda_handler(event, None)
+    invocation_cpu_sec = meter.stages[-1]["cpu_sec"] / max(1, len(events))
+
+    # PAPER_DB_PATH なしの構成: Google API クライアントの遅延インポートとG列の読み込み
+    sheet_values = {"values": [[ts] for ts in message_ts]}
+    with meter.stage("Sheets reads"), patch.object(main, "PAPER_DB_PATH", None):
+        import sheets
+        with patch.object(sheets, "build", fake_sheets_build(sheet_values)), \
+                patch.object(sheets.service_account.Credentials, "from_service_account_info"):
+            for ts in message_ts[-args.sheet_updates:]:
+                main.update_reaction_in_sheets(ts, "tada")
+    return {
+        "inputs": {"events": len(events), "sheet_rows": args.sheet_rows, "sheet_updates": args.sheet_updates},
+        "invocation_cpu_sec": invocation_cpu_sec,
+    }
+
+
+def measure(service: str, invocation: bool, args: argparse.Namespace) -> Dict[str, Any]:
+    """Runs one service's scenario in this (fresh) process."""
+    meter = StageMeter(traced=not invocation)
+    scenario = measure_notifier if service == "notifier" else measure_listener
+    with tempfile.TemporaryDirectory() as tmp:
+        _service_env(service, tmp)
+        # サービスのログはベンチマークの出力 (JSON) と混ざらないよう捨てる
+        logging.disable(logging.CRITICAL)
+        with open(os.devnull, "w") as devnull, patch.object(sys, "stdout", devnull):
+            outcome = scenario(args, meter, invocation)
+    meter.close()
+    return {**outcome, "stages": meter.stages}
+
+
+# ---------------------------------------------------------------------------
+# Report (parent process)
+# ---------------------------------------------------------------------------
+
+def run_child(service: str, invocation: bool, args: argparse.Namespace) -> Dict[str, Any]:
+    command = [
+        sys.executable, os.path.abspath(__file__), "--measure", service,
+        "--entries", str(args.entries), "--sheet-rows", str(args.sheet_rows), "--llm-calls", str(args.llm_calls),
+        "--events", str(args.events), "--sheet-updates", str(args.sheet_updates),
+    ]
+    if args.feeds_dir:
+        command += ["--feeds-dir", args.feeds_dir]
+    if invocation:
+        command.append("--invocation")
+    completed = subprocess.run(command, capture_output=True, text=True, check=False)
+    if completed.returncode != 0:
+        raise RuntimeError(f"{service} benchmark failed:\n{completed.stderr}")
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def run_service(service: str, args: argparse.Namespace) -> Dict[str, Any]:
+    stages = run_child(service, False, args)
+    invocation = run_child(service, True, args)
+    return {
+        "service": service,
+        "inputs": {**stages["inputs"], **invocation["inputs"]},
+        "stages": stages["stages"],
+        "invocation": {
+            "stages": invocation["stages"],
+            "rss_peak_mb": max(s["rss_peak_mb"] for s in invocation["stages"]),
+            "cpu_sec": round(invocation["invocation_cpu_sec"], 4),
+        },
+    }
+
+
+def recommend(result: Dict[str, Any], headroom: float) -> Dict[str, Any]:
+    """Picks the smallest Lambda size with RSS headroom whose scaled CPU time meets the target.
+
+    CPU time measured on this machine is scaled by FULL_VCPU_MB / size below one
+    full vCPU; above it the single-threaded handler does not get faster.
+    """
+    service = result["service"]
+    required_mb = result["invocation"]["rss_peak_mb"] * headroom
+    options = []
+    for size in LAMBDA_SIZES_MB:
+        cpu_sec = result["invocation"]["cpu_sec"] * max(1.0, FULL_VCPU_MB / size)
+        options.append({
+            "memory_mb": size,
+            "fits": size >= required_mb,
+            "cpu_sec": round(cpu_sec, 3),
+            "gb_sec": round(size / 1024 * cpu_sec, 4),
+        })
+    fitting = [o for o in options if o["fits"]]
+    within_target = [o for o in fitting if o["cpu_sec"] <= CPU_TARGET_SEC[service]]
+    # 目標を満たすサイズがなければ、それ以上速くならないフルvCPU相当の最小サイズ
+    choice = (within_target or [o for o in fitting if o["memory_mb"] >= FULL_VCPU_MB] or fitting[-1:])[0]
+    return {
+        "required_mb": round(required_mb, 1),
+        "recommended_mb": choice["memory_mb"],
+        "configured_mb": CONFIGURED_MB[service],
+        "cpu_target_sec": CPU_TARGET_SEC[service],
+        "options": options,
+    }
+
+
+def regressions(result: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """Lists the peaks that grew past the threshold compared with the baseline."""
+    found = []
+
+    def check(label: str, value: float, base: Optional[float]) -> None:
+        if base is not None and value > base * (1 + threshold) + ABSOLUTE_SLACK_MB:
+            found.append(f"{result['service']}: {label} {value:.1f} MB > baseline {base:.1f} MB (+{threshold:.0%})")
+
+    base_stages = {s["stage"]: s for s in baseline.get("stages", [])}
+    for stage in result["stages"]:
+        if stage["stage"] in base_stages:
+            check(f"{stage['stage']} traced growth", stage["traced_growth_mb"],
+                  base_stages[stage["stage"]]["traced_growth_mb"])
+    check("invocation RSS peak", result["invocation"]["rss_peak_mb"], baseline.get("invocation", {}).get("rss_peak_mb"))
+    return found
+
+
+def print_report(result: Dict[str, Any], sizing: Dict[str, Any]) -> None:
+    print(f"\n== {result['service']} ({', '.join(f'{k}={v}' for k, v in result['inputs'].items())})")
+    print(f"{'stage (traced)':<18}{'growth':>10}{'retained':>12}{'CPU s':>9}")
+    for s in result["stages"]:
+        print(f"{s['stage']:<18}{s['traced_growth_mb']:>7.1f} MB{s['retained_mb']:>9.1f} MB{s['cpu_sec']:>9.3f}")
+    print(f"{'stage (invocation)':<18}{'RSS peak':>10}{'':>12}{'CPU s':>9}")
+    for s in result["invocation"]["stages"]:
+        print(f"{s['stage']:<18}{s['rss_peak_mb']:>7.1f} MB{'':>12}{s['cpu_sec']:>9.3f}")
+    print(f"\n{'memory MB':>10}{'CPU s/inv':>11}{'GB-s/inv':>10}")
+    for o in sizing["options"]:
+        notes = [] if o["fits"] else ["too small"]
+        if o["memory_mb"] == sizing["recommended_mb"]:
+            notes.append("recommended")
+        if o["memory_mb"] == sizing["configured_mb"]:
+            notes.append("configured")
+        print(f"{o['memory_mb']:>10}{o['cpu_sec']:>11.3f}{o['gb_sec']:>10.4f}  {', '.join(notes)}")
+    print(f"RSS peak {result['invocation']['rss_peak_mb']:.1f} MB needs {sizing['required_mb']:.0f} MB with headroom; "
+          f"recommended {sizing['recommended_mb']} MB (configured {sizing['configured_mb']} MB, "
+          f"CPU target {sizing['cpu_target_sec']} s per invocation)")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Memory benchmark and Lambda memory sizing")
+    parser.add_argument("--service", choices=SERVICES, action="append", help="Service to measure (default: both)")
+    parser.add_argument("--feeds-dir", help="Directory of recorded feed bodies (plain or .gz) used instead of synthetic feeds")
+    parser.add_argument("--entries", type=int, default=1500, help="Entries per synthetic feed")
+    parser.add_argument("--sheet-rows", type=int, default=5000, help="Rows returned by Sheets reads")
+    parser.add_argument("--llm-calls", type=int, default=20, help="Summaries generated in the LLM stage")
+    parser.add_argument("--events", type=int, default=1000, help="Reaction events sent to the listener")
+    parser.add_argument("--sheet-updates", type=int, default=20, help="Direct Sheets updates in the listener")
+    parser.add_argument("--headroom", type=float, default=1.3, help="Memory size / RSS peak factor")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed relative growth over the baseline")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="Baseline JSON file")
+    parser.add_argument("--update-baseline", action="store_true", help="Write the results as the new baseline")
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON")
+    parser.add_argument("--measure", choices=SERVICES, help=argparse.SUPPRESS)
+    parser.add_argument("--invocation", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        print(json.dumps(measure(args.measure, args.invocation, args)))
+        return 0
+
+    results = {service: run_service(service, args) for service in (args.service or SERVICES)}
+    sizing = {service: recommend(result, args.headroom) for service, result in results.items()}
+    if args.json:
+        print(json.dumps({"results": results, "sizing": sizing}, indent=2))
+    else:
+        for service, result in results.items():
+            print_report(result, sizing[service])
+
+    try:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    except FileNotFoundError:
+        baseline = {}
+    if args.update_baseline:
+        baseline.update(results)
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=2)
+            f.write("\n")
+        print(f"\nBaseline written to {args.baseline}", file=sys.stderr)
+        return 0
+
+    found = []
+    for service, result in results.items():
+        if service not in baseline:
+            print(f"\n{service}: no baseline; run with --update-baseline.", file=sys.stderr)
+        elif baseline[service]["inputs"] != result["inputs"]:
+            print(f"\n{service}: inputs differ from the baseline; not compared.", file=sys.stderr)
+        else:
+            found += regressions(result, baseline[service], args.threshold)
+    for line in found:
+        print(f"REGRESSION {line}", file=sys.stderr)
+    return 1 if found else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
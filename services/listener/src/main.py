@@ -1,15 +1,36 @@
 import json
 import os
 from slack_sdk.signature import SignatureVerifier
-from googleapiclient.discovery import build
-from google.oauth2 import service_account
 import emoji
-from typing import Dict, Any
+from typing import Dict, Any, Optional
+from store import ReactionStore
+from registry import is_posted, load_registry
+from prefilter import ReplayGuard, RequestLog, classify_event, header
 
 # Env Vars
 SLACK_SIGNING_SECRET = os.environ.get("SLACK_SIGNING_SECRET")
 SPREADSHEET_ID = os.environ.get("SPREADSHEET_ID")
 GOOGLE_CREDS = os.environ.get("GOOGLE_SERVICE_ACCOUNT_JSON")
+# 共有ローカルDB (設定時はSheetsではなくこちらに記録し、Notifierがミラーする)
+PAPER_DB_PATH = os.environ.get("PAPER_DB_PATH")
+# Notifierが書き出す投稿済みメッセージの一覧 (未設定・未作成の場合は全イベントを処理する)
+POSTED_REGISTRY_PATH = os.environ.get("POSTED_REGISTRY_PATH")
+# リクエストログを出力する割合 (件数は全リクエスト分を集計して出力)
+LOG_SAMPLE_RATE = float(os.environ.get("LOG_SAMPLE_RATE", "0.05"))
+# これより古い (または未来の) タイムスタンプのリクエストは拒否する (Slack推奨: 5分)
+MAX_REQUEST_AGE_SEC = 300
+
+# ウォームスタート間で再利用する
+replay_guard = ReplayGuard(MAX_REQUEST_AGE_SEC)
+request_log = RequestLog(LOG_SAMPLE_RATE)
+_verifier = None
+
+def get_verifier() -> SignatureVerifier:
+    """Returns the SignatureVerifier for the current signing secret, created once per container."""
+    global _verifier
+    if _verifier is None or _verifier.signing_secret != SLACK_SIGNING_SECRET:
+        _verifier = SignatureVerifier(SLACK_SIGNING_SECRET)
+    return _verifier
 
 def verify_slack_signature(headers: Dict[str, str], body: str) -> bool:
     """Verifies the Slack request signature using the signing secret.
@@ -25,11 +46,11 @@ def verify_slack_signature(headers: Dict[str, str], body: str) -> bool:
         print("Warning: SLACK_SIGNING_SECRET not set. Skipping verification (unsafe).")
         return True # For local testing? No, unsafe.
 
-    verifier = SignatureVerifier(SLACK_SIGNING_SECRET)
+    verifier = get_verifier()
     
-    # Getting headers. API Gateway headers might be dict or list.
-    timestamp = headers.get("x-slack-request-timestamp") or headers.get("X-Slack-Request-Timestamp")
-    signature = headers.get("x-slack-signature") or headers.get("X-Slack-Signature")
+    # Getting headers. API Gateway may keep the client's header casing.
+    timestamp = header(headers, "x-slack-request-timestamp")
+    signature = header(headers, "x-slack-signature")
 
     if not timestamp or not signature:
          print("Missing timestamp or signature headers.")
@@ -41,9 +62,27 @@ def verify_slack_signature(headers: Dict[str, str], body: str) -> bool:
         signature=signature
     )
 
+def is_notifier_message(item: Dict[str, Any]) -> bool:
+    """Checks a reaction's target message against the notifier's posted message registry.
+
+    Args:
+        item (Dict[str, Any]): The "item" of a reaction event (channel and ts).
+
+    Returns:
+        bool: False only if the registry is published and does not contain the message.
+    """
+    if not POSTED_REGISTRY_PATH:
+        return True
+    keys = load_registry(POSTED_REGISTRY_PATH)
+    if keys is None:
+        return True
+    return is_posted(keys, item.get("channel", ""), item.get("ts", ""))
+
 def update_reaction_in_sheets(slack_ts: str, reaction: str) -> bool:
     """Updates the Google Sheet with the reaction for a specific message.
 
+    The Sheets client is imported on first use (see sheets.py).
+
     Args:
         slack_ts (str): The timestamp of the Slack message (Column G identifier).
         reaction (str): The reaction emoji or name to append.
@@ -51,71 +90,79 @@ def update_reaction_in_sheets(slack_ts: str, reaction: str) -> bool:
     Returns:
         bool: True if the update was successful, False otherwise.
     """
-    if not GOOGLE_CREDS or not SPREADSHEET_ID:
-        print("Missing Google credentials.")
-        return False
+    import sheets
 
+    return sheets.update_reaction_in_sheets(SPREADSHEET_ID, GOOGLE_CREDS, slack_ts, reaction)
+
+def record_reaction(slack_ts: str, reaction: str, user: str = "") -> bool:
+    """Records a reaction in the local store, or directly in Sheets if no store is configured.
+
+    Args:
+        slack_ts (str): The timestamp of the Slack message.
+        reaction (str): The reaction emoji or name.
+        user (str, optional): The Slack user ID who reacted.
+
+    Returns:
+        bool: True if the reaction belongs to a notifier post and was recorded, False otherwise.
+    """
+    if not PAPER_DB_PATH:
+        return update_reaction_in_sheets(slack_ts, reaction)
+
+    store = ReactionStore(PAPER_DB_PATH)
     try:
-        creds_info = json.loads(GOOGLE_CREDS)
-        creds = service_account.Credentials.from_service_account_info(creds_info)
-        service = build('sheets', 'v4', credentials=creds)
-
-        # 1. Search for the row with this slack_ts (Column G)
-        # Using a simple scan for now. 
-        # Ideally, we read Column G (A1 notation G:G) and find the index.
-        range_name = "G:G" 
-        result = service.spreadsheets().values().get(
-            spreadsheetId=SPREADSHEET_ID, range=range_name).execute()
-        rows = result.get('values', [])
-        
-        target_row_index = -1
-        # rows is list of lists [['ts1'], ['ts2'], ...]
-        # Note: 1-based index. 
-        for i, row in enumerate(rows):
-            if row and row[0] == slack_ts:
-                target_row_index = i + 1 # 1-based
-                break
-        
-        if target_row_index == -1:
-            print(f"Timestamp {slack_ts} not found in sheet.")
+        if not store.has_message(slack_ts):
+            print(f"Timestamp {slack_ts} not found in store.")
             return False
+        if not store.add_reaction(slack_ts, reaction, user):
+            print(f"Reaction '{reaction}' already recorded for {slack_ts}. Skipping update.")
+        return True
+    finally:
+        store.close()
 
-        # 2. Update Column H (Reactions) at that row
-        # We append the reaction. First read existing? Or just append to a list string?
-        # Let's read H match.
-        h_range = f"H{target_row_index}"
-        h_result = service.spreadsheets().values().get(
-            spreadsheetId=SPREADSHEET_ID, range=h_range).execute()
-        current_val = h_result.get('values', [[]])[0]
-        current_text = current_val[0] if current_val else ""
-        
-        # Avoid duplicate reaction logging?
-        # Slack sends event for every user.
-        # Maybe format: "thumbsup(user1), heart(user2)" or just "thumbsup, heart"
-        # User requested: "Append the emoji name."
-        
-        # Deduplication check
-        current_reactions = [r.strip() for r in current_text.split(',')] if current_text else []
-        if reaction in current_reactions:
-            print(f"Reaction '{reaction}' already exists for row {target_row_index}. Skipping update.")
-            return True
+def unrecord_reaction(slack_ts: str, reaction: str, user: str = "") -> bool:
+    """Removes a reaction from the local store (reaction_removed).
 
-        new_text = f"{current_text}, {reaction}" if current_text else reaction
-        
-        service.spreadsheets().values().update(
-            spreadsheetId=SPREADSHEET_ID,
-            range=h_range,
-            valueInputOption="RAW",
-            body={'values': [[new_text]]}
-        ).execute()
-        
-        print(f"Updated row {target_row_index} with reaction: {reaction}")
-        return True
+    Without a local store the Sheets column is append-only and removals are ignored.
 
-    except Exception as e:
-        print(f"Error updating sheet: {e}")
+    Args:
+        slack_ts (str): The timestamp of the Slack message.
+        reaction (str): The reaction emoji or name.
+        user (str, optional): The Slack user ID who removed the reaction.
+
+    Returns:
+        bool: True if a recorded reaction was removed, False otherwise.
+    """
+    if not PAPER_DB_PATH:
+        print("Reaction removals require PAPER_DB_PATH. Ignoring.")
         return False
 
+    store = ReactionStore(PAPER_DB_PATH)
+    try:
+        return store.remove_reaction(slack_ts, reaction, user)
+    finally:
+        store.close()
+
+def reaction_display_name(reaction: str) -> str:
+    """Converts a Slack reaction name (e.g. "tada") to its Unicode emoji (🎉).
+
+    Custom emojis that cannot be converted keep their name. The notifier's reaction
+    reconciler converts names the same way (services/notifier/src/reconcile.py).
+
+    Args:
+        reaction (str): The Slack reaction name.
+
+    Returns:
+        str: The emoji, or the reaction name as a fallback.
+    """
+    try:
+        # emoji.emojize needs colons, e.g. :tada: (language='alias' supports Slack/GitHub style codes)
+        # If it is not found, the input string ":reaction:" is returned unchanged.
+        reaction_emoji = emoji.emojize(f":{reaction}:", language='alias')
+    except Exception as e:
+        print(f"Emoji conversion failed: {e}")
+        return reaction
+    return reaction if reaction_emoji == f":{reaction}:" else reaction_emoji
+
 def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     """AWS Lambda entry point for the Listener service.
 
@@ -126,28 +173,66 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     Returns:
         Dict[str, Any]: The API Gateway response object.
     """
-    print(f"Received event: {json.dumps(event)}")
-    
     # 1. Parse body and headers
     # API Gateway Proxy Integration wraps real request.
-    headers = event.get("headers", {})
-    body = event.get("body", "")
-    
-    # 2. Verify Signature
+    headers = event.get("headers") or {}
+    body = event.get("body") or ""
+    timestamp = header(headers, "x-slack-request-timestamp")
+    signature = header(headers, "x-slack-signature")
+    retry = header(headers, "x-slack-retry-num")
+
+    # 2. Reject stale or replayed requests before computing the signature
+    rejection = replay_guard.check(timestamp, signature)
+    if rejection:
+        request_log.record(rejection, timestamp=timestamp, retry=retry)
+        return {'statusCode': 401, 'body': 'Stale or replayed request'}
+
+    # 3. Verify Signature
     if not verify_slack_signature(headers, body):
+        request_log.record("invalid_signature", retry=retry)
         return {
             'statusCode': 401,
             'body': 'Invalid signature'
         }
-    
-    # 3. Parse JSON Body
+
+    # 4. Handle the verified request. The signature is remembered only once it has been handled,
+    # so a Slack retry after a 500 is processed instead of being rejected as a replay
+    response = handle_verified_request(body, retry)
+    if response['statusCode'] < 500:
+        replay_guard.remember(signature)
+    return response
+
+def handle_verified_request(body: str, retry: Optional[str]) -> Dict[str, Any]:
+    """Handles a request whose signature has been verified.
+
+    Args:
+        body (str): The raw request body.
+        retry (Optional[str]): Slack's retry number header, for logging.
+
+    Returns:
+        Dict[str, Any]: The API Gateway response object. A 500 asks Slack to retry.
+    """
+    # 1. Classify the event type on the raw body; unhandled events are acknowledged without decoding
+    if classify_event(body) is None:
+        request_log.record("unhandled", bytes=len(body), retry=retry)
+        return {'statusCode': 200, 'body': 'OK'}
+
+    # 2. Parse JSON Body
     try:
         data = json.loads(body)
     except ValueError:
+        request_log.record("bad_json", bytes=len(body))
         return {'statusCode': 400, 'body': 'Bad JSON'}
 
+    # 3. Drop reactions to messages the notifier did not post (before touching the store or Sheets)
+    slack_event = data.get("event") or {}
+    if slack_event.get("type") in ("reaction_added", "reaction_removed") and not is_notifier_message(slack_event.get("item", {})):
+        request_log.record("foreign_message", event_type=slack_event.get("type"), retry=retry)
+        return {'statusCode': 200, 'body': 'OK'}
+
     # 4. URL Verification (Slack Challenge)
     if data.get("type") == "url_verification":
+        request_log.record("url_verification")
         return {
             'statusCode': 200,
             'headers': {'Content-Type': 'text/plain'},
@@ -159,7 +244,7 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         slack_event = data["event"]
         event_type = slack_event.get("type")
         
-        if event_type == "reaction_added":
+        if event_type in ("reaction_added", "reaction_removed"):
             # https://api.slack.com/events/reaction_added
             # { "type": "reaction_added", "user": "U123", "reaction": "thumbsup", "item": { "type": "message", "channel": "C123", "ts": "123.456" } ... }
             reaction = slack_event.get("reaction")
@@ -167,27 +252,19 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             ts = item.get("ts")
             
             if ts and reaction:
-                # Convert Slack reaction name (e.g. "tada") to Unicode Emoji (🎉)
-                # language='alias' supports Slack/GitHub style codes
+                reaction_display = reaction_display_name(reaction)
+                user = slack_event.get("user", "")
                 try:
-                    # emoji.emojize needs colons, e.g. :tada:
-                    # But custom emojis won't convert and just stay as text (which is desired fallback)
-                    reaction_emoji = emoji.emojize(f":{reaction}:", language='alias')
-                    # If conversion failed (returned same string with colons), strip colons to keep original text
-                    # Wait, emojize returns the string with colons if not found? No, it returns strictly what was passed if not found (v2 behavior might vary).
-                    # Actually, if it fails, it returns the input string ":reaction:".
-                    # Let's check if it starts and ends with colon, if so, revert to raw name?
-                    # Or just save the unicode if successful, else raw name.
-                    if reaction_emoji == f":{reaction}:":
-                         reaction_display = reaction
+                    if event_type == "reaction_added":
+                        recorded = record_reaction(ts, reaction_display, user)
                     else:
-                         reaction_display = reaction_emoji
+                        recorded = unrecord_reaction(ts, reaction_display, user)
                 except Exception as e:
-                    print(f"Emoji conversion failed: {e}")
-                    reaction_display = reaction
-
-                print(f"Reaction added: {reaction} (Display: {reaction_display}) to message {ts}")
-                update_reaction_in_sheets(ts, reaction_display)
+                    # 記録は冪等なので、500を返してSlackに再送させる
+                    request_log.record("handler_error", level="error", event_type=event_type, ts=ts,
+                                       reaction=reaction_display, error=repr(e), retry=retry)
+                    return {'statusCode': 500, 'body': 'Internal error'}
+                request_log.record(event_type, ts=ts, reaction=reaction_display, recorded=recorded, retry=retry)
         
     return {
         'statusCode': 200,
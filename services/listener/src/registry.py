@@ -0,0 +1,32 @@
+"""Read side of the notifier's posted message registry (see services/notifier/src/registry.py).
+
+The registry file holds one "channel:ts" key per line. It is parsed once per
+container and re-read only when its modification time changes.
+"""
+import os
+from typing import Dict, FrozenSet, Optional, Tuple
+
+# チャンネルIDが不明な投稿は ts のみで照合する (Notifier側と同じ値)
+ANY_CHANNEL = "*"
+
+# path -> (mtime, keys)
+_cache: Dict[str, Tuple[float, FrozenSet[str]]] = {}
+
+
+def load_registry(path: str) -> Optional[FrozenSet[str]]:
+    """Returns the registered keys, or None if the registry has not been published yet."""
+    try:
+        mtime = os.stat(path).st_mtime
+    except OSError:
+        return None
+    cached = _cache.get(path)
+    if cached is None or cached[0] != mtime:
+        with open(path) as f:
+            cached = (mtime, frozenset(line.rstrip("\n") for line in f if line.strip()))
+        _cache[path] = cached
+    return cached[1]
+
+
+def is_posted(keys: FrozenSet[str], channel: str, ts: str) -> bool:
+    """Returns True if the message was posted by the notifier."""
+    return f"{channel}:{ts}" in keys or f"{ANY_CHANNEL}:{ts}" in keys
@@ -0,0 +1,86 @@
+"""Direct Google Sheets updates, used when no local store is configured.
+
+Imported lazily by main.py so that events which are dropped early never load
+the Google API client.
+"""
+import json
+from googleapiclient.discovery import build
+from google.oauth2 import service_account
+
+
+def update_reaction_in_sheets(spreadsheet_id: str, creds_json: str, slack_ts: str, reaction: str) -> bool:
+    """Updates the Google Sheet with the reaction for a specific message.
+
+    Args:
+        spreadsheet_id (str): The target spreadsheet ID.
+        creds_json (str): The service account credentials (JSON).
+        slack_ts (str): The timestamp of the Slack message (Column G identifier).
+        reaction (str): The reaction emoji or name to append.
+
+    Returns:
+        bool: True if the update was successful, False otherwise.
+    """
+    if not creds_json or not spreadsheet_id:
+        print("Missing Google credentials.")
+        return False
+
+    try:
+        creds_info = json.loads(creds_json)
+        creds = service_account.Credentials.from_service_account_info(creds_info)
+        service = build('sheets', 'v4', credentials=creds)
+
+        # 1. Search for the row with this slack_ts (Column G)
+        # Using a simple scan for now. 
+        # Ideally, we read Column G (A1 notation G:G) and find the index.
+        range_name = "G:G" 
+        result = service.spreadsheets().values().get(
+            spreadsheetId=spreadsheet_id, range=range_name).execute()
+        rows = result.get('values', [])
+        
+        target_row_index = -1
+        # rows is list of lists [['ts1'], ['ts2'], ...]
+        # Note: 1-based index. 
+        for i, row in enumerate(rows):
+            if row and row[0] == slack_ts:
+                target_row_index = i + 1 # 1-based
+                break
+        
+        if target_row_index == -1:
+            print(f"Timestamp {slack_ts} not found in sheet.")
+            return False
+
+        # 2. Update Column H (Reactions) at that row
+        # We append the reaction. First read existing? Or just append to a list string?
+        # Let's read H match.
+        h_range = f"H{target_row_index}"
+        h_result = service.spreadsheets().values().get(
+            spreadsheetId=spreadsheet_id, range=h_range).execute()
+        current_val = h_result.get('values', [[]])[0]
+        current_text = current_val[0] if current_val else ""
+        
+        # Avoid duplicate reaction logging?
+        # Slack sends event for every user.
+        # Maybe format: "thumbsup(user1), heart(user2)" or just "thumbsup, heart"
+        # User requested: "Append the emoji name."
+        
+        # Deduplication check
+        current_reactions = [r.strip() for r in current_text.split(',')] if current_text else []
+        if reaction in current_reactions:
+            print(f"Reaction '{reaction}' already exists for row {target_row_index}. Skipping update.")
+            return True
+
+        new_text = f"{current_text}, {reaction}" if current_text else reaction
+        
+        service.spreadsheets().values().update(
+            spreadsheetId=spreadsheet_id,
+            range=h_range,
+            valueInputOption="RAW",
+            body={'values': [[new_text]]}
+        ).execute()
+        
+        print(f"Updated row {target_row_index} with reaction: {reaction}")
+        return True
+
+    except Exception as e:
+        print(f"Error updating sheet: {e}")
+        return False
@@ -0,0 +1,106 @@
+"""Reaction-side access to the shared SQLite system of record.
+
+The notifier owns the schema (services/notifier/src/storage.py), including the
+triggers on the reactions table that maintain the reaction rollups. The
+listener only checks, once per container, that the tables it uses exist; it
+never creates or migrates them.
+"""
+import json
+import os
+import sqlite3
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional, Set
+
+# Listenerが読み書きするテーブルと、リアクションの集計を更新するトリガー (作成はNotifierが行う)
+REQUIRED_TABLES = ("papers", "reactions", "reaction_rollup", "theme_engagement")
+REQUIRED_TRIGGERS = ("reactions_rollup_insert", "reactions_rollup_delete")
+
+# スキーマを確認済みのDBパス。コンテナが生きている間はイベントごとに確認しない
+_verified_paths: Set[str] = set()
+
+
+# Lambdaのコンテナごとに消える領域 (notifier/src/storage.py と共通)
+EPHEMERAL_DIRS = ("/tmp",)
+
+
+def require_durable_path(path: str) -> str:
+    """Returns the store path; raises RuntimeError for ephemeral Lambda storage.
+
+    Reactions written to /tmp would only be visible to this container, never to the notifier.
+    """
+    if os.environ.get("AWS_LAMBDA_FUNCTION_NAME"):
+        real = os.path.realpath(path)
+        if any(real == d or real.startswith(d + os.sep) for d in EPHEMERAL_DIRS):
+            raise RuntimeError(
+                f"PAPER_DB_PATH={path} is ephemeral Lambda storage. Mount the notifier's durable store (e.g. EFS).")
+    return path
+
+
+class ReactionStore:
+    """Records reactions for posted papers in the local store.
+
+    Args:
+        path (str): Path of the SQLite database file shared with the notifier.
+    """
+
+    def __init__(self, path: str):
+        self.conn = sqlite3.connect(require_durable_path(path), timeout=10)
+        if path not in _verified_paths:
+            self._require_schema(path)
+            _verified_paths.add(path)
+
+    def _require_schema(self, path: str) -> None:
+        """Raises RuntimeError if the notifier has not created the shared schema yet."""
+        rows = self.conn.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger')")
+        existing = {row[0] for row in rows}
+        missing = [name for name in REQUIRED_TABLES + REQUIRED_TRIGGERS if name not in existing]
+        if missing:
+            self.conn.close()
+            raise RuntimeError(
+                f"The store at {path} lacks {', '.join(missing)}. Run the notifier once to create its schema.")
+
+    def close(self) -> None:
+        """Closes the underlying connection."""
+        self.conn.close()
+
+    def has_message(self, slack_ts: str) -> bool:
+        """Returns True if the timestamp belongs to a paper posted by the notifier."""
+        row = self.conn.execute("SELECT 1 FROM papers WHERE slack_ts = ? LIMIT 1", (slack_ts,)).fetchone()
+        return row is not None
+
+    def add_reaction(self, slack_ts: str, reaction: str, user: str = "") -> bool:
+        """Records a reaction; it is mirrored to Sheets by the notifier's replication job.
+
+        Args:
+            slack_ts (str): Timestamp of the reacted message.
+            reaction (str): Reaction display name or emoji.
+            user (str, optional): Slack user ID of the reacting user.
+
+        Returns:
+            bool: True if the reaction was new, False if it was already recorded.
+        """
+        with self.conn:
+            cursor = self.conn.execute(
+                "INSERT OR IGNORE INTO reactions (slack_ts, reaction, user, created_at) VALUES (?, ?, ?, ?)",
+                (slack_ts, reaction, user, datetime.now(timezone.utc).isoformat()),
+            )
+        return cursor.rowcount > 0
+
+    def remove_reaction(self, slack_ts: str, reaction: str, user: str = "") -> bool:
+        """Removes a reaction (reaction_removed event).
+
+        Returns:
+            bool: True if the reaction was recorded and has been removed.
+        """
+        with self.conn:
+            cursor = self.conn.execute(
+                "DELETE FROM reactions WHERE slack_ts = ? AND reaction = ? AND user = ?", (slack_ts, reaction, user))
+        return cursor.rowcount > 0
+
+    def rollup(self, slack_ts: str) -> Optional[Dict[str, Any]]:
+        """Returns the reaction rollup of a post: counts per reaction, totals and score."""
+        row = self.conn.execute(
+            "SELECT counts, reactions, users, score FROM reaction_rollup WHERE slack_ts = ?", (slack_ts,)).fetchone()
+        if row is None:
+            return None
+        return {"counts": json.loads(row[0]), "reactions": row[1], "users": row[2], "score": row[3]}
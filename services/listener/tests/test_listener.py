@@ -9,12 +9,28 @@ import importlib.util
 
 LISTENER_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
 LISTENER_PATH = os.path.join(LISTENER_DIR, "main.py")
+sys.path.insert(0, LISTENER_DIR)
 
 spec = importlib.util.spec_from_file_location("listener_lambda", LISTENER_PATH)
 listener_lambda = importlib.util.module_from_spec(spec)
 sys.modules["listener_lambda"] = listener_lambda
 spec.loader.exec_module(listener_lambda)
 
+NOTIFIER_DIR = os.path.join(os.path.dirname(os.path.dirname(LISTENER_DIR)), "notifier", "src")
+
+
+def create_notifier_store(db_path):
+    """Creates the database as the notifier does; it owns the schema and the rollup triggers."""
+    sys.path.append(NOTIFIER_DIR)
+    try:
+        storage_path = os.path.join(NOTIFIER_DIR, "storage.py")
+        storage_spec = importlib.util.spec_from_file_location("notifier_storage", storage_path)
+        storage = importlib.util.module_from_spec(storage_spec)
+        storage_spec.loader.exec_module(storage)
+    finally:
+        sys.path.remove(NOTIFIER_DIR)
+    storage.PaperStore(db_path).close()
+
 @pytest.fixture
 def mock_env(monkeypatch):
     monkeypatch.setattr(listener_lambda, "SLACK_SIGNING_SECRET", "mock_secret")
@@ -87,8 +103,8 @@ def test_lambda_handler_reaction_added(mock_update, mock_env):
         args = mock_update.call_args[0]
         assert args[0] == "1234.5678"
 
-@patch("listener_lambda.build")
-@patch("listener_lambda.service_account.Credentials.from_service_account_info")
+@patch("sheets.build")
+@patch("sheets.service_account.Credentials.from_service_account_info")
 def test_update_reaction_in_sheets_deduplication(mock_creds, mock_build, mock_env):
     """Test that existing reaction is NOT duplicated"""
     mock_service = mock_build.return_value
@@ -108,8 +124,8 @@ def test_update_reaction_in_sheets_deduplication(mock_creds, mock_build, mock_en
     assert result is True
     mock_sheets.values.return_value.update.assert_not_called()
 
-@patch("listener_lambda.build")
-@patch("listener_lambda.service_account.Credentials.from_service_account_info")
+@patch("sheets.build")
+@patch("sheets.service_account.Credentials.from_service_account_info")
 def test_update_reaction_in_sheets_append_new(mock_creds, mock_build, mock_env):
     """Test that NEW reaction is appended"""
     mock_service = mock_build.return_value
@@ -132,3 +148,180 @@ def test_update_reaction_in_sheets_append_new(mock_creds, mock_build, mock_env):
     # Check arguments
     call_args = mock_sheets.values.return_value.update.call_args[1]
     assert call_args['body']['values'] == [['Existing, New']]
+
+@patch("listener_lambda.update_reaction_in_sheets")
+def test_record_reaction_uses_local_store(mock_update, mock_env, monkeypatch, tmp_path):
+    """With a local store configured, reactions are recorded there instead of in Sheets"""
+    db_path = str(tmp_path / "papers.sqlite3")
+    monkeypatch.setattr(listener_lambda, "PAPER_DB_PATH", db_path)
+
+    create_notifier_store(db_path)
+    store = listener_lambda.ReactionStore(db_path)
+    store.conn.execute(
+        "INSERT INTO papers (entry_id, slack_ts, created_at) VALUES ('http://arxiv.org/abs/1', '1234.5678', 'now')")
+    store.conn.commit()
+
+    assert listener_lambda.record_reaction("1234.5678", "🎉", "U1") is True
+    assert listener_lambda.record_reaction("9999.0000", "🎉", "U1") is False
+
+    rows = store.conn.execute("SELECT slack_ts, reaction, user, mirrored FROM reactions").fetchall()
+    assert rows == [("1234.5678", "🎉", "U1", 0)]
+    mock_update.assert_not_called()
+
+def test_store_rejects_ephemeral_lambda_storage(mock_env, monkeypatch):
+    """Inside Lambda a store under /tmp is refused instead of silently losing reactions"""
+    monkeypatch.setenv("AWS_LAMBDA_FUNCTION_NAME", "arxiv-listener")
+    with pytest.raises(RuntimeError):
+        listener_lambda.ReactionStore("/tmp/papers.sqlite3")
+
+def test_store_requires_notifier_schema_once_per_container(mock_env, monkeypatch, tmp_path):
+    """The listener never creates tables; the notifier's schema is checked on the first open only"""
+    monkeypatch.setattr("store._verified_paths", set())
+    db_path = str(tmp_path / "papers.sqlite3")
+    with pytest.raises(RuntimeError, match="Run the notifier"):
+        listener_lambda.ReactionStore(db_path)
+
+    create_notifier_store(db_path)
+    listener_lambda.ReactionStore(db_path).close()
+    with patch("store.ReactionStore._require_schema") as mock_require:
+        listener_lambda.ReactionStore(db_path).close()
+    mock_require.assert_not_called()
+
+def test_reaction_rollup_tracks_adds_and_removals(mock_env, monkeypatch, tmp_path):
+    """Counts per emoji, distinct users and the theme engagement score follow added and removed reactions"""
+    db_path = str(tmp_path / "papers.sqlite3")
+    monkeypatch.setattr(listener_lambda, "PAPER_DB_PATH", db_path)
+
+    create_notifier_store(db_path)
+    store = listener_lambda.ReactionStore(db_path)
+    store.conn.execute(
+        "INSERT INTO papers (entry_id, profile, theme_id, slack_ts, created_at)"
+        " VALUES ('http://arxiv.org/abs/1', 'default', 3, '1234.5678', 'now')")
+    store.conn.commit()
+
+    def handle(event_type, reaction, user):
+        event = {"body": json.dumps({"event": {
+            "type": event_type, "user": user, "reaction": reaction,
+            "item": {"type": "message", "channel": "C123", "ts": "1234.5678"}}}), "headers": {}}
+        with patch("listener_lambda.verify_slack_signature", return_value=True):
+            assert listener_lambda.lambda_handler(event, None)["statusCode"] == 200
+
+    handle("reaction_added", "tada", "U1")
+    handle("reaction_added", "eyes", "U1")
+    handle("reaction_added", "tada", "U2")
+    handle("reaction_added", "tada", "U2")  # duplicate delivery
+    assert store.rollup("1234.5678") == {"counts": {"🎉": 2, "👀": 1}, "reactions": 3, "users": 2, "score": 2.25}
+
+    handle("reaction_removed", "tada", "U2")
+    handle("reaction_removed", "tada", "U2")  # already removed
+    assert store.rollup("1234.5678") == {"counts": {"🎉": 1, "👀": 1}, "reactions": 2, "users": 1, "score": 1.25}
+
+    theme_score = store.conn.execute(
+        "SELECT score_sum FROM theme_engagement WHERE profile = 'default' AND theme_id = 3").fetchone()[0]
+    assert theme_score == 1.25
+
+def test_registry_drops_reactions_to_other_messages(mock_env, monkeypatch, tmp_path):
+    """Reactions to messages missing from the notifier's registry are dropped before the Sheets client is loaded"""
+    registry_path = tmp_path / "posted_messages.txt"
+    registry_path.write_text("C123:1234.5678\n*:1111.0000\n")
+    monkeypatch.setattr(listener_lambda, "POSTED_REGISTRY_PATH", str(registry_path))
+    monkeypatch.delitem(sys.modules, "sheets", raising=False)
+
+    def handle(channel, ts):
+        event = {"body": json.dumps({"event": {
+            "type": "reaction_added", "user": "U1", "reaction": "tada",
+            "item": {"type": "message", "channel": channel, "ts": ts}}}), "headers": {}}
+        with patch("listener_lambda.verify_slack_signature", return_value=True):
+            assert listener_lambda.lambda_handler(event, None)["statusCode"] == 200
+
+    handle("C123", "9999.0000")
+    handle("C999", "1234.5678")
+    assert "sheets" not in sys.modules
+
+    with patch("listener_lambda.update_reaction_in_sheets") as mock_update:
+        handle("C123", "1234.5678")
+        handle("C999", "1111.0000")  # registered before channel IDs were recorded
+    assert [c[0][0] for c in mock_update.call_args_list] == ["1234.5678", "1111.0000"]
+
+def test_prefilter_rejects_stale_and_replayed_requests_and_skips_unhandled_events(mock_env, monkeypatch):
+    """Stale/replayed requests are rejected before verification; unhandled events are acknowledged without decoding"""
+    import time
+    from slack_sdk.signature import SignatureVerifier
+    from prefilter import ReplayGuard
+
+    monkeypatch.setattr(listener_lambda, "replay_guard", ReplayGuard(300))
+    monkeypatch.setattr(listener_lambda, "_verifier", None)
+
+    def request(body, timestamp, signature):
+        headers = {"X-Slack-Request-Timestamp": str(timestamp), "X-Slack-Signature": signature}
+        return listener_lambda.lambda_handler({"body": body, "headers": headers}, None)["statusCode"]
+
+    now = int(time.time())
+    message = json.dumps({"type": "event_callback", "event": {"type": "message", "text": "hi"}})
+    with patch("listener_lambda.SignatureVerifier", wraps=SignatureVerifier) as verifier_class, \
+         patch("slack_sdk.signature.SignatureVerifier.is_valid", return_value=True) as is_valid, \
+         patch("listener_lambda.json.loads") as loads:
+        assert request(message, now - 3600, "v0=old") == 401
+        is_valid.assert_not_called()
+
+        assert request(message, now, "v0=a") == 200
+        assert request(message, now, "v0=a") == 401  # replayed
+        assert request(message, now, "v0=b") == 200
+        loads.assert_not_called()
+
+    assert is_valid.call_count == 2
+    verifier_class.assert_called_once()
+
+def test_handler_errors_are_logged_at_error_level(mock_env, monkeypatch):
+    """A failing store write is always logged and answered with 500 so Slack retries the event"""
+    lines = []
+    monkeypatch.setattr(listener_lambda, "request_log", listener_lambda.RequestLog(sample_rate=0, emit=lines.append))
+    event = {"body": json.dumps({"event": {
+        "type": "reaction_added", "user": "U1", "reaction": "tada",
+        "item": {"type": "message", "channel": "C123", "ts": "1234.5678"}}}), "headers": {}}
+
+    with patch("listener_lambda.verify_slack_signature", return_value=True), \
+            patch("listener_lambda.record_reaction", side_effect=RuntimeError("database is locked")):
+        assert listener_lambda.lambda_handler(event, None)["statusCode"] == 500
+
+    entry = json.loads(lines[0])
+    assert (entry["level"], entry["outcome"], entry["ts"]) == ("error", "handler_error", "1234.5678")
+    assert "database is locked" in entry["error"]
+
+def test_retry_after_server_error_is_not_rejected_as_replay(mock_env, monkeypatch):
+    """A signed request answered with 500 is handled again when Slack resends it; a handled one is a replay"""
+    import time
+    from prefilter import ReplayGuard
+
+    monkeypatch.setattr(listener_lambda, "replay_guard", ReplayGuard(300))
+    event = {"body": json.dumps({"event": {
+        "type": "reaction_added", "user": "U1", "reaction": "tada",
+        "item": {"type": "message", "channel": "C123", "ts": "1234.5678"}}}),
+        "headers": {"X-Slack-Request-Timestamp": str(int(time.time())), "X-Slack-Signature": "v0=a"}}
+
+    with patch("listener_lambda.verify_slack_signature", return_value=True), \
+            patch("listener_lambda.record_reaction", side_effect=[RuntimeError("database is locked"), True]) as record:
+        assert listener_lambda.lambda_handler(event, None)["statusCode"] == 500
+        assert listener_lambda.lambda_handler(event, None)["statusCode"] == 200
+        assert listener_lambda.lambda_handler(event, None)["statusCode"] == 401
+    assert record.call_count == 2
+
+def test_request_log_is_sampled_and_keeps_exact_counts(monkeypatch):
+    """Only sampled requests are logged, as JSON lines carrying the outcome counts since the last line"""
+    from prefilter import RequestLog
+
+    lines = []
+    log = RequestLog(sample_rate=0.5, emit=lines.append)
+    draws = iter([0.9, 0.9, 0.1, 0.9])
+    monkeypatch.setattr("prefilter.random.random", lambda: next(draws))
+
+    log.record("unhandled")
+    log.record("unhandled")
+    log.record("reaction_added", ts="1.0")
+    log.record("unhandled")
+    log.record("bad_json", level="error")
+
+    assert [json.loads(line) for line in lines] == [
+        {"level": "info", "outcome": "reaction_added", "ts": "1.0", "counts": {"unhandled": 2, "reaction_added": 1}},
+        {"level": "error", "outcome": "bad_json", "counts": {"unhandled": 1, "bad_json": 1}},
+    ]
@@ -6,3 +6,164 @@ MAX_RESULTS = 100
 NUM_PAPERS = 3
 SLACK_CHANNEL = "#general"
 SLACK_PROMPT_CHANNEL = "#all-arxiv-paper-notification"
+
+# 通知プロファイル (1回のフィード取得・解析で全プロファイルを評価する)
+# name: ローカルDB上のキー / sheet_tab: 保存先シート名 (None は先頭シート)
+PROFILES = [
+    {
+        "name": "default",
+        "keywords_ai": keywords_ai,
+        "keywords_domain": keywords_domain,
+        "slack_channel": SLACK_CHANNEL,
+        "num_papers": NUM_PAPERS,
+        "sheet_tab": None,
+    },
+]
+
+# LLM settings
+LLM_MODEL = "gpt-5-mini"
+# 失敗時に順に試す安価なモデル (この後に生アブストラクトへフォールバック)
+LLM_FALLBACK_MODELS = ["gpt-5-nano"]
+# 1呼び出しあたりのデッドライン (秒)
+LLM_TIMEOUT_SEC = 60
+# ヘッジリクエストを発火するレイテンシ分位点 (0.9 = p90)
+LLM_HEDGE_PERCENTILE = 0.9
+# 観測サンプルが揃うまでのヘッジ発火までの待ち時間 (秒)
+LLM_HEDGE_DELAY_SEC = 20
+LLM_HEDGE_MIN_SAMPLES = 5
+# ヘッジに使うモデル (None の場合はプライマリと同じモデル)
+LLM_HEDGE_MODEL = None
+# 同時に実行中になりうるLLM呼び出し (要約) の数。ヘッジ用スレッドプールはこの2倍 (プライマリ + ヘッジ) を確保する
+LLM_MAX_IN_FLIGHT = 2
+# 修復不能なJSONが返ってきた場合に同じモデルへ再リクエストする回数
+LLM_MAX_REREQUESTS = 1
+
+# テーマIDと表示ラベル (未知のIDは 0: その他 に寄せる)
+THEME_LABELS = {1: "表現学習", 3: "プライバシー", 0: "その他"}
+
+# Storage / Sheets replication settings
+# ローカルDB (SQLite) のパス。必須: Listenerと共有する永続ストレージ (EFS等のマウント先) を指定する
+# Lambdaの /tmp はコンテナごとに消えるため使用不可 (storage.require_durable_path で起動時に拒否)
+PAPER_DB_PATH = None
+REPLICATION_BATCH_SIZE = 50
+REPLICATION_MAX_ATTEMPTS = 3
+REPLICATION_BACKOFF_SEC = 1.0
+# "append": 末尾に追記し行IDを固定 (新しい順はフィルタ表示で並べ替え) / "insert": 従来通り2行目に挿入
+SHEET_WRITE_MODE = "append"
+
+# Feed snapshot archive / differential processing
+# 前回スナップショットに含まれていたエントリはマッチング対象から外す
+DIFFERENTIAL_PROCESSING = True
+# スナップショットの保存先 (差分処理・リプレイに必須)。全コンテナで共有する永続ストレージ (EFS) 上に置く (Lambda では /tmp 不可)
+FEED_ARCHIVE_DIR = None
+FEED_ARCHIVE_RETENTION = 30
+# arXivの replace (改訂版の再告知) エントリをマッチング前に除外する
+SKIP_REPLACE_ANNOUNCEMENTS = False
+
+# Run scheduling / checkpoint settings (Lambda timeout: 300s)
+# 論文1件の処理 (LLM要約 + Slack投稿 + 保存) にかかる時間の初期見積もり。実測の最大値で更新される
+RUN_CYCLE_ESTIMATE_SEC = 30
+# チェックポイント保存と後続呼び出しの起動用に残しておく時間
+RUN_RESERVE_SEC = 30
+# 通知処理の定期実行の間隔 (EventBridgeのスケジュールと合わせる)
+RUN_SCHEDULE_INTERVAL_HOURS = 24
+# 時間切れで中断した実行は、非同期の後続呼び出しで同じ実行日のまま再開する (1回の実行あたりの上限回数)
+RUN_FOLLOWUP_MAX_INVOCATIONS = 5
+# これより古いチェックポイントは再開せず破棄する。後続呼び出しが尽きても次の定期実行で再開できるよう、間隔より長くする
+CHECKPOINT_MAX_AGE_HOURS = RUN_SCHEDULE_INTERVAL_HOURS + 2
+
+# Sharding / run ledger settings
+# コーディネーターモードでの分割単位: "feed" (フィードごと) / "profile" (プロファイルごと)
+SHARD_BY = "feed"
+# 各ワーカーがコーディネーターへ返す候補数の上限 (プロファイルごと。num_papers を下回る場合は num_papers)
+SHARD_SHORTLIST_SIZE = 20
+# 実行中のまま残ったプロファイル実行の権利を、別の実行が引き継げるまでの秒数 (Lambdaのタイムアウトより長くする)
+RUN_LEDGER_LEASE_SEC = 900
+# 投稿・要約ステージの権利が失効するまでの秒数 (異常終了した実行のステージを別の実行が引き継げるようにする)
+RUN_LEDGER_STAGE_LEASE_SEC = 300
+# 実行台帳のDynamoDBテーブル名 (パーティションキー "pk" 文字列、TTL属性 "expires_at")。Lambdaでは必須
+RUN_LEDGER_TABLE = None
+# 台帳の項目を残す日数 (DynamoDBのTTLで削除)
+RUN_LEDGER_TTL_DAYS = 7
+
+# Candidate selection settings
+# プロファイルごとに保持する候補数 = num_papers + この値 (投稿失敗時の予備)。マッチ件数に関わらずメモリは一定
+SELECTION_SPARE_CANDIDATES = 10
+
+# Resilience settings (circuit breakers / retries per external dependency)
+# timeout_sec: 1回の試行のタイムアウト (実行の残り時間で短縮) / max_attempts: 初回を含む試行回数
+# failure_threshold: ブレーカーを開く連続失敗数 / reset_timeout_sec: 開いたブレーカーが試行を再開するまでの秒数
+RESILIENCE = {
+    "feeds": {"timeout_sec": 20, "max_attempts": 2, "failure_threshold": 3, "reset_timeout_sec": 300},
+    # LLMはヘッジ・モデル階層で再試行するため、ここでは再試行しない
+    "openai": {"timeout_sec": LLM_TIMEOUT_SEC, "max_attempts": 1, "failure_threshold": 3, "reset_timeout_sec": 120},
+    "slack": {"timeout_sec": 10, "max_attempts": 3, "failure_threshold": 3, "reset_timeout_sec": 60},
+    "sheets": {
+        "timeout_sec": 30, "max_attempts": REPLICATION_MAX_ATTEMPTS, "failure_threshold": 3,
+        "reset_timeout_sec": 120, "backoff_sec": REPLICATION_BACKOFF_SEC,
+    },
+    "arxiv_pdf": {"timeout_sec": 30, "max_attempts": 2, "failure_threshold": 3, "reset_timeout_sec": 300},
+}
+RETRY_BACKOFF_SEC = 1.0
+RETRY_MAX_BACKOFF_SEC = 30
+# 外部呼び出しに使わずに残しておく実行時間 (秒)
+DEADLINE_MARGIN_SEC = 5
+
+# Engagement weighting settings
+# リアクションの多いテーマを優先して投稿する (反応の少ないテーマの論文は後回しにする)
+ENGAGEMENT_WEIGHTING = True
+# 最も反応の少ないテーマでも採用される確率の下限
+ENGAGEMENT_MIN_WEIGHT = 0.3
+# 評価に必要なテーマごとの最低投稿数 (未満のテーマは常に採用)
+ENGAGEMENT_MIN_POSTS = 3
+# LLMを呼ぶ前に後回しを判定するための簡易テーマ推定 (タイトル・抄録に含まれる語、小文字で照合)
+# どれにも当てはまらない論文は 0 (その他) とみなす。要約済みの論文はLLMの theme_id を使う
+THEME_KEYWORDS = {
+    1: ("representation learning", "embedding", "self-supervised", "contrastive", "pretrain", "pre-train"),
+    3: ("privacy", "differential privacy", "federated", "anonymi", "membership inference"),
+}
+
+# Posted message registry (shared with the Listener)
+# Notifierが投稿したメッセージ (channel:ts) の一覧を書き出すパス。Listenerはこれに無いメッセージへのリアクションを即座に破棄する
+# None の場合は書き出さない (EFS等、Listenerと共有できる場所を指定する)
+POSTED_REGISTRY_PATH = None
+# 登録しておく投稿の期間 (日)。これより古い投稿へのリアクションは記録されない
+POSTED_REGISTRY_RETENTION_DAYS = 180
+
+# Full-text enrichment settings
+# 投稿候補の上位 num_papers 件のみ、PDFの序論・結論の抜粋をLLMに渡す
+FULLTEXT_ENRICHMENT = False
+FULLTEXT_PDF_URL = "https://arxiv.org/pdf/{arxiv_id}"
+# ダウンロードしたPDFと抽出テキストの保存先 (内容のハッシュで管理し、同じPDFは一度しか取得しない)
+FULLTEXT_CACHE_DIR = "/tmp/pdf_cache"
+# メモリ使用量の上限: これより大きいPDFは取得を中断する / 先頭・末尾から読むページ数 / 抜粋の最大文字数
+FULLTEXT_MAX_PDF_BYTES = 20 * 1024 * 1024
+FULLTEXT_HEAD_PAGES = 3
+FULLTEXT_TAIL_PAGES = 2
+FULLTEXT_MAX_CHARS = 4000
+FULLTEXT_WORKERS = 2
+
+# Columnar export settings
+# 論文・リアクション履歴を月別パーティションの列指向ファイルへ差分出力する先 (必須)
+# S3 URI (s3://bucket/prefix) または永続ストレージ上のディレクトリ (Lambda では /tmp 不可)
+EXPORT_DIR = None
+# "parquet" または "arrow" (Arrow IPC)
+EXPORT_FORMAT = "parquet"
+# 書き込み中の行を取りこぼさないよう、この秒数より新しい行は次回の出力に回す
+EXPORT_SETTLE_SEC = 60
+
+# Polling mode settings ({"mode": "poll"} / --poll を15分間隔などで実行する)
+# 条件付きリクエスト (ETag / Last-Modified) で未更新のフィードは本文を取得しない
+# True: 新着を見つけ次第投稿 (1日の投稿数は各プロファイルの num_papers まで。定時実行は不要)
+# False: 要約済みの状態でキューに入れ、定時実行でLLMを待たずに投稿する
+POLL_POST_IMMEDIATELY = False
+# キューに入ったまま投稿されなかった論文を破棄するまでの時間
+POLL_QUEUE_MAX_AGE_HOURS = 48
+
+# Reaction reconciliation settings ({"mode": "reconcile"} / --reconcile を1日1回などで実行する)
+# Listenerが取りこぼしたリアクションを、直近この日数の投稿について conversations.history から一括取得して修正する
+RECONCILE_WINDOW_DAYS = 14
+# 1回の conversations.history で取得するメッセージ数 (Slackの推奨は200以下)
+RECONCILE_PAGE_SIZE = 200
+# ページ取得の間隔 (秒)。conversations.history は Tier 3 (毎分50回程度) のレート制限を受ける
+RECONCILE_PAGE_INTERVAL_SEC = 1.2
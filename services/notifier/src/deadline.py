@@ -0,0 +1,74 @@
+"""Time budget of a single notifier invocation.
+
+Work is planned against the Lambda's remaining time so that a paper cycle
+(LLM summary, Slack post, store write) is only started if it can finish,
+leaving a reserve for checkpointing. A run that stops early continues in an
+asynchronous follow-up invocation (schedule_followup) instead of waiting for
+the next scheduled run.
+"""
+import json
+import math
+from typing import Any, Callable, Dict, Optional
+
+import config
+
+
+class RunBudget:
+    """Decides whether another paper cycle fits in the remaining time.
+
+    The cycle estimate starts at a configured default and is raised to the
+    slowest cycle observed in this invocation.
+
+    Args:
+        remaining_ms (Optional[Callable[[], int]], optional): Returns the remaining
+            time in milliseconds. None means unlimited (CLI runs).
+        cycle_estimate_sec (float, optional): Initial estimate of one paper cycle.
+        reserve_sec (float, optional): Time kept free for finalization.
+    """
+
+    def __init__(
+        self,
+        remaining_ms: Optional[Callable[[], int]] = None,
+        cycle_estimate_sec: float = config.RUN_CYCLE_ESTIMATE_SEC,
+        reserve_sec: float = config.RUN_RESERVE_SEC,
+    ):
+        self._remaining_ms = remaining_ms
+        self.cycle_estimate_sec = cycle_estimate_sec
+        self.reserve_sec = reserve_sec
+
+    @classmethod
+    def from_context(cls, context: Any) -> "RunBudget":
+        """Builds a budget from a Lambda context (unlimited if it has no deadline)."""
+        return cls(getattr(context, "get_remaining_time_in_millis", None))
+
+    def remaining_sec(self) -> float:
+        """Returns the remaining time in seconds (inf when unlimited)."""
+        if self._remaining_ms is None:
+            return math.inf
+        return self._remaining_ms() / 1000.0
+
+    def record_cycle(self, elapsed_sec: float) -> None:
+        """Records the duration of a completed cycle."""
+        self.cycle_estimate_sec = max(self.cycle_estimate_sec, elapsed_sec)
+
+    def can_start_cycle(self) -> bool:
+        """Returns True if one more cycle plus the reserve fits in the remaining time."""
+        return self.remaining_sec() - self.reserve_sec >= self.cycle_estimate_sec
+
+
+def schedule_followup(function_name: str, event: Dict[str, Any], client: Optional[Any] = None) -> None:
+    """Invokes the function asynchronously to resume a checkpointed run.
+
+    boto3 is part of the Lambda runtime; it is imported lazily so local runs
+    without it still work.
+
+    Args:
+        function_name (str): Name or ARN of the notifier function.
+        event (Dict[str, Any]): Event of the follow-up invocation.
+        client (Optional[Any], optional): Lambda client. Defaults to boto3.client("lambda").
+    """
+    if client is None:
+        import boto3
+
+        client = boto3.client("lambda")
+    client.invoke(FunctionName=function_name, InvocationType="Event", Payload=json.dumps(event))
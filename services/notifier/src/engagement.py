@@ -0,0 +1,70 @@
+"""Selection weights derived from the team's reactions.
+
+The listener maintains a per-post reaction rollup and a per-theme score sum in
+the shared store (see services/listener/src/store.py). The notifier turns the
+mean score per post of each theme into an acceptance weight in [min_weight, 1].
+
+The weight is applied before a paper is summarized, so deferring a paper costs
+no LLM call: its theme comes from an existing summary or, failing that, from
+estimate_theme's keyword rules.
+"""
+from typing import Dict, Iterable, Mapping, Optional, Tuple
+
+import config
+from storage import UNKNOWN_THEME, PaperStore
+
+
+def estimate_theme(
+    title: str, abstract: str, keywords: Mapping[int, Iterable[str]] = config.THEME_KEYWORDS,
+) -> int:
+    """Guesses a paper's theme_id from its title and abstract without calling the LLM.
+
+    Returns:
+        int: The first theme with a keyword in the text, or 0 (other).
+    """
+    text = f"{title} {abstract}".lower()
+    for theme_id, words in keywords.items():
+        if any(word in text for word in words):
+            return theme_id
+    return 0
+
+
+class ThemeWeights:
+    """Acceptance weight per theme, looked up in O(1).
+
+    Themes with fewer than `min_posts` posts and papers without a theme always get
+    weight 1.0, so new themes keep being explored.
+
+    Args:
+        engagement (Dict[int, Tuple[int, float]]): (posts, score_sum) per theme_id.
+        min_weight (float, optional): Weight of the least engaging theme.
+        min_posts (int, optional): Posts needed before a theme is weighted.
+    """
+
+    def __init__(
+        self,
+        engagement: Dict[int, Tuple[int, float]],
+        min_weight: float = config.ENGAGEMENT_MIN_WEIGHT,
+        min_posts: int = config.ENGAGEMENT_MIN_POSTS,
+    ):
+        means = {
+            theme_id: score_sum / posts
+            for theme_id, (posts, score_sum) in engagement.items()
+            if theme_id != UNKNOWN_THEME and posts >= min_posts
+        }
+        best = max(means.values(), default=0.0)
+        self._weights = {
+            theme_id: min_weight + (1.0 - min_weight) * mean / best if best > 0 else 1.0
+            for theme_id, mean in means.items()
+        }
+
+    @classmethod
+    def from_store(cls, store: PaperStore, profile: str) -> "ThemeWeights":
+        """Loads the materialized theme scores of a profile."""
+        return cls(store.theme_engagement(profile))
+
+    def weight(self, theme_id: Optional[int]) -> float:
+        """Returns the acceptance weight of a theme (1.0 if unknown or not yet weighted)."""
+        if theme_id is None:
+            return 1.0
+        return self._weights.get(theme_id, 1.0)
@@ -0,0 +1,221 @@
+"""Compressed archive of raw feed snapshots for differential processing and replay.
+
+Layout (one directory per feed):
+    <root>/<feed_slug>/<timestamp>.xml.gz   raw feed bytes
+    <root>/<feed_slug>/<timestamp>.json     {"feed_url", "timestamp", "entry_ids"}
+    <root>/<feed_slug>/latest.json          copy of the newest metadata file
+
+A snapshot is first staged (raw bytes only) and committed once its entries have
+been handled; until then the previous snapshot stays the diff base, so a run
+that fails before posting sees the same new entries again.
+
+Shard workers may run in containers that do not see the coordinator's archive.
+They use a PayloadArchive instead: the diff base arrives in the shard payload and
+the staged raw bytes travel back in the result, where the coordinator adopts them
+into its FeedArchive.
+"""
+import base64
+import gzip
+import json
+import os
+import re
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set
+
+# arXiv RSS の announce_type のうち、改訂版の再告知を表すもの
+REPLACE_ANNOUNCE_TYPES = ("replace", "replace-cross")
+
+
+@dataclass
+class Snapshot:
+    """A stored feed snapshot.
+
+    raw_path is None when the raw feed was not archived here: the snapshot then
+    carries the raw bytes of a shard worker (raw_b64) or only the feed's cache
+    validators (etag, last_modified) until they are saved.
+    """
+    feed_url: str
+    timestamp: str
+    entry_ids: List[str]
+    raw_path: Optional[str]
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    # シャードの結果で運ぶ生データ (gzip + base64)。FeedArchive.adopt で書き出す
+    raw_b64: Optional[str] = None
+
+    def read_raw(self) -> bytes:
+        """Returns the decompressed raw feed bytes."""
+        with gzip.open(self.raw_path, "rb") as f:
+            return f.read()
+
+
+def _slug(feed_url: str) -> str:
+    return re.sub(r"[^A-Za-z0-9]+", "_", feed_url).strip("_")
+
+
+class FeedArchive:
+    """Stores one compressed snapshot per feed and run.
+
+    Args:
+        root (str): Archive root directory.
+        retention (int, optional): Snapshots kept per feed. Defaults to 30.
+    """
+
+    def __init__(self, root: str, retention: int = 30):
+        self.root = root
+        self.retention = retention
+
+    def _feed_dir(self, feed_url: str) -> str:
+        return os.path.join(self.root, _slug(feed_url))
+
+    def previous_ids(self, feed_url: str) -> Set[str]:
+        """Returns the entry IDs contained in the latest snapshot of a feed.
+
+        Args:
+            feed_url (str): The feed URL.
+
+        Returns:
+            Set[str]: Entry IDs (links), empty if the feed has no snapshot yet.
+        """
+        path = os.path.join(self._feed_dir(feed_url), "latest.json")
+        if not os.path.exists(path):
+            return set()
+        with open(path, encoding="utf-8") as f:
+            return set(json.load(f)["entry_ids"])
+
+    def stage(self, feed_url: str, raw: bytes, entry_ids: List[str]) -> Snapshot:
+        """Stores the raw feed bytes of a new snapshot without making it the latest.
+
+        Args:
+            feed_url (str): The feed URL.
+            raw (bytes): Raw response body.
+            entry_ids (List[str]): Entry IDs contained in the feed.
+
+        Returns:
+            Snapshot: The staged snapshot, to be passed to commit().
+        """
+        feed_dir = self._feed_dir(feed_url)
+        os.makedirs(feed_dir, exist_ok=True)
+        timestamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%fZ")
+        raw_path = os.path.join(feed_dir, f"{timestamp}.xml.gz")
+        with gzip.open(raw_path, "wb") as f:
+            f.write(raw)
+        return Snapshot(feed_url, timestamp, entry_ids, raw_path)
+
+    def commit(self, snapshots: Iterable[Snapshot]) -> None:
+        """Makes staged snapshots the latest of their feeds and prunes old ones.
+
+        Args:
+            snapshots (Iterable[Snapshot]): Snapshots returned by stage(); ones without
+                archived raw bytes are skipped.
+        """
+        for snapshot in snapshots:
+            if snapshot.raw_path is None:
+                continue
+            feed_dir = self._feed_dir(snapshot.feed_url)
+            meta = {"feed_url": snapshot.feed_url, "timestamp": snapshot.timestamp, "entry_ids": snapshot.entry_ids}
+            for name in (f"{snapshot.timestamp}.json", "latest.json"):
+                with open(os.path.join(feed_dir, name), "w", encoding="utf-8") as f:
+                    json.dump(meta, f)
+            self._prune(feed_dir)
+
+    def adopt(self, snapshot: Snapshot) -> Snapshot:
+        """Stages a snapshot staged elsewhere (a shard worker's PayloadArchive) in this archive.
+
+        Args:
+            snapshot (Snapshot): Snapshot carrying its raw bytes in raw_b64.
+
+        Returns:
+            Snapshot: The staged snapshot, to be passed to commit().
+        """
+        feed_dir = self._feed_dir(snapshot.feed_url)
+        os.makedirs(feed_dir, exist_ok=True)
+        raw_path = os.path.join(feed_dir, f"{snapshot.timestamp}.xml.gz")
+        with open(raw_path, "wb") as f:
+            f.write(base64.b64decode(snapshot.raw_b64))
+        return Snapshot(snapshot.feed_url, snapshot.timestamp, snapshot.entry_ids, raw_path,
+                        snapshot.etag, snapshot.last_modified)
+
+    def save(self, feed_url: str, raw: bytes, entry_ids: List[str]) -> Snapshot:
+        """Stages and immediately commits a snapshot as the feed's latest.
+
+        Args:
+            feed_url (str): The feed URL.
+            raw (bytes): Raw response body.
+            entry_ids (List[str]): Entry IDs contained in the feed.
+
+        Returns:
+            Snapshot: The stored snapshot.
+        """
+        snapshot = self.stage(feed_url, raw, entry_ids)
+        self.commit([snapshot])
+        return snapshot
+
+    def _prune(self, feed_dir: str) -> None:
+        """Deletes snapshots beyond the retention limit (oldest first)."""
+        timestamps = sorted(name[:-len(".xml.gz")] for name in os.listdir(feed_dir) if name.endswith(".xml.gz"))
+        for timestamp in timestamps[:-self.retention] if self.retention else []:
+            for suffix in (".xml.gz", ".json"):
+                path = os.path.join(feed_dir, timestamp + suffix)
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def iter_snapshots(self, feed_url: Optional[str] = None) -> Iterator[Snapshot]:
+        """Yields stored snapshots oldest first, e.g. as benchmark or replay input.
+
+        Args:
+            feed_url (Optional[str], optional): Restrict to one feed. Defaults to all feeds.
+
+        Yields:
+            Snapshot: Stored snapshots.
+        """
+        if not os.path.isdir(self.root):
+            return
+        feed_dirs = [self._feed_dir(feed_url)] if feed_url else [
+            os.path.join(self.root, name) for name in sorted(os.listdir(self.root))]
+        for feed_dir in feed_dirs:
+            if not os.path.isdir(feed_dir):
+                continue
+            for name in sorted(os.listdir(feed_dir)):
+                if not name.endswith(".json") or name == "latest.json":
+                    continue
+                with open(os.path.join(feed_dir, name), encoding="utf-8") as f:
+                    meta = json.load(f)
+                yield Snapshot(
+                    meta["feed_url"], meta["timestamp"], meta["entry_ids"],
+                    os.path.join(feed_dir, meta["timestamp"] + ".xml.gz"))
+
+    def latest_snapshots(self) -> List[Snapshot]:
+        """Returns the newest snapshot of every archived feed."""
+        latest = {}
+        for snapshot in self.iter_snapshots():
+            latest[snapshot.feed_url] = snapshot
+        return list(latest.values())
+
+
+class PayloadArchive:
+    """Archive stand-in for shard workers that do not share the coordinator's storage.
+
+    Args:
+        previous_ids (Dict[str, List[str]]): Entry IDs of the latest snapshot per feed,
+            sent by the coordinator.
+    """
+
+    def __init__(self, previous_ids: Dict[str, List[str]]):
+        self._previous_ids = previous_ids
+
+    def previous_ids(self, feed_url: str) -> Set[str]:
+        """Returns the entry IDs of the feed's latest snapshot, as sent by the coordinator."""
+        return set(self._previous_ids.get(feed_url, ()))
+
+    def stage(self, feed_url: str, raw: bytes, entry_ids: List[str]) -> Snapshot:
+        """Returns a snapshot carrying the compressed raw bytes instead of writing them."""
+        timestamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%fZ")
+        raw_b64 = base64.b64encode(gzip.compress(raw)).decode("ascii")
+        return Snapshot(feed_url, timestamp, entry_ids, None, raw_b64=raw_b64)
+
+
+def is_replace_announcement(entry: Dict[str, Any]) -> bool:
+    """Returns True for arXiv `replace` announcements (revised versions of older papers)."""
+    return entry.get("arxiv_announce_type", "") in REPLACE_ANNOUNCE_TYPES
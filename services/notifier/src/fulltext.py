@@ -0,0 +1,230 @@
+"""Optional full-text enrichment of the papers selected for posting.
+
+The RSS feed only carries the abstract. For the top candidates of a profile the
+arXiv PDF is downloaded once into a content-addressed cache and an excerpt of
+the introduction and conclusion is extracted for the LLM prompt.
+
+Memory stays bounded: downloads are streamed to disk and aborted past
+`config.FULLTEXT_MAX_PDF_BYTES`, only the first and last pages are parsed, and
+parsing runs in worker processes so pypdf's allocations never reach the main
+process. Extraction of one PDF overlaps the download of the next.
+
+pypdf is listed in requirements.txt; if an image was built without it,
+enrichment is skipped with a warning instead of failing the run.
+"""
+import hashlib
+import importlib.util
+import logging
+import os
+import re
+import tempfile
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Dict, Iterable, Optional
+
+import requests
+
+import config
+import resilience
+
+logger = logging.getLogger(__name__)
+
+_INTRODUCTION = re.compile(r"^\s*(?:\d+\.?|[IVX]+\.)?\s*Introduction\b", re.IGNORECASE | re.MULTILINE)
+_CONCLUSION = re.compile(r"^\s*(?:\d+\.?|[IVX]+\.)?\s*(?:Conclusions?|Discussion)\b", re.IGNORECASE | re.MULTILINE)
+
+
+class PdfTooLargeError(ValueError):
+    """Raised when a PDF exceeds the size cap (permanent, not retried)."""
+
+
+def pypdf_available() -> bool:
+    """Returns True if pypdf is installed."""
+    return importlib.util.find_spec("pypdf") is not None
+
+
+def pdf_url(entry_id: str) -> str:
+    """Returns the PDF URL of an arXiv entry ("http://arxiv.org/abs/2601.0001" -> .../pdf/2601.0001)."""
+    arxiv_id = entry_id.rstrip("/").rsplit("/abs/", 1)[-1]
+    return config.FULLTEXT_PDF_URL.format(arxiv_id=arxiv_id)
+
+
+class PdfCache:
+    """Content-addressed store of downloaded PDFs and their extracted excerpts.
+
+    objects/<sha256>.pdf holds each distinct PDF once, objects/<sha256>.txt its
+    excerpt, and refs/<sha256 of url> maps a URL to the content digest.
+
+    Args:
+        root (str): Cache directory.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(os.path.join(root, "objects"), exist_ok=True)
+        os.makedirs(os.path.join(root, "refs"), exist_ok=True)
+
+    def _ref_path(self, url: str) -> str:
+        return os.path.join(self.root, "refs", hashlib.sha256(url.encode("utf-8")).hexdigest())
+
+    def object_path(self, digest: str) -> str:
+        return os.path.join(self.root, "objects", f"{digest}.pdf")
+
+    def text_path(self, digest: str) -> str:
+        return os.path.join(self.root, "objects", f"{digest}.txt")
+
+    def lookup(self, url: str) -> Optional[str]:
+        """Returns the digest of a previously downloaded URL, or None."""
+        try:
+            with open(self._ref_path(url)) as f:
+                digest = f.read().strip()
+        except OSError:
+            return None
+        return digest if os.path.exists(self.object_path(digest)) else None
+
+    def download(self, url: str, max_bytes: int, timeout: float) -> str:
+        """Streams a PDF into the cache and returns its digest.
+
+        Raises:
+            PdfTooLargeError: The PDF is larger than `max_bytes`.
+            resilience.HTTPStatusError: The server answered 5xx or 429 (retried by the caller).
+        """
+        sha = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as f, requests.get(url, stream=True, timeout=timeout) as response:
+                if response.status_code >= 500 or response.status_code == 429:
+                    raise resilience.HTTPStatusError(response.status_code)
+                response.raise_for_status()
+                if int(response.headers.get("Content-Length") or 0) > max_bytes:
+                    raise PdfTooLargeError(f"{url} is larger than {max_bytes} bytes")
+                for chunk in response.iter_content(chunk_size=64 * 1024):
+                    size += len(chunk)
+                    if size > max_bytes:
+                        raise PdfTooLargeError(f"{url} is larger than {max_bytes} bytes")
+                    sha.update(chunk)
+                    f.write(chunk)
+            digest = sha.hexdigest()
+            os.replace(tmp_path, self.object_path(digest))
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        ref_tmp = f"{self._ref_path(url)}.tmp"
+        with open(ref_tmp, "w") as f:
+            f.write(digest)
+        os.replace(ref_tmp, self._ref_path(url))
+        return digest
+
+    def read_text(self, digest: str) -> Optional[str]:
+        try:
+            with open(self.text_path(digest), encoding="utf-8") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def write_text(self, digest: str, text: str) -> None:
+        tmp_path = f"{self.text_path(digest)}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp_path, self.text_path(digest))
+
+
+def _squash(text: str) -> str:
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def excerpt(head: str, tail: str, max_chars: int) -> str:
+    """Cuts the introduction (from the head pages) and conclusion (from the tail pages).
+
+    Falls back to the beginning of the paper when no introduction heading is found.
+    """
+    conclusions = list(_CONCLUSION.finditer(tail))
+    conclusion = _squash(tail[conclusions[-1].start():]) if conclusions else ""
+    intro_match = _INTRODUCTION.search(head)
+    introduction = _squash(head[intro_match.start():] if intro_match else head)
+
+    intro_chars = max_chars // 2 if conclusion else max_chars
+    parts = [introduction[:intro_chars], conclusion[:max_chars - intro_chars]]
+    return "\n...\n".join(part for part in parts if part)
+
+
+def extract_excerpt(path: str, head_pages: int, tail_pages: int, max_chars: int) -> str:
+    """Extracts the introduction/conclusion excerpt of a PDF (runs in a worker process)."""
+    from pypdf import PdfReader
+
+    reader = PdfReader(path)
+    count = len(reader.pages)
+
+    def pages_text(indices: Iterable[int]) -> str:
+        return "\n".join(reader.pages[i].extract_text() or "" for i in indices)
+
+    head = pages_text(range(min(head_pages, count)))
+    tail = pages_text(range(max(head_pages, count - tail_pages), count))
+    return excerpt(head, tail, max_chars)
+
+
+def _executor(max_workers: int) -> Executor:
+    try:
+        return ProcessPoolExecutor(max_workers=max_workers)
+    except OSError as e:
+        # AWS Lambda has no /dev/shm for multiprocessing locks; keep extraction off the main thread at least
+        logger.info(f"Process pool unavailable ({e}). Extracting in a background thread.")
+        return ThreadPoolExecutor(max_workers=1)
+
+
+def enrich_full_text(
+    entry_ids: Iterable[str],
+    cache_dir: str = config.FULLTEXT_CACHE_DIR,
+    max_workers: int = config.FULLTEXT_WORKERS,
+) -> Dict[str, str]:
+    """Returns introduction/conclusion excerpts of the given papers.
+
+    Papers whose PDF cannot be downloaded or parsed are left out (the LLM then
+    sees the abstract only).
+
+    Args:
+        entry_ids (Iterable[str]): arXiv entry IDs of the selected papers.
+        cache_dir (str, optional): PDF cache directory.
+        max_workers (int, optional): Extraction processes.
+
+    Returns:
+        Dict[str, str]: Excerpt per entry ID.
+    """
+    if not pypdf_available():
+        logger.warning("Full-text enrichment is enabled but pypdf is not installed. Skipping.")
+        return {}
+
+    cache = PdfCache(cache_dir)
+    pdfs = resilience.dependency("arxiv_pdf")
+    excerpts: Dict[str, str] = {}
+    pending: Dict[str, Future] = {}
+    digests: Dict[str, str] = {}
+    with _executor(max_workers) as executor:
+        for entry_id in dict.fromkeys(entry_ids):
+            url = pdf_url(entry_id)
+            digest = cache.lookup(url)
+            if digest is None:
+                try:
+                    digest = pdfs.call(lambda timeout: cache.download(url, config.FULLTEXT_MAX_PDF_BYTES, timeout))
+                except Exception as e:
+                    logger.warning(f"Could not download {url}: {e}")
+                    continue
+            text = cache.read_text(digest)
+            if text is not None:
+                excerpts[entry_id] = text
+                continue
+            digests[entry_id] = digest
+            pending[entry_id] = executor.submit(
+                extract_excerpt, cache.object_path(digest),
+                config.FULLTEXT_HEAD_PAGES, config.FULLTEXT_TAIL_PAGES, config.FULLTEXT_MAX_CHARS)
+
+        for entry_id, future in pending.items():
+            try:
+                text = future.result()
+            except Exception as e:
+                logger.warning(f"Could not extract text from {entry_id}: {e}")
+                continue
+            cache.write_text(digests[entry_id], text)
+            if text:
+                excerpts[entry_id] = text
+    return excerpts
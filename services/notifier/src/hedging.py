@@ -0,0 +1,178 @@
+"""Hedged request helpers for latency-sensitive external calls (LLM)."""
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+
+import config
+
+# 遅いリクエストは放棄するため、with文ではなく共有のExecutorを使う。
+# 呼び出しごとにプライマリとヘッジの2スレッドを使うため、同時実行数の2倍を確保する
+_executor = ThreadPoolExecutor(max_workers=2 * max(1, config.LLM_MAX_IN_FLIGHT), thread_name_prefix="hedge")
+
+
+class LatencyTracker:
+    """Tracks recent call latencies and derives the hedge trigger threshold.
+
+    Args:
+        percentile (float): Percentile (0-1) of observed latency that triggers a hedge.
+        default_sec (float): Threshold used until enough samples are collected.
+        min_samples (int): Number of samples required before using the percentile.
+        window (int, optional): Number of recent samples to keep. Defaults to 50.
+    """
+
+    def __init__(self, percentile: float, default_sec: float, min_samples: int, window: int = 50):
+        self.percentile = percentile
+        self.default_sec = default_sec
+        self.min_samples = min_samples
+        self._samples: Deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float) -> None:
+        """Records the latency of a successful call."""
+        with self._lock:
+            self._samples.append(seconds)
+
+    def threshold(self) -> float:
+        """Returns the latency after which a hedge request should be fired.
+
+        Returns:
+            float: Threshold in seconds.
+        """
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return self.default_sec
+            ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, int(self.percentile * len(ordered)))
+        return ordered[index]
+
+
+class HedgeMetrics:
+    """Thread-safe counters for hedging, output repair and fallback behaviour."""
+
+    FIELDS = (
+        "calls", "hedges_fired", "hedge_wins", "timeouts",
+        "local_repairs", "rerequests", "tier_fallbacks", "raw_fallbacks",
+    )
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        """Resets all counters to zero."""
+        with self._lock:
+            self._counts = {name: 0 for name in self.FIELDS}
+
+    def incr(self, name: str, amount: int = 1) -> None:
+        """Increments a counter.
+
+        Args:
+            name (str): Counter name (one of FIELDS).
+            amount (int, optional): Increment. Defaults to 1.
+        """
+        with self._lock:
+            self._counts[name] = self._counts.get(name, 0) + amount
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Returns the counters together with derived hedge and fallback rates.
+
+        Returns:
+            Dict[str, Any]: Counter values plus 'hedge_rate', 'hedge_win_rate' and 'fallback_rate'.
+        """
+        with self._lock:
+            counts = dict(self._counts)
+        calls = counts["calls"]
+        hedges = counts["hedges_fired"]
+        counts["hedge_rate"] = round(hedges / calls, 3) if calls else 0.0
+        counts["hedge_win_rate"] = round(counts["hedge_wins"] / hedges, 3) if hedges else 0.0
+        counts["fallback_rate"] = round(
+            (counts["tier_fallbacks"] + counts["raw_fallbacks"]) / calls, 3) if calls else 0.0
+        return counts
+
+
+def _until(request: Callable[[float], Any], deadline: float) -> Callable[[], Any]:
+    """Binds a request to the deadline; its timeout is computed when a pool thread starts it."""
+    def run() -> Any:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutError("Deadline passed before the request started")
+        return request(remaining)
+    return run
+
+
+def hedged_call(
+    primary: Callable[[float], Any],
+    hedge: Optional[Callable[[float], Any]],
+    hedge_after_sec: float,
+    deadline_sec: float,
+    metrics: Optional[HedgeMetrics] = None,
+) -> Tuple[Any, str]:
+    """Runs `primary` and fires `hedge` if it has not finished after `hedge_after_sec`.
+
+    The first request to complete successfully wins. A failing request does not end the
+    call while the other one is still running. Errors are not retried here; the caller
+    decides how to degrade.
+
+    Each request is passed the seconds left until the deadline when it starts (a request
+    queued behind busy pool threads gets less) and must use them as its client timeout,
+    so an abandoned (losing or timed-out) request frees its pool thread by the deadline
+    instead of holding it for the client's default timeout. Requests still queued when
+    the call returns or times out are cancelled.
+
+    Args:
+        primary (Callable[[float], Any]): The primary request, given its timeout in seconds.
+        hedge (Optional[Callable[[float], Any]]): The hedge request. None disables hedging.
+        hedge_after_sec (float): Delay before the hedge request is fired.
+        deadline_sec (float): Overall deadline for the call.
+        metrics (Optional[HedgeMetrics], optional): Counters to update. Defaults to None.
+
+    Returns:
+        Tuple[Any, str]: The winning result and its origin ('primary' or 'hedge').
+
+    Raises:
+        TimeoutError: If no request completes before the deadline.
+        Exception: The last request error if every request failed.
+    """
+    start = time.monotonic()
+    deadline = start + deadline_sec
+    pending: Dict[Future, str] = {_executor.submit(_until(primary, deadline)): "primary"}
+    hedge_fired = hedge is None
+    last_error: Optional[BaseException] = None
+
+    try:
+        while pending:
+            now = time.monotonic()
+            if now >= deadline:
+                break
+            timeout = deadline - now
+            if not hedge_fired:
+                timeout = min(timeout, max(0.0, start + hedge_after_sec - now))
+
+            done, _ = wait(list(pending), timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                origin = pending.pop(future)
+                error = future.exception()
+                if error is None:
+                    if origin == "hedge" and metrics:
+                        metrics.incr("hedge_wins")
+                    return future.result(), origin
+                last_error = error
+
+            # プライマリが閾値を超えても応答しない場合のみヘッジを発火 (失敗時は呼び出し元で次のティアへ)
+            if not hedge_fired and not done and time.monotonic() < deadline:
+                hedge_fired = True
+                pending[_executor.submit(_until(hedge, deadline))] = "hedge"
+                if metrics:
+                    metrics.incr("hedges_fired")
+
+        if pending:
+            if metrics:
+                metrics.incr("timeouts")
+            raise TimeoutError(f"No response within {deadline_sec}s")
+        raise last_error
+    finally:
+        # まだスレッドを待っているリクエストは取り消す (実行中のものはタイムアウトで終わる)
+        for future in pending:
+            future.cancel()
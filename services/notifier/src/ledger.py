@@ -0,0 +1,198 @@
+"""Idempotent run ledger keyed by run date, profile and stage.
+
+Concurrent or retried invocations (EventBridge retries, a manual CLI run during
+the scheduled one, parallel workers) share the ledger, so a profile run, a Slack
+post or an LLM summary is done at most once per day. In Lambda the ledger is a
+DynamoDB table written with conditional puts (DynamoLedgerTable); local runs use
+the run_ledger table of the SQLite store.
+
+Every claim is a lease: a stage held by an invocation that crashed can be taken
+over once the lease has expired.
+"""
+import json
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional, Protocol
+
+import config
+
+RUN_STAGE = "run"
+# LLM要約はプロファイル間で共有するため、プロファイル名の代わりにこのキーで記録する
+SHARED_PROFILE = "*"
+
+# 条件付き書き込みの条件式 (DynamoLedgerTable)
+CLAIM_NEW = "attribute_not_exists(pk)"
+CLAIM_HELD = "#status = :running AND (#owner = :owner OR updated_at < :expired)"
+RELEASE_OWN = "#status = :running AND #owner = :owner"
+
+
+def post_stage(entry_id: str) -> str:
+    """Returns the ledger stage of posting one paper."""
+    return f"post:{entry_id}"
+
+
+def summary_stage(entry_id: str) -> str:
+    """Returns the ledger stage of summarizing one paper."""
+    return f"summary:{entry_id}"
+
+
+class LedgerBackend(Protocol):
+    """Storage of ledger entries (PaperStore or DynamoLedgerTable)."""
+
+    def claim_stage(
+        self, run_date: str, profile: str, stage: str, owner: str, lease_sec: Optional[float] = None,
+    ) -> bool: ...
+
+    def complete_stage(
+        self, run_date: str, profile: str, stage: str, owner: str, result: Optional[Dict[str, Any]] = None,
+    ) -> None: ...
+
+    def release_stage(self, run_date: str, profile: str, stage: str, owner: str) -> None: ...
+
+    def stage_result(self, run_date: str, profile: str, stage: str) -> Optional[Dict[str, Any]]: ...
+
+
+def _conditional_check_failed(exc: Exception) -> bool:
+    return getattr(exc, "response", {}).get("Error", {}).get("Code") == "ConditionalCheckFailedException"
+
+
+class DynamoLedgerTable:
+    """Ledger entries in a DynamoDB table shared by every invocation and container.
+
+    Claims are conditional writes, so two invocations can never both hold a stage.
+    boto3 is part of the Lambda runtime; it is imported lazily so local runs
+    without it still work.
+
+    Args:
+        table_name (str): Table with the string partition key "pk".
+        client (Optional[Any], optional): DynamoDB client. Defaults to boto3.client("dynamodb").
+        ttl_days (float, optional): Entries expire (DynamoDB TTL on "expires_at") after this many days.
+    """
+
+    def __init__(self, table_name: str, client: Optional[Any] = None, ttl_days: float = config.RUN_LEDGER_TTL_DAYS):
+        if client is None:
+            import boto3
+
+            client = boto3.client("dynamodb")
+        self.client = client
+        self.table_name = table_name
+        self.ttl_days = ttl_days
+
+    @staticmethod
+    def _key(run_date: str, profile: str, stage: str) -> Dict[str, Any]:
+        return {"pk": {"S": f"{run_date}#{profile}#{stage}"}}
+
+    def _item(self, run_date: str, profile: str, stage: str, owner: str, status: str) -> Dict[str, Any]:
+        now = time.time()
+        return {
+            **self._key(run_date, profile, stage),
+            "owner": {"S": owner},
+            "status": {"S": status},
+            "updated_at": {"N": repr(now)},
+            "expires_at": {"N": str(int(now + self.ttl_days * 86400))},
+        }
+
+    def claim_stage(
+        self, run_date: str, profile: str, stage: str, owner: str, lease_sec: Optional[float] = None,
+    ) -> bool:
+        """Claims a stage; same semantics as PaperStore.claim_stage."""
+        item = self._item(run_date, profile, stage, owner, "running")
+        try:
+            self.client.put_item(TableName=self.table_name, Item=item, ConditionExpression=CLAIM_NEW)
+            return True
+        except Exception as e:
+            if not _conditional_check_failed(e):
+                raise
+        expired = time.time() - lease_sec if lease_sec else 0.0
+        try:
+            self.client.update_item(
+                TableName=self.table_name,
+                Key=self._key(run_date, profile, stage),
+                UpdateExpression="SET #owner = :owner, updated_at = :now",
+                ConditionExpression=CLAIM_HELD,
+                ExpressionAttributeNames={"#status": "status", "#owner": "owner"},
+                ExpressionAttributeValues={
+                    ":owner": {"S": owner}, ":now": item["updated_at"], ":running": {"S": "running"},
+                    ":expired": {"N": repr(expired)},
+                },
+            )
+            return True
+        except Exception as e:
+            if not _conditional_check_failed(e):
+                raise
+            return False
+
+    def complete_stage(
+        self, run_date: str, profile: str, stage: str, owner: str, result: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        """Marks a stage as done, optionally with a JSON-serializable result."""
+        item = self._item(run_date, profile, stage, owner, "done")
+        if result is not None:
+            item["result"] = {"S": json.dumps(result, ensure_ascii=False)}
+        self.client.put_item(TableName=self.table_name, Item=item)
+
+    def release_stage(self, run_date: str, profile: str, stage: str, owner: str) -> None:
+        """Gives up an unfinished claim held by this owner."""
+        try:
+            self.client.delete_item(
+                TableName=self.table_name,
+                Key=self._key(run_date, profile, stage),
+                ConditionExpression=RELEASE_OWN,
+                ExpressionAttributeNames={"#status": "status", "#owner": "owner"},
+                ExpressionAttributeValues={":owner": {"S": owner}, ":running": {"S": "running"}},
+            )
+        except Exception as e:
+            if not _conditional_check_failed(e):
+                raise
+
+    def stage_result(self, run_date: str, profile: str, stage: str) -> Optional[Dict[str, Any]]:
+        """Returns the result recorded for a completed stage, or None."""
+        item = self.client.get_item(
+            TableName=self.table_name, Key=self._key(run_date, profile, stage), ConsistentRead=True).get("Item")
+        if not item or item["status"]["S"] != "done" or "result" not in item:
+            return None
+        return json.loads(item["result"]["S"])
+
+
+class RunLedger:
+    """Claims and completes the stages of one invocation.
+
+    Args:
+        store (LedgerBackend): Where the ledger is kept (DynamoLedgerTable, or the local store).
+        run_date (Optional[str], optional): Run date. Defaults to today (UTC).
+        owner (Optional[str], optional): Unique ID of this invocation. Defaults to a random ID.
+    """
+
+    def __init__(self, store: LedgerBackend, run_date: Optional[str] = None, owner: Optional[str] = None):
+        self.store = store
+        self.run_date = run_date or datetime.now(timezone.utc).date().isoformat()
+        self.owner = owner or uuid.uuid4().hex
+
+    def claim_run(self, profile: str) -> bool:
+        """Claims a profile's run for today; a crashed owner's claim expires after the lease."""
+        return self.store.claim_stage(self.run_date, profile, RUN_STAGE, self.owner, config.RUN_LEDGER_LEASE_SEC)
+
+    def complete_run(self, profile: str) -> None:
+        """Marks a profile's run for today as done; later runs of the day skip it."""
+        self.complete(profile, RUN_STAGE)
+
+    def release_run(self, profile: str) -> None:
+        """Releases an unfinished profile run so the next invocation can resume it."""
+        self.release(profile, RUN_STAGE)
+
+    def claim(self, profile: str, stage: str) -> bool:
+        """Claims a stage (a post or a summary); a crashed owner's claim expires after the stage lease."""
+        return self.store.claim_stage(self.run_date, profile, stage, self.owner, config.RUN_LEDGER_STAGE_LEASE_SEC)
+
+    def complete(self, profile: str, stage: str, result: Optional[Dict[str, Any]] = None) -> None:
+        """Marks a stage as done."""
+        self.store.complete_stage(self.run_date, profile, stage, self.owner, result)
+
+    def release(self, profile: str, stage: str) -> None:
+        """Gives up an unfinished claim."""
+        self.store.release_stage(self.run_date, profile, stage, self.owner)
+
+    def result(self, profile: str, stage: str) -> Optional[Dict[str, Any]]:
+        """Returns the result of a completed stage."""
+        return self.store.stage_result(self.run_date, profile, stage)
@@ -4,9 +4,9 @@ import random
 import argparse
 import time
 import re
-from typing import List, Dict, Any, Set, Tuple
+from dataclasses import asdict, replace
+from typing import List, Dict, Any, Set, Tuple, Callable, Optional, Union, Iterable, Iterator
 from datetime import datetime, timezone, timedelta
-from dataclasses import dataclass
 from slack_sdk import WebClient
 from slack_sdk.errors import SlackApiError
 import feedparser
@@ -20,6 +20,22 @@ import requests
 
 # config.py から設定をインポート
 import config
+import resilience
+from deadline import RunBudget, schedule_followup
+from engagement import ThemeWeights, estimate_theme
+from export import HistoryExporter
+from feed_archive import FeedArchive, PayloadArchive, Snapshot, is_replace_announcement
+from fulltext import enrich_full_text
+from hedging import HedgeMetrics, LatencyTracker, hedged_call
+from ledger import SHARED_PROFILE, DynamoLedgerTable, RunLedger, post_stage, summary_stage
+from reconcile import ReactionReconciler
+from replication import execute_with_retry, mirror_reactions, mirror_to_sheets
+from selection import AbstractSpill, Reservoir
+from schema import PaperSummary, SummaryValidationError, parse_summary
+from profiles import Profile, load_profiles, sheet_tabs
+from registry import publish_registry
+from shards import LambdaShardInvoker, LocalShardInvoker, ShardResult, plan_shards, merge_results
+from storage import DEFAULT_PROFILE, PaperStore, StoreNotConfiguredError, require_durable_path
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
@@ -41,7 +57,7 @@ slack_token = os.environ.get("SLACK_API_TOKEN")
 # Slackクライアントの初期化 (macOSの証明書エラー対策としてcertifiを利用)
 if slack_token:
     ssl_context = ssl.create_default_context(cafile=certifi.where())
-    slack_client = WebClient(token=slack_token, ssl=ssl_context)
+    slack_client = WebClient(token=slack_token, ssl=ssl_context, timeout=config.RESILIENCE["slack"]["timeout_sec"])
 else:
     slack_client = None
 
@@ -50,14 +66,75 @@ SLACK_CHANNEL = config.SLACK_CHANNEL
 ARXIV_QUERY = config.ARXIV_QUERY
 MAX_RESULTS = config.MAX_RESULTS
 NUM_PAPERS = config.NUM_PAPERS
+PAPER_DB_PATH = os.environ.get("PAPER_DB_PATH", config.PAPER_DB_PATH)
+FEED_ARCHIVE_DIR = os.environ.get("FEED_ARCHIVE_DIR", config.FEED_ARCHIVE_DIR)
+POSTED_REGISTRY_PATH = os.environ.get("POSTED_REGISTRY_PATH", config.POSTED_REGISTRY_PATH)
+FULLTEXT_CACHE_DIR = os.environ.get("FULLTEXT_CACHE_DIR", config.FULLTEXT_CACHE_DIR)
+EXPORT_DIR = os.environ.get("EXPORT_DIR", config.EXPORT_DIR)
+RUN_LEDGER_TABLE = os.environ.get("RUN_LEDGER_TABLE", config.RUN_LEDGER_TABLE)
+
+RSS_FEEDS = [
+    'http://export.arxiv.org/rss/cs',
+    'http://export.arxiv.org/rss/eess',
+    'http://export.arxiv.org/rss/stat',
+    'http://export.arxiv.org/rss/math'
+]
+# User-Agent is required to bypass arXiv's basic crawler blocking
+RSS_HEADERS = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'}
+
+# LLM呼び出しのレイテンシ観測とヘッジ/フォールバックのメトリクス (ウォームスタート間で共有)
+llm_latency = LatencyTracker(
+    percentile=config.LLM_HEDGE_PERCENTILE,
+    default_sec=config.LLM_HEDGE_DELAY_SEC,
+    min_samples=config.LLM_HEDGE_MIN_SAMPLES,
+)
+llm_metrics = HedgeMetrics()
 
 
-@dataclass
 class Paper:
-    title: str
-    summary: str
-    entry_id: str
-    published: datetime
+    """A matched paper as a compact slotted record.
+
+    When a spill is given the abstract is written there and read back on access,
+    so sampled candidates do not keep full abstracts on the heap.
+    """
+    __slots__ = ("_spill", "_spill_ref", "_summary", "entry_id", "published", "title")
+
+    def __init__(
+        self, title: str, summary: str, entry_id: str, published: datetime, spill: Optional[AbstractSpill] = None,
+    ):
+        self.title = title
+        self.entry_id = entry_id
+        self.published = published
+        self._spill = spill
+        self._summary = summary if spill is None else None
+        self._spill_ref = None if spill is None else spill.put(summary)
+
+    @property
+    def summary(self) -> str:
+        """The abstract."""
+        if self._spill_ref is None:
+            return self._summary
+        return self._spill.get(self._spill_ref)
+
+
+def _paper_to_state(paper: Paper) -> Dict[str, str]:
+    """Serializes a paper for a run checkpoint."""
+    return {
+        "title": paper.title,
+        "summary": paper.summary,
+        "entry_id": paper.entry_id,
+        "published": paper.published.isoformat(),
+    }
+
+
+def _paper_from_state(state: Dict[str, str]) -> Paper:
+    """Restores a paper from a run checkpoint."""
+    return Paper(
+        title=state["title"],
+        summary=state["summary"],
+        entry_id=state["entry_id"],
+        published=datetime.fromisoformat(state["published"]),
+    )
 
 
 def extract_phrases(query_string: str) -> List[str]:
@@ -102,8 +179,8 @@ def get_existing_paper_ids() -> Set[str]:
 
         # F列 (URL/Entry ID) を取得
         range_name = "F2:F" 
-        result = service.spreadsheets().values().get(
-            spreadsheetId=SPREADSHEET_ID, range=range_name).execute()
+        result = execute_with_retry(service.spreadsheets().values().get(
+            spreadsheetId=SPREADSHEET_ID, range=range_name))
         rows = result.get('values', [])
         
         existing_ids = set()
@@ -118,91 +195,89 @@ def get_existing_paper_ids() -> Set[str]:
         return set()
 
 
-def save_to_sheets(paper_data: Any, dify_data: Dict[str, Any], slack_ts: str, insert_index: int = 0) -> None:
-    """Saves paper metadata to Google Sheets. Inserts a new row at the specified index.
+def open_store() -> PaperStore:
+    """Opens the system of record; fails if PAPER_DB_PATH is not durable shared storage."""
+    return PaperStore(require_durable_path(PAPER_DB_PATH))
 
-    Args:
-        paper_data (Any): The arxiv paper object containing metadata.
-        dify_data (Dict[str, Any]): The AI-generated summary and scoring data.
-        slack_ts (str): The timestamp of the Slack message posting.
-        insert_index (int, optional): The offset index for insertion. Defaults to 0.
+
+def open_archive() -> Optional[FeedArchive]:
+    """Opens the feed snapshot archive, or returns None if differential processing is off.
+
+    Every container must see the same snapshots, so FEED_ARCHIVE_DIR has to be durable
+    shared storage like PAPER_DB_PATH; a per-container /tmp archive would diff against
+    whatever that container happened to fetch.
     """
-    if not GOOGLE_CREDS or not SPREADSHEET_ID:
-        logger.warning("GOOGLE_CREDS or SPREADSHEET_ID not set. Skipping sheet save.")
-        return
+    if not config.DIFFERENTIAL_PROCESSING:
+        return None
+    return FeedArchive(require_durable_path(FEED_ARCHIVE_DIR, "FEED_ARCHIVE_DIR"), config.FEED_ARCHIVE_RETENTION)
 
-    try:
-        creds_info = json.loads(GOOGLE_CREDS)
-        creds = service_account.Credentials.from_service_account_info(creds_info)
-        service = build('sheets', 'v4', credentials=creds)
 
-        values = [
-            paper_data.published.strftime('%Y-%m-%d'),
-            paper_data.title,
-            dify_data.get('theme_id', ''),
-            dify_data.get('importance', ''),
-            dify_data.get('summary', ''),
-            paper_data.entry_id,
-            slack_ts # Column G: Slack Message Timestamp
-        ]
-        
-        target_index = 1 + insert_index
-        
-        # 1. Insert a blank row
-        requests = [{
-            'insertDimension': {
-                'range': {
-                    'sheetId': 0,
-                    'dimension': 'ROWS',
-                    'startIndex': target_index,
-                    'endIndex': target_index + 1
-                },
-                'inheritFromBefore': False
-            }
-        }]
-        
-        service.spreadsheets().batchUpdate(
-            spreadsheetId=SPREADSHEET_ID,
-            body={'requests': requests}
-        ).execute()
-        
-        # 2. Write data to that row
-        row_number = target_index + 1  
-        range_name = f"A{row_number}"
-        
-        service.spreadsheets().values().update(
-            spreadsheetId=SPREADSHEET_ID,
-            range=range_name,
-            valueInputOption="RAW",
-            body={'values': [values]}
-        ).execute()
-        
-        logger.info(f"Saved to sheets at row {row_number}: {paper_data.title}")
-    except Exception as e:
-        logger.error(f"Failed to write to Spreadsheet: {e}")
+def open_ledger(store: PaperStore, run_date: Optional[str] = None) -> RunLedger:
+    """Opens the run ledger shared by every invocation.
+
+    Lambda invocations use the DynamoDB table (conditional writes); other runs fall
+    back to the local store.
+    """
+    if RUN_LEDGER_TABLE:
+        return RunLedger(DynamoLedgerTable(RUN_LEDGER_TABLE), run_date)
+    if os.environ.get("AWS_LAMBDA_FUNCTION_NAME"):
+        raise StoreNotConfiguredError(
+            "RUN_LEDGER_TABLE is not set. Lambda invocations need the shared DynamoDB ledger.")
+    return RunLedger(store, run_date)
+
 
+def load_existing_ids(store: PaperStore, profile: str = DEFAULT_PROFILE) -> Set[str]:
+    """Returns known paper IDs of a profile, seeding the store from Sheets on first use.
 
-def generate_paper_summary(paper_title: str, paper_abstract: str, model: str = "gpt-5-mini") -> Dict[str, Any]:
+    Args:
+        store (PaperStore): The local system of record.
+        profile (str, optional): Profile name. The first profile seen on an empty store
+            receives the existing sheet rows.
+
+    Returns:
+        Set[str]: A set of paper URLs (entry_ids) already processed.
+    """
+    if store.is_empty():
+        logger.info("Local store is empty. Bootstrapping paper IDs from Google Sheets.")
+        store.import_ids(get_existing_paper_ids(), profile)
+    return store.existing_ids(profile)
+
+
+def generate_paper_summary(
+    paper_title: str, paper_abstract: str, model: str = config.LLM_MODEL, full_text: Optional[str] = None,
+) -> PaperSummary:
     """Generates a summary and score for a paper using an LLM.
 
+    Each model tier gets a per-call deadline (`LLM_TIMEOUT_SEC`). If the first request is
+    slower than the observed latency percentile, a hedged request is fired and whichever
+    finishes first is used. When a tier fails, the next cheaper model in
+    `LLM_FALLBACK_MODELS` is tried before falling back to the raw abstract.
+
+    Responses are validated and repaired locally (see schema.parse_summary); the same
+    model is re-requested only when local repair fails. While the "openai" circuit
+    breaker is open the raw abstract is returned without calling the API.
+
     Args:
         paper_title (str): Title of the paper.
         paper_abstract (str): Abstract of the paper.
-        model (str, optional): The LLM model to use. Defaults to "gpt-5-mini".
+        model (str, optional): The primary LLM model to use. Defaults to config.LLM_MODEL.
+        full_text (Optional[str], optional): Excerpt of the introduction and conclusion
+            (see fulltext.enrich_full_text). Defaults to the abstract only.
 
     Returns:
-        Dict[str, Any]: A dictionary containing 'summary', 'importance', 'theme_id', and 'reason'.
+        PaperSummary: The validated summary, importance, theme_id and reason.
     """
     if not OPENAI_API_KEY:
         print("Error: OPENAI_API_KEY not set.")
         return _fallback_result(paper_abstract, "Missing API Key")
 
-    client = openai.OpenAI(api_key=OPENAI_API_KEY)
+    client = openai.OpenAI(api_key=OPENAI_API_KEY, timeout=config.LLM_TIMEOUT_SEC, max_retries=0)
     
+    full_text_section = f"\n    本文抜粋 (序論・結論): {full_text}" if full_text else ""
     prompt = f"""
     あなたは空間統計とプライバシーの専門家です。以下の論文を解析し、構造化JSONで出力してください。
     タイトル: {paper_title}
-    抄録: {paper_abstract}
+    抄録: {paper_abstract}{full_text_section}
 
     ## 出力項目
     - importance: 1-5の整数（5が最高）
@@ -219,24 +294,77 @@ def generate_paper_summary(paper_title: str, paper_abstract: str, model: str = "
     }}
     """
 
-    try:
-        response = client.chat.completions.create(
-            model=model,
-            messages=[
-                {"role": "system", "content": "You are a helpful research assistant."},
-                {"role": "user", "content": prompt}
-            ],
-            response_format={"type": "json_object"}
-        )
-        content = response.choices[0].message.content
-        data = json.loads(content)
-        return data
+    def make_call(tier_model: str) -> Callable[[float], str]:
+        def call(timeout: float) -> str:
+            started = time.monotonic()
+            # 負けたリクエストもデッドラインで打ち切られ、ヘッジ用スレッドを解放する
+            response = client.chat.completions.create(
+                model=tier_model,
+                messages=[
+                    {"role": "system", "content": "You are a helpful research assistant."},
+                    {"role": "user", "content": prompt}
+                ],
+                response_format={"type": "json_object"},
+                timeout=timeout,
+            )
+            llm_latency.record(time.monotonic() - started)
+            return response.choices[0].message.content
+        return call
 
-    except Exception as e:
-        print(f"LLM Error: {e}")
-        return _fallback_result(paper_abstract, "LLM Processing Failed")
+    tiers = [model] + [m for m in config.LLM_FALLBACK_MODELS if m != model]
+    llm_metrics.incr("calls")
+
+    for tier_index, tier_model in enumerate(tiers):
+        if tier_index > 0:
+            logger.warning(f"Degrading to fallback model tier: {tier_model}")
+            llm_metrics.incr("tier_fallbacks")
+        hedge_model = config.LLM_HEDGE_MODEL or tier_model
+        for attempt in range(1 + config.LLM_MAX_REREQUESTS):
+            if attempt > 0:
+                llm_metrics.incr("rerequests")
+            try:
+                content, origin = resilience.dependency("openai").call(lambda timeout: hedged_call(
+                    make_call(tier_model),
+                    make_call(hedge_model),
+                    hedge_after_sec=llm_latency.threshold(),
+                    deadline_sec=timeout,
+                    metrics=llm_metrics,
+                ))
+            except (resilience.CircuitOpenError, resilience.DeadlineExceeded) as e:
+                # 他のモデル階層も同じ依存先のため、すぐに生のアブストラクトへフォールバック
+                logger.warning(f"LLM unavailable: {e}")
+                llm_metrics.incr("raw_fallbacks")
+                return _fallback_result(paper_abstract, "LLM Unavailable")
+            except Exception as e:
+                print(f"LLM Error ({tier_model}): {e}")
+                break
+
+            if origin == "hedge":
+                logger.info(f"Hedged request ({hedge_model}) won for: {paper_title}")
+            try:
+                result, repaired = parse_summary(content)
+            except SummaryValidationError as e:
+                logger.warning(f"Unrepairable LLM output ({tier_model}): {e}")
+                continue
+            if repaired:
+                llm_metrics.incr("local_repairs")
+            return result
+
+    llm_metrics.incr("raw_fallbacks")
+    return _fallback_result(paper_abstract, "LLM Processing Failed")
+
+
+def get_llm_metrics() -> Dict[str, Any]:
+    """Returns hedge and fallback counters for the LLM calls made by this process.
 
-def _fallback_result(abstract: str, reason_suffix: str) -> Dict[str, Any]:
+    Returns:
+        Dict[str, Any]: Counter values and derived rates (see HedgeMetrics.snapshot).
+    """
+    metrics = llm_metrics.snapshot()
+    metrics["hedge_threshold_sec"] = round(llm_latency.threshold(), 3)
+    return metrics
+
+def _fallback_result(abstract: str, reason_suffix: str) -> PaperSummary:
     """Generates a fallback result dictionary when LLM processing fails.
 
     Args:
@@ -244,49 +372,37 @@ def _fallback_result(abstract: str, reason_suffix: str) -> Dict[str, Any]:
         reason_suffix (str): The error reason to append.
 
     Returns:
-        Dict[str, Any]: A fallback dictionary with truncated abstract.
+        PaperSummary: A fallback result with truncated abstract and no importance/theme.
     """
-    return {
-        "summary": abstract[:500] + "..." if len(abstract) > 500 else abstract,
-        "importance": "?",
-        "theme_id": "?",
-        "reason": f"System Error: {reason_suffix}. Showing raw abstract."
-    }
+    return PaperSummary(
+        summary=abstract[:500] + "..." if len(abstract) > 500 else abstract,
+        importance=None,
+        theme_id=None,
+        reason=f"System Error: {reason_suffix}. Showing raw abstract."
+    )
 
 
-def build_slack_blocks(paper: Any, ai_data: Dict[str, Any], index: int) -> Tuple[List[Dict[str, Any]], str]:
+def build_slack_blocks(paper: Any, ai_data: PaperSummary, index: int) -> Tuple[List[Dict[str, Any]], str]:
     """Constructs the Slack Block Kit message structure.
 
     Args:
         paper (Any): The arxiv paper object.
-        ai_data (Dict[str, Any]): The AI-generated summary and scoring.
+        ai_data (PaperSummary): The AI-generated summary and scoring.
         index (int): The sequence number of the paper in the current batch.
 
     Returns:
         Tuple[List[Dict[str, Any]], str]: A tuple containing the blocks list and fallback text.
     """
     
-    theme_id = ai_data.get('theme_id')
-    
-    if theme_id == 1:
-        theme_label = "表現学習"
-    elif theme_id == 3:
-        theme_label = "プライバシー"
-    elif str(theme_id) == "?":
+    if ai_data.theme_id is None:
         theme_label = "不明 (?)"
     else:
-        theme_label = "その他"
+        theme_label = config.THEME_LABELS.get(ai_data.theme_id, "その他")
 
-    importance = ai_data.get('importance', '?')
-    summary = ai_data.get('summary', 'No summary')
-    reason = ai_data.get('reason', 'No reason')
-    
     # Determine emoji based on importance
-    try:
-        imp_val = int(importance)
-        star = "⭐️" * imp_val
-    except (ValueError, TypeError):
-        star = str(importance)
+    star = "?" if ai_data.importance is None else "⭐️" * ai_data.importance
+    summary = ai_data.summary or 'No summary'
+    reason = ai_data.reason or 'No reason'
 
     blocks = [
         {
@@ -361,129 +477,418 @@ def build_slack_blocks(paper: Any, ai_data: Dict[str, Any], index: int) -> Tuple
 
  
 
-def main(slack_channel: str, query: str, max_results: int, num_papers: int) -> None:
-    """Main execution entry point.
+def select_new_entries(
+    feed_url: str, raw: bytes, entries: List[Any], archive: Optional[Union[FeedArchive, PayloadArchive]],
+) -> Tuple[List[Any], Optional[Snapshot]]:
+    """Stages the raw feed in the archive and keeps only entries absent from the previous snapshot.
 
-    Fetches papers from Arxiv, filters duplicates, generates summaries, posts to Slack,
-    and saves metadata to Google Sheets.
+    The staged snapshot is returned instead of being committed: the caller commits it
+    once the new entries have been posted (or checkpointed / queued), so entries of a
+    run that fails in between are matched again by the next one. Archive errors never
+    fail the run; all entries are processed in that case.
 
     Args:
-        slack_channel (str): The Slack channel ID or name to post to.
-        query (str): The Arxiv search query.
-        max_results (int): Maximum number of papers to fetch from Arxiv API.
-        num_papers (int): Number of papers to select and post.
-    """        
-    # 0. Get existing papers for deduplication
-    existing_ids = get_existing_paper_ids()
+        feed_url (str): The feed URL.
+        raw (bytes): Raw response body.
+        entries (List[Any]): Parsed feed entries.
+        archive (Optional[FeedArchive]): Snapshot archive. None disables differential processing.
 
-    # 1. Fetch from arXiv RSS Feeds
-    logger.info("Fetching papers from arXiv RSS feeds...")
-    rss_feeds = [
-        'http://export.arxiv.org/rss/cs',
-        'http://export.arxiv.org/rss/eess',
-        'http://export.arxiv.org/rss/stat',
-        'http://export.arxiv.org/rss/math'
-    ]
-    
-    all_results = []
-    seen_urls = set()
-    failed_feeds = 0
-    
-    # User-Agent is required to bypass arXiv's basic crawler blocking
-    headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'}
-    
-    for feed_url in rss_feeds:
-        try:
-            logger.info(f"Requesting RSS feed: {feed_url}")
-            response = requests.get(feed_url, headers=headers, timeout=20)
-            if response.status_code != 200:
-                logger.warning(f"Non-200 status code from {feed_url}: {response.status_code}")
-                failed_feeds += 1
-                continue
-                
-            feed = feedparser.parse(response.content)
-            if getattr(feed, 'bozo', False):
-                logger.warning(f"Bozo exception parsing {feed_url} (malformed XML?): {feed.bozo_exception}")
-            
-            feed_matches = 0
-            for entry in feed.entries:
-                title = entry.get('title', '')
-                title_clean = re.sub(r'<[^>]+>', '', title)
-                
-                summary = entry.get('summary', '')
-                summary_clean = re.sub(r'<[^>]+>', '', summary)
-                
-                # Check keywords using the standalone config variables
-                if matches_query(title_clean + " " + summary_clean, config.keywords_ai, config.keywords_domain):
-                    entry_id = entry.get('link', '')
-                    if entry_id in seen_urls:
-                        continue
-                        
-                    seen_urls.add(entry_id)
-                    feed_matches += 1
-                    
-                    published_parsed = entry.get('published_parsed') or entry.get('updated_parsed')
-                    if published_parsed:
-                        published_dt = datetime.fromtimestamp(time.mktime(published_parsed), tz=timezone.utc)
-                    else:
-                        published_dt = datetime.now(timezone.utc)
-                    
-                    paper = Paper(
-                        title=title_clean.replace('\\n', ' '),
-                        summary=summary_clean.replace('\\n', ' '),
-                        entry_id=entry_id,
-                        published=published_dt
-                    )
-                    all_results.append(paper)
-                    
-            logger.info(f"Extracted {feed_matches} matching papers from {feed_url} (out of {len(feed.entries)} total entries).")
-            
-        except requests.exceptions.Timeout:
-            logger.error(f"Timeout while fetching {feed_url}")
-            failed_feeds += 1
-        except Exception as e:
-            logger.exception(f"Unexpected error processing {feed_url}: {e}")
-            failed_feeds += 1
-            
-    if failed_feeds == len(rss_feeds):
-        error_msg = "⚠️ arXiv RSSからの論文取得中に全フィードでエラーが発生しました。取得処理全体をスキップします。"
-        logger.error(error_msg)
-        if slack_client and slack_channel:
-            try:
-                slack_client.chat_postMessage(channel=slack_channel, text=error_msg)
-            except Exception as slack_e:
-                logger.error(f"Failed to post error to Slack: {slack_e}")
+    Returns:
+        Tuple[List[Any], Optional[Snapshot]]: Entries to send to matching, and the staged
+            snapshot (None if nothing was staged).
+    """
+    entry_ids = [entry.get('link', '') for entry in entries]
+    if config.SKIP_REPLACE_ANNOUNCEMENTS:
+        entries = [entry for entry in entries if not is_replace_announcement(entry)]
+    if archive is None:
+        return entries, None
+
+    try:
+        previous_ids = archive.previous_ids(feed_url)
+    except Exception as e:
+        logger.warning(f"Could not read previous snapshot of {feed_url}: {e}")
+        previous_ids = set()
+    snapshot = None
+    try:
+        snapshot = archive.stage(feed_url, raw, entry_ids)
+    except Exception as e:
+        logger.warning(f"Could not archive snapshot of {feed_url}: {e}")
+
+    new_entries = [entry for entry in entries if entry.get('link', '') not in previous_ids]
+    logger.info(f"{len(new_entries)}/{len(entries)} entries of {feed_url} are new since the last snapshot.")
+    return new_entries, snapshot
+
+
+def commit_snapshots(
+    archive: Optional[FeedArchive], snapshots: List[Snapshot], validators: Optional[PaperStore] = None,
+) -> None:
+    """Makes the staged snapshots the diff base of the next run (archive errors are only logged).
+
+    With `validators`, the ETag / Last-Modified of each fetched feed is saved too. They
+    are only saved here, after the entries were queued or posted: saved earlier, the
+    next poll would get a 304 and never see the entries of an interrupted one again.
+    """
+    if validators:
+        for snapshot in snapshots:
+            if snapshot.etag or snapshot.last_modified:
+                validators.save_feed_validators(snapshot.feed_url, snapshot.etag, snapshot.last_modified)
+    if archive is None or not snapshots:
         return
-    
-    logger.info(f"Found {len(all_results)} papers total matching local extraction logic.")
+    try:
+        archive.commit(snapshots)
+    except Exception as e:
+        logger.warning(f"Could not commit feed snapshots: {e}")
 
-    # 2. Filter Duplicates
-    new_papers = [p for p in all_results if p.entry_id not in existing_ids]
-    logger.info(f"Found {len(new_papers)} new papers after deduplication.")
 
-    if not new_papers:
-        logger.info("No new papers to send.")
+def _get_feed(feed_url: str, timeout: float, headers: Optional[Dict[str, str]] = None) -> requests.Response:
+    """Downloads one feed; 5xx and 429 responses raise so they are retried."""
+    response = requests.get(feed_url, headers={**RSS_HEADERS, **(headers or {})}, timeout=timeout)
+    if response.status_code >= 500 or response.status_code == 429:
+        retry_after = response.headers.get("Retry-After")
+        raise resilience.HTTPStatusError(
+            response.status_code, float(retry_after) if retry_after and retry_after.isdigit() else None)
+    return response
+
+
+def post_to_slack(**kwargs: Any) -> Any:
+    """Calls chat.postMessage through the shared "slack" dependency (breaker and deadline).
+
+    A post is not idempotent, so it is only retried when Slack certainly did not
+    receive it (rate limit, connection failure); a timed-out post is not repeated.
+    """
+    def attempt(timeout: float) -> Any:
+        slack_client.timeout = timeout
+        return slack_client.chat_postMessage(**kwargs)
+
+    return resilience.dependency("slack").call(attempt, idempotent=False)
+
+
+def _conditional_headers(etag: Optional[str], last_modified: Optional[str]) -> Dict[str, str]:
+    """Builds If-None-Match / If-Modified-Since headers from stored validators."""
+    headers = {}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+    return headers
+
+
+def _fetch_feed(
+    feed_url: str,
+    archive: Optional[FeedArchive],
+    validators: Optional[PaperStore],
+    stats: Dict[str, List[str]],
+    staged: List[Snapshot],
+) -> Optional[List[Any]]:
+    """Downloads, parses and filters one feed; returns None (counted in stats) if it failed or is unchanged."""
+    try:
+        logger.info(f"Requesting RSS feed: {feed_url}")
+        headers = _conditional_headers(*validators.feed_validators(feed_url)) if validators else None
+        response = resilience.dependency("feeds").call(lambda timeout: _get_feed(feed_url, timeout, headers))
+        if validators and response.status_code == 304:
+            logger.info(f"{feed_url} is unchanged since the last poll.")
+            stats["unchanged"].append(feed_url)
+            return None
+        if response.status_code != 200:
+            logger.warning(f"Non-200 status code from {feed_url}: {response.status_code}")
+            stats["failed"].append(feed_url)
+            return None
+
+        feed = feedparser.parse(response.content)
+        if getattr(feed, 'bozo', False):
+            logger.warning(f"Bozo exception parsing {feed_url} (malformed XML?): {feed.bozo_exception}")
+        entries, snapshot = select_new_entries(feed_url, response.content, feed.entries, archive)
+        if validators:
+            # 検証子はエントリの処理後に commit_snapshots で保存する (先に保存すると中断時に304で取りこぼす)
+            snapshot = snapshot or Snapshot(feed_url, "", [], None)
+            snapshot.etag = response.headers.get("ETag")
+            snapshot.last_modified = response.headers.get("Last-Modified")
+        if snapshot is not None:
+            staged.append(snapshot)
+        return entries
+
+    except (requests.exceptions.Timeout, resilience.DeadlineExceeded):
+        logger.error(f"Timeout while fetching {feed_url}")
+    except resilience.CircuitOpenError as e:
+        logger.error(f"Skipping {feed_url}: {e}")
+    except Exception as e:
+        logger.exception(f"Unexpected error processing {feed_url}: {e}")
+    stats["failed"].append(feed_url)
+    return None
+
+
+def fetch_feeds(
+    rss_feeds: List[str],
+    archive: Optional[FeedArchive] = None,
+    validators: Optional[PaperStore] = None,
+    stats: Optional[Dict[str, List[str]]] = None,
+    staged: Optional[List[Snapshot]] = None,
+) -> Iterator[Tuple[str, List[Any]]]:
+    """Downloads and parses each RSS feed exactly once, one feed at a time.
+
+    The next feed is only downloaded after the consumer (match_profiles) is done with
+    the previous one, so a single feed's entries are held in memory at a time.
+
+    Args:
+        rss_feeds (List[str]): Feed URLs.
+        archive (Optional[FeedArchive], optional): Snapshot archive for differential processing.
+        validators (Optional[PaperStore], optional): Store of ETag / Last-Modified validators.
+            When given, feeds are requested conditionally and unchanged feeds (304) are
+            skipped without counting as failures. New validators travel with the staged
+            snapshots and are saved by commit_snapshots.
+        stats (Optional[Dict[str, List[str]]], optional): Filled with the "failed" and
+            "unchanged" feed URLs as the feeds are consumed.
+        staged (Optional[List[Snapshot]], optional): Collects the snapshots staged in the
+            archive; commit them (commit_snapshots) once the entries have been handled.
+
+    Yields:
+        Tuple[str, List[Any]]: (feed_url, entries to match) per fetched feed.
+    """
+    stats = stats if stats is not None else {}
+    stats.setdefault("failed", [])
+    stats.setdefault("unchanged", [])
+    staged = staged if staged is not None else []
+    for feed_url in rss_feeds:
+        entries = _fetch_feed(feed_url, archive, validators, stats, staged)
+        if entries is not None:
+            yield feed_url, entries
+        # 次のフィードの取得中に前のフィードのエントリを保持しない
+        del entries
+
+
+def _entry_to_paper(entry: Dict[str, Any], title_clean: str, summary_clean: str, spill: AbstractSpill) -> Paper:
+    """Builds a Paper from a feed entry whose title and summary are already cleaned."""
+    published_parsed = entry.get('published_parsed') or entry.get('updated_parsed')
+    if published_parsed:
+        published_dt = datetime.fromtimestamp(time.mktime(published_parsed), tz=timezone.utc)
+    else:
+        published_dt = datetime.now(timezone.utc)
+
+    return Paper(
+        title=title_clean.replace('\\n', ' '),
+        summary=summary_clean.replace('\\n', ' '),
+        entry_id=entry.get('link', ''),
+        published=published_dt,
+        spill=spill,
+    )
+
+
+def selection_size(profile: Profile) -> int:
+    """Number of candidates kept per profile: the papers to post plus spares for failures."""
+    return profile.num_papers + config.SELECTION_SPARE_CANDIDATES
+
+
+def match_profiles(
+    feeds: Iterable[Tuple[str, Iterable[Any]]],
+    profiles: List[Profile],
+    existing_ids: Optional[Dict[str, Set[str]]] = None,
+    sizes: Optional[Dict[str, int]] = None,
+) -> Dict[str, Reservoir]:
+    """Evaluates every profile against each entry in a single pass over the parsed feeds.
+
+    Matches are streamed into a fixed-size reservoir per profile, so memory stays
+    bounded by the sample size however many entries match. Given fetch_feeds, each
+    feed is matched and dropped before the next one is downloaded. A Paper (with its
+    abstract spilled to disk) is only built for entries admitted to a reservoir.
+
+    Args:
+        feeds (Iterable[Tuple[str, Iterable[Any]]]): (feed_url, entries) pairs.
+        profiles (List[Profile]): Profiles to evaluate.
+        existing_ids (Optional[Dict[str, Set[str]]], optional): Paper IDs already posted
+            per profile; they are excluded before sampling.
+        sizes (Optional[Dict[str, int]], optional): Sample size per profile name.
+            Defaults to selection_size().
+
+    Returns:
+        Dict[str, Reservoir]: Uniform random sample of new matching papers per profile name.
+            `seen` holds the number of new matches; an entry listed in several feeds is
+            only recognized as a duplicate while it is sampled, so the count is approximate.
+            A paper sampled for several profiles is the same object in each reservoir.
+    """
+    existing_ids = existing_ids or {}
+    sizes = sizes or {}
+    spill = AbstractSpill()
+    candidates = {
+        p.name: Reservoir(sizes.get(p.name, selection_size(p)), key=lambda paper: paper.entry_id) for p in profiles
+    }
+
+    for feed_url, entries in feeds:
+        feed_matches = 0
+        feed_entries = 0
+        for entry in entries:
+            feed_entries += 1
+            title_clean = re.sub(r'<[^>]+>', '', entry.get('title', ''))
+            summary_clean = re.sub(r'<[^>]+>', '', entry.get('summary', ''))
+            text = title_clean + " " + summary_clean
+            entry_id = entry.get('link', '')
+
+            paper = None
+            matched = False
+            for profile in profiles:
+                if entry_id in candidates[profile.name] or entry_id in existing_ids.get(profile.name, ()):
+                    continue
+                if not matches_query(text, profile.keywords_ai, profile.keywords_domain):
+                    continue
+                matched = True
+                slot = candidates[profile.name].admit()
+                if slot is None:
+                    continue
+                if paper is None:
+                    paper = _entry_to_paper(entry, title_clean, summary_clean, spill)
+                candidates[profile.name].put(slot, paper)
+            if matched:
+                feed_matches += 1
+
+        logger.info(f"Extracted {feed_matches} matching papers from {feed_url} (out of {feed_entries} entries).")
+        # 次のフィードの取得中に処理済みのエントリを保持しない
+        del entries
+    for profile in profiles:
+        reservoir = candidates[profile.name]
+        logger.info(f"[{profile.name}] Kept {len(reservoir)} of {reservoir.seen} new matching papers.")
+    return candidates
+
+
+def publish_posted_registry(store: PaperStore) -> None:
+    """Publishes the posted message registry, if configured; failures are only logged.
+
+    Called after every recorded post, so the listener accepts reactions to a message
+    while the invocation that posted it is still running (or after it was killed).
+    """
+    if not POSTED_REGISTRY_PATH:
         return
+    try:
+        count = publish_registry(store, POSTED_REGISTRY_PATH, config.POSTED_REGISTRY_RETENTION_DAYS)
+        logger.info(f"Published {count} posted messages to {POSTED_REGISTRY_PATH}")
+    except Exception as e:
+        logger.error(f"Could not publish the posted message registry to {POSTED_REGISTRY_PATH}: {e}")
+
+
+def post_profile(
+    profile: Profile,
+    papers: List[Paper],
+    existing_ids: Set[str],
+    store: PaperStore,
+    summary_cache: Dict[str, PaperSummary],
+    budget: Optional[RunBudget] = None,
+    checkpoint: Optional[Dict[str, Any]] = None,
+    ledger: Optional[RunLedger] = None,
+) -> Tuple[int, bool]:
+    """Selects, summarizes and posts papers for one profile.
+
+    The remaining selection is checkpointed in the store after every paper, so an
+    invocation that runs out of time (or is killed) is resumed by the next one.
+    Papers of themes the team rarely reacts to are deferred with a probability
+    given by ThemeWeights and only posted once the other candidates are used up.
+    The decision is made before the paper is summarized (see engagement.estimate_theme).
+
+    Args:
+        profile (Profile): The profile to post for.
+        papers (List[Paper]): Papers matching the profile's keywords.
+        existing_ids (Set[str]): Paper IDs already posted for the profile.
+        store (PaperStore): The local system of record.
+        summary_cache (Dict[str, PaperSummary]): LLM results shared between profiles in this run.
+        budget (Optional[RunBudget], optional): Remaining-time budget. Defaults to unlimited.
+        checkpoint (Optional[Dict[str, Any]], optional): Resume state of an interrupted run.
+            When given, its queue is used instead of `papers`.
+        ledger (Optional[RunLedger], optional): Run ledger. Posts and LLM summaries recorded
+            there by any run of the day are not repeated.
+
+    Returns:
+        Tuple[int, bool]: Number of papers posted in this invocation and whether the
+            profile's work is complete.
+    """
+    budget = budget or RunBudget()
+    slack_channel = profile.slack_channel
+
+    if checkpoint:
+        # 中断された実行の続き: 選択済みの候補・残り件数・投稿済みURLを引き継ぐ
+        new_papers = [p for p in map(_paper_from_state, checkpoint["queue"]) if p.entry_id not in existing_ids]
+        num_papers = checkpoint["remaining"]
+        sent_paper_urls = list(checkpoint["sent_urls"])
+        logger.info(f"[{profile.name}] Resuming from checkpoint: {num_papers} papers left, {len(new_papers)} candidates.")
+    else:
+        num_papers = profile.num_papers
+        logger.info(f"[{profile.name}] Found {len(papers)} papers total matching local extraction logic.")
+
+        # 2. Filter Duplicates
+        new_papers = [p for p in papers if p.entry_id not in existing_ids]
+        logger.info(f"[{profile.name}] Found {len(new_papers)} new papers after deduplication.")
+
+        if not new_papers:
+            logger.info(f"[{profile.name}] No new papers to send.")
+            return 0, True
+
+        # 3. Random Shuffle for selection. 要約済み (ポーリングでキュー済み・他プロファイルと共有) の論文を先に投稿する
+        random.shuffle(new_papers)
+        new_papers.sort(key=lambda p: p.entry_id not in summary_cache)
+        sent_paper_urls = []
 
-    # 3. Random Shuffle for selection
-    random.shuffle(new_papers)
-    
     # 4. Process until NUM_PAPERS sent
     papers_sent = 0
     paper_index = 0
-    
-    sent_paper_urls = []
+    weights = ThemeWeights.from_store(store, profile.name) if config.ENGAGEMENT_WEIGHTING else None
+    deferred: Set[str] = set()
+
+    def save_checkpoint() -> None:
+        store.save_checkpoint(profile.name, {
+            "remaining": num_papers - papers_sent,
+            "queue": [_paper_to_state(p) for p in new_papers[paper_index:]],
+            "sent_urls": sent_paper_urls,
+        })
+
+    save_checkpoint()
+
+    # 投稿予定の上位候補のみPDF本文の抜粋を取得 (要約済みの論文は除く)
+    excerpts: Dict[str, str] = {}
+    if config.FULLTEXT_ENRICHMENT:
+        excerpts = enrich_full_text(
+            [p.entry_id for p in new_papers[:num_papers] if p.entry_id not in summary_cache], FULLTEXT_CACHE_DIR)
 
     # Try to process papers until we hit the target count or run out of papers
     while papers_sent < num_papers and paper_index < len(new_papers):
+        if slack_client and not resilience.dependency("slack").available():
+            logger.warning(f"[{profile.name}] Slack circuit is open. Resuming in the next invocation.")
+            return papers_sent, False
+        if not budget.can_start_cycle():
+            logger.warning(
+                f"[{profile.name}] {budget.remaining_sec():.0f}s left, not enough for another paper "
+                f"(~{budget.cycle_estimate_sec:.0f}s). Resuming in the next invocation.")
+            return papers_sent, False
+
         paper = new_papers[paper_index]
         paper_index += 1
-        
+
+        # 反応の少ないテーマの論文は確率的に後回しにする (他の候補が尽きたら投稿)。
+        # LLMを呼ぶ前に判定し、要約が無い論文はキーワードからテーマを推定する
+        if weights and paper.entry_id not in deferred:
+            cached = summary_cache.get(paper.entry_id)
+            theme_id = cached.theme_id if cached else estimate_theme(paper.title, paper.summary)
+            if random.random() >= weights.weight(theme_id):
+                logger.info(f"[{profile.name}] Deferring low-engagement theme {theme_id}: {paper.title}")
+                deferred.add(paper.entry_id)
+                new_papers.append(paper)
+                continue
+
+        cycle_start = time.monotonic()
+        stage = post_stage(paper.entry_id)
+        if ledger and not ledger.claim(profile.name, stage):
+            logger.info(f"[{profile.name}] {paper.entry_id} was already handled by another run. Skipping.")
+            continue
+        posted = False
+
         try:
-            logger.info(f"Processing paper {papers_sent+1}/{num_papers} (Candidate {paper_index}): {paper.title}...")
+            logger.info(f"[{profile.name}] Processing paper {papers_sent+1}/{num_papers} (Candidate {paper_index}): {paper.title}...")
             
-            # AI Inference (with fallback safety)
-            ai_data = generate_paper_summary(paper.title, paper.summary)
+            # AI Inference (with fallback safety). 複数プロファイルに一致した論文は結果を共有
+            ai_data = summary_cache.get(paper.entry_id)
+            if ai_data is None and ledger:
+                recorded = ledger.result(SHARED_PROFILE, summary_stage(paper.entry_id))
+                ai_data = PaperSummary(**recorded) if recorded else None
+            if ai_data is None:
+                ai_data = generate_paper_summary(paper.title, paper.summary, full_text=excerpts.get(paper.entry_id))
+                if ledger and not ai_data.is_fallback:
+                    ledger.complete(SHARED_PROFILE, summary_stage(paper.entry_id), ai_data.to_dict())
+            summary_cache[paper.entry_id] = ai_data
             
             # Build Slack Blocks
             blocks, fallback_text = build_slack_blocks(paper, ai_data, papers_sent+1)
@@ -492,20 +897,28 @@ def main(slack_channel: str, query: str, max_results: int, num_papers: int) -> N
             logger.info(f"\n--- [Generated Slack Post] {paper.title} ---\n{fallback_text}\n------------------------------------------\n")
             
             slack_ts = ""
+            posted_channel = slack_channel
             if slack_client:
-                response = slack_client.chat_postMessage(                
+                response = post_to_slack(
                     channel=slack_channel,
                     text=fallback_text,
                     blocks=blocks
                 )
                 slack_ts = response['ts']
+                # Listenerのリアクションイベントと照合できるよう、チャンネル名ではなくIDで記録する
+                posted_channel = response.get('channel') or slack_channel
                 logger.info(f"Message posted: {slack_ts}")
                 sent_paper_urls.append(paper.entry_id) # Track for prompt
             else:
                 logger.info("Slack client not initialized, skipping post (would have posted).")
+            posted = True
+            if ledger:
+                ledger.complete(profile.name, stage, {"slack_ts": slack_ts})
 
-            # Save to sheets
-            save_to_sheets(paper, ai_data, slack_ts, insert_index=papers_sent)
+            # Record in the local store (mirrored to sheets by the replication job)
+            store.save_paper(paper, ai_data, slack_ts, posted_channel, profile.name)
+            # Listenerが次の投稿を待たずにこの投稿へのリアクションを受け付けられるよう、すぐに公開する
+            publish_posted_registry(store)
             
             papers_sent += 1
             
@@ -516,11 +929,17 @@ def main(slack_channel: str, query: str, max_results: int, num_papers: int) -> N
             logger.error(f"Slack API Error posting message: {e}")
         except Exception as e:
             logger.exception(f"Unexpected error in loop for paper {paper.title}: {e}")
+        finally:
+            if ledger and not posted:
+                ledger.release(profile.name, stage)
+            budget.record_cycle(time.monotonic() - cycle_start)
+            save_checkpoint()
 
-    logger.info(f"Finished. Sent {papers_sent}/{num_papers} papers.")
+    store.clear_checkpoint(profile.name)
+    logger.info(f"[{profile.name}] Finished. Sent {papers_sent}/{num_papers} papers.")
 
     # 5. Post Gemini Prompt Bundle
-    prompt_channel = config.SLACK_PROMPT_CHANNEL
+    prompt_channel = profile.prompt_channel or config.SLACK_PROMPT_CHANNEL
     if sent_paper_urls and prompt_channel and slack_client:
         try:
             logger.info(f"Posting Gemini prompt to {prompt_channel}")
@@ -528,18 +947,369 @@ def main(slack_channel: str, query: str, max_results: int, num_papers: int) -> N
             urls_block = "\n".join(sent_paper_urls)
             prompt_text = f"{urls_block}\nこれらの論文についてなにがすごいのか教えて"
             
-            slack_client.chat_postMessage(
+            post_to_slack(
                 channel=prompt_channel,
                 text=prompt_text
             )
             logger.info("Gemini prompt posted.")
         except Exception as e:
             logger.error(f"Failed to post Gemini prompt: {e}")
+    return papers_sent, True
+
+
+def _fetch_candidates(
+    profiles: List[Profile], existing_ids: Dict[str, Set[str]], archive: Optional[FeedArchive], staged: List[Snapshot],
+) -> Optional[Dict[str, List[Paper]]]:
+    """Fetches every feed once in this process and samples new matches for all profiles.
+
+    Returns:
+        Optional[Dict[str, List[Paper]]]: Sampled candidates per profile in random order,
+            or None if every feed failed.
+    """
+    logger.info("Fetching papers from arXiv RSS feeds...")
+    stats: Dict[str, List[str]] = {}
+    matched = match_profiles(fetch_feeds(RSS_FEEDS, archive, stats=stats, staged=staged), profiles, existing_ids)
+    if len(stats["failed"]) == len(RSS_FEEDS):
+        return None
+    return {name: reservoir.items() for name, reservoir in matched.items()}
+
+
+def _previous_ids(archive: FeedArchive, feed_url: str) -> Set[str]:
+    try:
+        return archive.previous_ids(feed_url)
+    except Exception as e:
+        logger.warning(f"Could not read previous snapshot of {feed_url}: {e}")
+        return set()
+
+
+def _collect_shards(
+    profiles: List[Profile],
+    invoker: Callable[[List[Dict[str, Any]]], List[ShardResult]],
+    existing_ids: Dict[str, Set[str]],
+    archive: Optional[FeedArchive],
+    staged: List[Snapshot],
+) -> Optional[Dict[str, List[Paper]]]:
+    """Runs the fetch and match shards in parallel and merges their shortlists.
+
+    The posted IDs and each feed's previous snapshot IDs travel in the shard payload;
+    workers read neither the store nor the archive, which their container may not see.
+    The raw feeds they return are staged in the coordinator's archive and added to
+    `staged` for the coordinator to commit.
+
+    Returns:
+        Optional[Dict[str, List[Paper]]]: Shortlisted papers per profile, or None if every feed failed.
+    """
+    previous_ids = {feed: _previous_ids(archive, feed) for feed in RSS_FEEDS} if archive else None
+    shards = plan_shards(RSS_FEEDS, profiles, config.SHARD_BY, existing_ids, previous_ids)
+    logger.info(f"Dispatching {len(shards)} shards (by {config.SHARD_BY}).")
+    merged = merge_results(invoker(shards))
+    for snapshot in merged["snapshots"] if archive else []:
+        try:
+            staged.append(archive.adopt(Snapshot(**snapshot)))
+        except Exception as e:
+            logger.warning(f"Could not archive snapshot of {snapshot['feed_url']}: {e}")
+    if set(merged["failed_feeds"]) >= set(RSS_FEEDS):
+        return None
+    return {
+        p.name: [_paper_from_state(state) for state in merged["candidates"].get(p.name, [])]
+        for p in profiles
+    }
+
+
+def _load_queue(store: PaperStore, profile: str, summary_cache: Dict[str, PaperSummary]) -> List[Paper]:
+    """Returns the papers queued by polling for a profile and adds their summaries to the cache."""
+    papers = []
+    for state, summary in store.queued(profile):
+        papers.append(_paper_from_state(state))
+        if summary:
+            summary_cache.setdefault(state["entry_id"], PaperSummary(**summary))
+    return papers
+
+
+def run_worker(shard: Dict[str, Any]) -> ShardResult:
+    """Fetches and matches one shard and returns a random shortlist per profile.
+
+    Papers the coordinator passed as already posted are excluded before sampling;
+    the worker opens neither the store nor the feed archive (another container may
+    not see them). Entries of the previous snapshots sent in the payload are skipped.
+
+    Args:
+        shard (Dict[str, Any]): {"feeds": [...], "profiles": [...], "archive": bool,
+            "existing_ids": {profile_name: [entry_id, ...]}, "previous_ids": {feed_url: [entry_id, ...]}}.
+
+    Returns:
+        ShardResult: Shortlisted paper states per profile, the feeds that failed and the
+            staged (uncommitted) feed snapshots with their compressed raw bytes.
+    """
+    profiles = [p for p in load_profiles() if p.name in shard["profiles"]]
+    use_archive = config.DIFFERENTIAL_PROCESSING and shard.get("archive", True)
+    archive = PayloadArchive(shard.get("previous_ids", {})) if use_archive else None
+    existing_ids = {p.name: set(shard.get("existing_ids", {}).get(p.name, ())) for p in profiles}
+    sizes = {p.name: max(config.SHARD_SHORTLIST_SIZE, selection_size(p)) for p in profiles}
+    stats: Dict[str, List[str]] = {}
+    staged: List[Snapshot] = []
+    matched = match_profiles(
+        fetch_feeds(shard["feeds"], archive, stats=stats, staged=staged), profiles, existing_ids, sizes)
+    shortlist = {name: [_paper_to_state(p) for p in reservoir.items()] for name, reservoir in matched.items()}
+    # スナップショットはコーディネーターが投稿後に確定する
+    return {"candidates": shortlist, "failed_feeds": stats["failed"], "snapshots": [asdict(s) for s in staged]}
+
+
+def run_profiles(
+    profiles: List[Profile],
+    budget: Optional[RunBudget] = None,
+    invoker: Optional[Callable[[List[Dict[str, Any]]], List[ShardResult]]] = None,
+    run_date: Optional[str] = None,
+) -> bool:
+    """Runs all profiles over a single fetch and parse of each feed.
+
+    Each profile is claimed in the run ledger first, so concurrent or retried runs of
+    the same day skip it. Profiles with a checkpoint from an interrupted invocation
+    resume it instead of selecting new papers; the feeds are only fetched for the
+    other profiles.
+
+    Args:
+        profiles (List[Profile]): Profiles to evaluate and post for.
+        budget (Optional[RunBudget], optional): Remaining-time budget. Defaults to unlimited.
+        invoker (Optional[Callable], optional): Runs fetch and match shards in parallel
+            (coordinator mode). None fetches every feed in this process.
+        run_date (Optional[str], optional): Ledger date of the run. Follow-up invocations
+            pass the date of the run they resume. Defaults to today (UTC).
+
+    Returns:
+        bool: True if every profile finished, False if work was checkpointed for later.
+    """
+    budget = budget or RunBudget()
+
+    store = open_store()
+    ledger = open_ledger(store, run_date)
+    claimed = [p for p in profiles if ledger.claim_run(p.name)]
+    for profile in profiles:
+        if profile not in claimed:
+            logger.info(f"[{profile.name}] Already completed or running for {ledger.run_date}. Skipping.")
+    if not claimed:
+        return True
+    profiles = claimed
+
+    # 0. Get existing papers for deduplication
+    existing_ids = {p.name: load_existing_ids(store, p.name) for p in profiles}
+    checkpoints = {p.name: store.load_checkpoint(p.name, config.CHECKPOINT_MAX_AGE_HOURS) for p in profiles}
+    fresh_profiles = [p for p in profiles if checkpoints[p.name] is None]
+
+    # 1. Fetch from arXiv RSS Feeds (once for all profiles)
+    candidates: Dict[str, List[Paper]] = {}
+    summary_cache: Dict[str, PaperSummary] = {}
+    archive = open_archive()
+    staged: List[Snapshot] = []
+    if fresh_profiles:
+        if invoker is None:
+            fetched = _fetch_candidates(fresh_profiles, existing_ids, archive, staged)
+        else:
+            fetched = _collect_shards(fresh_profiles, invoker, existing_ids, archive, staged)
+        if fetched is None:
+            error_msg = "⚠️ arXiv RSSからの論文取得中に全フィードでエラーが発生しました。取得処理全体をスキップします。"
+            logger.error(error_msg)
+            for slack_channel in dict.fromkeys(p.slack_channel for p in fresh_profiles):
+                if slack_client and slack_channel:
+                    try:
+                        post_to_slack(channel=slack_channel, text=error_msg)
+                    except Exception as slack_e:
+                        logger.error(f"Failed to post error to Slack: {slack_e}")
+            for profile in fresh_profiles:
+                ledger.release_run(profile.name)
+            if len(fresh_profiles) == len(profiles):
+                return True
+            profiles = [p for p in profiles if checkpoints[p.name] is not None]
+        else:
+            candidates = fetched
+            # ポーリングでキューに入った論文 (要約済み) を候補に加える
+            for profile in fresh_profiles:
+                queued = _load_queue(store, profile.name, summary_cache)
+                queued_ids = {p.entry_id for p in queued}
+                candidates[profile.name] = queued + [
+                    p for p in candidates.get(profile.name, []) if p.entry_id not in queued_ids]
+    else:
+        logger.info("All profiles resume from checkpoints. Skipping feed fetch.")
+
+    completed = True
+    for profile in profiles:
+        _, finished = post_profile(
+            profile, candidates.get(profile.name, []), existing_ids[profile.name], store, summary_cache,
+            budget, checkpoints[profile.name], ledger)
+        if finished:
+            ledger.complete_run(profile.name)
+        else:
+            ledger.release_run(profile.name)
+        completed = completed and finished
+    # 全プロファイルの投稿 (またはチェックポイント保存) が済んでから差分の基準を更新する
+    commit_snapshots(archive, staged)
+
+    logger.info(f"LLM metrics: {json.dumps(get_llm_metrics())}")
+    logger.info(f"Dependency health: {json.dumps(resilience.snapshot())}")
+
+    # 投稿ごとに公開済み。保持期間を過ぎた投稿を外すため、投稿が無くても再公開する
+    publish_posted_registry(store)
+    return completed
+
+
+def poll_profiles(profiles: List[Profile], budget: Optional[RunBudget] = None) -> Dict[str, int]:
+    """Polls the feeds once and prepares new matches ahead of the scheduled run.
+
+    Feeds are requested conditionally, so an unchanged feed costs one 304 response.
+    New matches (a sample of up to selection_size per profile, minus what is already
+    queued) are summarized right away and queued with their summaries; with
+    config.FULLTEXT_ENRICHMENT only the ones filling the remaining num_papers slots get
+    a full-text excerpt, the spares are summarized from the abstract. The scheduled
+    run posts queued papers first without waiting for the LLM. With
+    config.POLL_POST_IMMEDIATELY they are posted in this invocation instead, up to each
+    profile's num_papers per day (UTC).
+
+    Args:
+        profiles (List[Profile]): Profiles to evaluate.
+        budget (Optional[RunBudget], optional): Remaining-time budget. Defaults to unlimited.
+
+    Returns:
+        Dict[str, int]: Unchanged and failed feeds, queued and posted papers.
+    """
+    budget = budget or RunBudget()
+    store = open_store()
+    store.prune_queue(config.POLL_QUEUE_MAX_AGE_HOURS)
+
+    archive = open_archive()
+    existing_ids = {p.name: load_existing_ids(store, p.name) for p in profiles}
+    queued_ids = {p.name: {state["entry_id"] for state, _ in store.queued(p.name)} for p in profiles}
+    feed_stats: Dict[str, List[str]] = {}
+    staged: List[Snapshot] = []
+    matched = match_profiles(
+        fetch_feeds(RSS_FEEDS, archive, validators=store, stats=feed_stats, staged=staged), profiles,
+        {p.name: existing_ids[p.name] | queued_ids[p.name] for p in profiles},
+        {p.name: max(0, selection_size(p) - len(queued_ids[p.name])) for p in profiles})
+    stats = {"unchanged_feeds": len(feed_stats["unchanged"]), "failed_feeds": len(feed_stats["failed"]),
+             "queued": 0, "posted": 0}
+    if any(reservoir.seen for reservoir in matched.values()):
+        new_matches = {name: reservoir.items() for name, reservoir in matched.items()}
+        # 投稿枠に入る上位候補のみPDF本文の抜粋を取得 (予備候補は抄録のみで要約する)
+        excerpts: Dict[str, str] = {}
+        if config.FULLTEXT_ENRICHMENT:
+            shortlist = [
+                paper.entry_id for p in profiles
+                for paper in new_matches.get(p.name, [])[:max(0, p.num_papers - len(queued_ids[p.name]))]]
+            excerpts = enrich_full_text(shortlist, FULLTEXT_CACHE_DIR)
+
+        summaries: Dict[str, PaperSummary] = {}
+        for profile in profiles:
+            for paper in new_matches.get(profile.name, []):
+                if paper.entry_id not in summaries:
+                    if not budget.can_start_cycle():
+                        logger.warning("Not enough time left to summarize more papers. Continuing in the next poll.")
+                        # 次のポーリングで同じエントリを再度照合できるよう、スナップショットを確定しない
+                        staged.clear()
+                        break
+                    started = time.monotonic()
+                    summaries[paper.entry_id] = generate_paper_summary(
+                        paper.title, paper.summary, full_text=excerpts.get(paper.entry_id))
+                    budget.record_cycle(time.monotonic() - started)
+                ai_data = summaries[paper.entry_id]
+                # フォールバック結果はキューに残さず、投稿時に要約し直す
+                store.enqueue(profile.name, _paper_to_state(paper), None if ai_data.is_fallback else ai_data.to_dict())
+                stats["queued"] += 1
+
+    if config.POLL_POST_IMMEDIATELY:
+        ledger = open_ledger(store)
+        day_start = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0).isoformat()
+        summary_cache: Dict[str, PaperSummary] = {}
+        for profile in profiles:
+            remaining = profile.num_papers - store.posted_since(profile.name, day_start)
+            queued = _load_queue(store, profile.name, summary_cache)
+            if remaining <= 0 or not queued:
+                continue
+            sent, _ = post_profile(
+                replace(profile, num_papers=remaining), queued, existing_ids[profile.name], store, summary_cache,
+                budget, None, ledger)
+            stats["posted"] += sent
+
+    # キューへの登録 (と即時投稿) が済んでから差分の基準と条件付きリクエストの検証子を更新する
+    commit_snapshots(archive, staged, validators=store)
+    logger.info(f"Poll finished: {json.dumps(stats)}")
+    return stats
+
+
+def reconcile_reactions(profiles: List[Profile]) -> Dict[str, Any]:
+    """Corrects the recorded reactions of recent posts from Slack and writes them to Sheets.
+
+    Args:
+        profiles (List[Profile]): Profiles, for the sheet tab of each post.
+
+    Returns:
+        Dict[str, Any]: Reconciliation counts and status (see reconcile.ReactionReconciler.run)
+            and the number of rows written to Sheets ('mirrored').
+    """
+    if not slack_client:
+        logger.warning("SLACK_API_TOKEN not set. Skipping reaction reconciliation.")
+        return {}
+    store = open_store()
+    reconciler = ReactionReconciler(store, slack_client)
+    stats = reconciler.run()
+    stats["mirrored"] = mirror_reactions(store, reconciler.corrected, sheet_tabs=sheet_tabs(profiles))
+    return stats
+
+
+def replay_matching(archive: FeedArchive, profiles: List[Profile]) -> Dict[str, int]:
+    """Runs matching offline against the newest archived snapshot of every feed.
+
+    No network, LLM, Slack or store access; useful for benchmarking and keyword tuning.
+    Counts are taken from the sampling stream, so they are not capped by the sample size.
+
+    Args:
+        archive (FeedArchive): The snapshot archive.
+        profiles (List[Profile]): Profiles to evaluate.
+
+    Returns:
+        Dict[str, int]: Number of matching papers per profile name.
+    """
+    feeds = ((s.feed_url, feedparser.parse(s.read_raw()).entries) for s in archive.latest_snapshots())
+    return {name: reservoir.seen for name, reservoir in match_profiles(feeds, profiles).items()}
+
+
+def main(slack_channel: str, query: str, max_results: int, num_papers: int) -> None:
+    """Main execution entry point for a single ad-hoc profile.
+
+    Fetches papers from Arxiv, filters duplicates, generates summaries, posts to Slack,
+    and records metadata in the local store. Google Sheets is updated later by
+    the separately scheduled replication job (--replicate). Uses the keywords of
+    config.py under the default profile.
+
+    Args:
+        slack_channel (str): The Slack channel ID or name to post to.
+        query (str): The Arxiv search query.
+        max_results (int): Maximum number of papers to fetch from Arxiv API.
+        num_papers (int): Number of papers to select and post.
+    """        
+    profile = Profile(
+        name=DEFAULT_PROFILE,
+        keywords_ai=config.keywords_ai,
+        keywords_domain=config.keywords_domain,
+        slack_channel=slack_channel,
+        num_papers=num_papers,
+    )
+    run_profiles([profile])
 
 
 def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     """AWS Lambda entry point.
 
+    The event {"mode": "replicate"} runs the Sheets replication job on its own
+    schedule (notification runs never write to Sheets), {"mode": "export"} only the
+    incremental columnar export of the history, {"mode": "poll"} one low-latency poll of the
+    feeds (see poll_profiles) and {"mode": "reconcile"} the bulk correction of recorded
+    reactions from Slack's history (see reconcile_reactions). {"mode": "coordinator"} runs the notification
+    flow with feed fetching and matching sharded over parallel invocations of this
+    function, which receive {"mode": "worker", "shard": ...}. Any other event runs the
+    notification flow in this invocation. Notification runs are planned against the
+    remaining invocation time; unfinished work is checkpointed and resumed by an
+    asynchronous follow-up invocation with the same event plus {"run_date", "followup"}
+    (up to config.RUN_FOLLOWUP_MAX_INVOCATIONS).
+
     Args:
         event (Dict[str, Any]): The Lambda event payload.
         context (Any): The Lambda context object.
@@ -547,7 +1317,38 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     Returns:
         Dict[str, Any]: The response object containing statusCode and body.
     """
-    main(SLACK_CHANNEL, ARXIV_QUERY, MAX_RESULTS, NUM_PAPERS)
+    event = event or {}
+    mode = event.get("mode")
+    resilience.set_deadline(RunBudget.from_context(context).remaining_sec)
+    if mode == "replicate":
+        stats = mirror_to_sheets(open_store(), sheet_tabs=sheet_tabs(load_profiles()),
+                                 budget=RunBudget.from_context(context))
+        return {'statusCode': 200, 'body': json.dumps(stats)}
+    if mode == "poll":
+        stats = poll_profiles(load_profiles(), RunBudget.from_context(context))
+        return {'statusCode': 200, 'body': json.dumps(stats)}
+    if mode == "reconcile":
+        return {'statusCode': 200, 'body': json.dumps(reconcile_reactions(load_profiles()))}
+    if mode == "export":
+        return {'statusCode': 200, 'body': json.dumps(HistoryExporter(open_store(), EXPORT_DIR).run())}
+    if mode == "worker":
+        return {'statusCode': 200, 'body': json.dumps(run_worker(event["shard"]), ensure_ascii=False)}
+
+    invoker = LambdaShardInvoker(os.environ["AWS_LAMBDA_FUNCTION_NAME"]) if mode == "coordinator" else None
+    run_date = event.get("run_date") or datetime.now(timezone.utc).date().isoformat()
+    if not run_profiles(load_profiles(), RunBudget.from_context(context), invoker, run_date):
+        followup = int(event.get("followup", 0)) + 1
+        function_name = getattr(context, "function_name", None)
+        if function_name and followup <= config.RUN_FOLLOWUP_MAX_INVOCATIONS:
+            schedule_followup(function_name, {**event, "run_date": run_date, "followup": followup})
+            message = f'時間内に処理しきれなかったため中断しました。後続の呼び出し ({followup}回目) で再開します。'
+        else:
+            logger.error(f"Run {run_date} is unfinished and no follow-up is left. The next scheduled run resumes it.")
+            message = '時間内に処理しきれなかったため中断しました。次回の実行で再開します。'
+        return {
+            'statusCode': 200,
+            'body': json.dumps(message)
+        }
     return {
         'statusCode': 200,
         'body': json.dumps('Slackへの投稿が完了しました。')
@@ -559,6 +1360,29 @@ if __name__ == "__main__":
     parser.add_argument('--query', type=str, default=ARXIV_QUERY, help='Search query for arxiv')
     parser.add_argument('--max_results', type=int, default=MAX_RESULTS, help='Maximum number of papers to fetch')
     parser.add_argument('--num_papers', type=int, default=NUM_PAPERS, help='Number of papers to randomly select')
+    parser.add_argument('--replicate', action='store_true', help='Only mirror the local store to Google Sheets')
+    parser.add_argument('--all_profiles', action='store_true', help='Run every profile in config.PROFILES')
+    parser.add_argument('--replay', action='store_true', help='Match the archived feed snapshots offline and print counts')
+    parser.add_argument('--poll', action='store_true', help='Poll the feeds once and queue (or post) new matches')
+    parser.add_argument('--reconcile', action='store_true', help="Correct recorded reactions from Slack's message history")
+    parser.add_argument('--export', action='store_true', help='Export the paper and reaction history to columnar files')
+    parser.add_argument('--sharded', action='store_true', help='Run every profile with fetch and match sharded over local processes')
     
     args = parser.parse_args()
-    main(args.slack_channel, args.query, args.max_results, args.num_papers)
+    if args.replicate:
+        mirror_to_sheets(open_store(), sheet_tabs=sheet_tabs(load_profiles()))
+    elif args.poll:
+        print(json.dumps(poll_profiles(load_profiles())))
+    elif args.reconcile:
+        print(json.dumps(reconcile_reactions(load_profiles())))
+    elif args.export:
+        print(json.dumps(HistoryExporter(open_store(), EXPORT_DIR).run()))
+    elif args.replay:
+        archive = FeedArchive(require_durable_path(FEED_ARCHIVE_DIR, "FEED_ARCHIVE_DIR"))
+        print(json.dumps(replay_matching(archive, load_profiles())))
+    elif args.sharded:
+        run_profiles(load_profiles(), invoker=LocalShardInvoker(run_worker))
+    elif args.all_profiles:
+        run_profiles(load_profiles())
+    else:
+        main(args.slack_channel, args.query, args.max_results, args.num_papers)
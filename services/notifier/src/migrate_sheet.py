@@ -0,0 +1,140 @@
+"""One-time migration of an existing sheet to the append-only layout.
+
+The legacy layout inserted every new paper at row 2, so the physical order is
+newest-first. This tool rewrites the rows oldest-first, assigns a stable Row ID
+(column I), adds a "Newest first" filter view sorted by Row ID and records the
+row positions in the local store.
+
+Usage:
+    python src/migrate_sheet.py [--dry-run] [--profile NAME]
+"""
+import argparse
+import logging
+import os
+from typing import Any, Dict, List, Optional
+
+import config
+from profiles import load_profiles, sheet_tabs
+from replication import SPREADSHEET_ID, a1_range, build_sheets_service, execute_with_retry, resolve_sheet_id
+from storage import DEFAULT_PROFILE, PaperStore, require_durable_path
+
+logger = logging.getLogger(__name__)
+
+ROW_ID_COLUMN_INDEX = 8  # Column I
+FILTER_VIEW_TITLE = "Newest first"
+
+
+def plan_migration(rows: List[List[Any]]) -> List[List[Any]]:
+    """Reorders legacy newest-first rows to oldest-first and assigns Row IDs.
+
+    Args:
+        rows (List[List[Any]]): Data rows (A2:I) in the current physical order.
+
+    Returns:
+        List[List[Any]]: Rows padded to columns A-I, oldest first, with column I set to 1..N.
+    """
+    migrated = []
+    for row_id, row in enumerate(reversed(rows), start=1):
+        padded = list(row[:ROW_ID_COLUMN_INDEX]) + [''] * (ROW_ID_COLUMN_INDEX - len(row))
+        migrated.append(padded + [row_id])
+    return migrated
+
+
+def _has_filter_view(service: Any, tab: Optional[str]) -> bool:
+    """Returns True if the tab already has the "Newest first" filter view."""
+    result = execute_with_retry(service.spreadsheets().get(
+        spreadsheetId=SPREADSHEET_ID, fields="sheets(properties(sheetId,title),filterViews(title))"))
+    for sheet in result.get('sheets', []):
+        properties = sheet.get('properties', {})
+        if (properties.get('title') == tab) if tab else (properties.get('sheetId') == 0):
+            return any(view.get('title') == FILTER_VIEW_TITLE for view in sheet.get('filterViews', []))
+    return False
+
+
+def _add_filter_view(service: Any, tab: Optional[str]) -> None:
+    """Adds the "Newest first" filter view sorted by Row ID."""
+    execute_with_retry(service.spreadsheets().batchUpdate(
+        spreadsheetId=SPREADSHEET_ID,
+        body={'requests': [{
+            'addFilterView': {
+                'filter': {
+                    'title': FILTER_VIEW_TITLE,
+                    'range': {'sheetId': resolve_sheet_id(service, tab), 'startRowIndex': 0},
+                    'sortSpecs': [{'dimensionIndex': ROW_ID_COLUMN_INDEX, 'sortOrder': 'DESCENDING'}]
+                }
+            }
+        }]}
+    ), idempotent=False)
+
+
+def migrate_sheet(
+    service: Any,
+    store: Optional[PaperStore] = None,
+    dry_run: bool = False,
+    profile: str = DEFAULT_PROFILE,
+    tab: Optional[str] = None,
+) -> Dict[str, int]:
+    """Migrates a profile's sheet tab to the append-only layout.
+
+    The rows and the filter view are checked separately, so a run that failed after
+    rewriting the rows adds the missing filter view when it is run again.
+
+    Args:
+        service (Any): Google Sheets API client.
+        store (Optional[PaperStore], optional): Local store to update with row positions.
+        dry_run (bool, optional): Only report what would change. Defaults to False.
+        profile (str, optional): Profile the tab belongs to. Defaults to "default".
+        tab (Optional[str], optional): Sheet tab name. None means the first sheet.
+
+    Returns:
+        Dict[str, int]: Number of migrated 'rows' and of added 'filter_views' (0 or 1).
+    """
+    result = execute_with_retry(service.spreadsheets().values().get(
+        spreadsheetId=SPREADSHEET_ID, range=a1_range(tab, "A2:I")))
+    rows = [row for row in result.get('values', []) if row]
+    if any(len(row) > ROW_ID_COLUMN_INDEX and row[ROW_ID_COLUMN_INDEX] != '' for row in rows):
+        logger.warning("Sheet already has Row IDs. Skipping row migration.")
+        migrated = []
+    else:
+        migrated = plan_migration(rows)
+        logger.info(f"Migrating {len(migrated)} rows to the append-only layout (dry_run={dry_run}).")
+    add_view = not _has_filter_view(service, tab)
+    if add_view:
+        logger.info(f"Adding the '{FILTER_VIEW_TITLE}' filter view (dry_run={dry_run}).")
+    stats = {"rows": len(migrated), "filter_views": int(add_view)}
+    if dry_run:
+        return stats
+
+    if migrated:
+        execute_with_retry(service.spreadsheets().values().batchUpdate(
+            spreadsheetId=SPREADSHEET_ID,
+            body={'valueInputOption': 'RAW', 'data': [
+                {'range': a1_range(tab, "I1"), 'values': [["Row ID"]]},
+                {'range': a1_range(tab, f"A2:I{len(migrated) + 1}"), 'values': migrated},
+            ]}
+        ))
+        if store is not None:
+            # F列 (URL/Entry ID) をキーに行ID・物理行・G列 (Slack TS) を記録
+            store.assign_sheet_rows([
+                (row[5], row[ROW_ID_COLUMN_INDEX], sheet_row, row[6])
+                for sheet_row, row in enumerate(migrated, start=2) if row[5]
+            ], profile)
+    if add_view:
+        _add_filter_view(service, tab)
+    return stats
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description='Migrate the papers sheet to the append-only layout')
+    parser.add_argument('--dry-run', action='store_true', help='Only report the number of rows to migrate')
+    parser.add_argument('--profile', type=str, default=DEFAULT_PROFILE, help='Profile whose sheet tab to migrate')
+    args = parser.parse_args()
+    tabs = sheet_tabs(load_profiles())
+
+    sheets_service = build_sheets_service()
+    if sheets_service is None:
+        raise SystemExit("GOOGLE_SERVICE_ACCOUNT_JSON and SPREADSHEET_ID must be set.")
+    db_path = require_durable_path(os.environ.get("PAPER_DB_PATH", config.PAPER_DB_PATH))
+    print(migrate_sheet(sheets_service, PaperStore(db_path), dry_run=args.dry_run,
+                        profile=args.profile, tab=tabs.get(args.profile)))
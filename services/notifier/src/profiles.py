@@ -0,0 +1,42 @@
+"""Named notification profiles (keywords, channel, NUM_PAPERS and sheet tab)."""
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+import config
+
+
+@dataclass
+class Profile:
+    """A keyword profile posting to its own channel and sheet tab."""
+    name: str
+    keywords_ai: str
+    keywords_domain: str
+    slack_channel: str
+    num_papers: int = config.NUM_PAPERS
+    sheet_tab: Optional[str] = None
+    prompt_channel: Optional[str] = None
+
+
+def load_profiles(raw_profiles: Optional[List[Dict[str, Any]]] = None) -> List[Profile]:
+    """Builds Profile objects from config.PROFILES.
+
+    Args:
+        raw_profiles (Optional[List[Dict[str, Any]]], optional): Profile dictionaries.
+            Defaults to config.PROFILES.
+
+    Returns:
+        List[Profile]: Profiles in configuration order.
+
+    Raises:
+        ValueError: If two profiles share the same name.
+    """
+    profiles = [Profile(**raw) for raw in (config.PROFILES if raw_profiles is None else raw_profiles)]
+    names = [p.name for p in profiles]
+    if len(names) != len(set(names)):
+        raise ValueError(f"Duplicate profile names: {names}")
+    return profiles
+
+
+def sheet_tabs(profiles: List[Profile]) -> Dict[str, Optional[str]]:
+    """Returns the sheet tab of each profile keyed by profile name."""
+    return {p.name: p.sheet_tab for p in profiles}
@@ -0,0 +1,184 @@
+"""Periodic reconciliation of the recorded reactions with Slack.
+
+Reaction events the listener never received (timeouts, exhausted Slack retries,
+deploys) leave the store and the Reactions column drifting for good. The
+reconciler reads the reactions of every notifier post in a time window in bulk:
+one conversations.history page returns up to `page_size` messages together with
+their reactions, instead of one reactions.get call per message. The difference
+to the store is applied per message, and the caller writes all corrected rows
+to Sheets in one batch update (replication.mirror_reactions).
+
+Slack calls go through the shared "slack" dependency, which waits for
+Retry-After on 429 responses; pages are additionally spaced by
+`page_interval_sec` to stay below the method's rate limit.
+"""
+import logging
+import time
+from collections import Counter, defaultdict
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+import emoji
+
+import config
+import resilience
+from storage import PaperStore
+
+logger = logging.getLogger(__name__)
+
+
+def reaction_display_name(reaction: str) -> str:
+    """Converts a Slack reaction name to the form the listener records (e.g. "tada" -> 🎉).
+
+    Keep in sync with reaction_display_name in services/listener/src/main.py.
+    """
+    reaction_emoji = emoji.emojize(f":{reaction}:", language='alias')
+    return reaction if reaction_emoji == f":{reaction}:" else reaction_emoji
+
+
+def slack_reactions(message: Dict[str, Any]) -> Tuple[Set[Tuple[str, str]], Set[str]]:
+    """Returns the (reaction, user) pairs of a history message.
+
+    Slack truncates the user list of heavily used reactions; those reactions are
+    returned separately, since users missing from the list may still have reacted.
+
+    Returns:
+        Tuple[Set[Tuple[str, str]], Set[str]]: (reaction, user) pairs and the reactions
+            with a truncated user list.
+    """
+    pairs = set()
+    truncated = set()
+    for reaction in message.get("reactions", []):
+        name = reaction_display_name(reaction["name"])
+        users = reaction.get("users", [])
+        pairs.update((name, user) for user in users)
+        if reaction.get("count", len(users)) > len(users):
+            truncated.add(name)
+    return pairs, truncated
+
+
+def diff_reactions(
+    stored: Set[Tuple[str, str]], observed: Set[Tuple[str, str]], truncated: Set[str],
+) -> Tuple[Set[Tuple[str, str]], Set[Tuple[str, str]]]:
+    """Returns the (reaction, user) pairs to add and to remove so the store matches Slack."""
+    added = observed - stored
+    removed = {(reaction, user) for reaction, user in stored - observed if reaction not in truncated}
+    return added, removed
+
+
+def _history(client: Any, timeout: float, kwargs: Dict[str, Any]) -> Any:
+    client.timeout = timeout
+    return client.conversations_history(**kwargs)
+
+
+def history_pages(
+    client: Any,
+    channel: str,
+    oldest: str,
+    latest: str,
+    page_size: int = config.RECONCILE_PAGE_SIZE,
+    page_interval_sec: float = config.RECONCILE_PAGE_INTERVAL_SEC,
+    sleep: Callable[[float], None] = time.sleep,
+) -> Iterator[List[Dict[str, Any]]]:
+    """Yields the messages of a channel between two timestamps (inclusive), one page at a time."""
+    cursor = None
+    while True:
+        kwargs = {"channel": channel, "oldest": oldest, "latest": latest, "inclusive": True, "limit": page_size}
+        if cursor:
+            kwargs["cursor"] = cursor
+        response = resilience.dependency("slack").call(lambda timeout: _history(client, timeout, kwargs))
+        yield response.get("messages", [])
+        cursor = (response.get("response_metadata") or {}).get("next_cursor")
+        if not response.get("has_more") or not cursor:
+            return
+        sleep(page_interval_sec)
+
+
+class ReactionReconciler:
+    """Corrects the recorded reactions of recent notifier posts from Slack's history.
+
+    Args:
+        store (PaperStore): The local system of record.
+        client (Any): Slack WebClient (conversations.history needs the channels:history scope).
+        window_days (float, optional): Posts younger than this are reconciled.
+        page_size (int, optional): Messages per conversations.history call.
+        page_interval_sec (float, optional): Pause between two page requests.
+        sleep (Callable[[float], None], optional): Sleep function.
+    """
+
+    def __init__(
+        self,
+        store: PaperStore,
+        client: Any,
+        window_days: float = config.RECONCILE_WINDOW_DAYS,
+        page_size: int = config.RECONCILE_PAGE_SIZE,
+        page_interval_sec: float = config.RECONCILE_PAGE_INTERVAL_SEC,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self.store = store
+        self.client = client
+        self.window_days = window_days
+        self.page_size = page_size
+        self.page_interval_sec = page_interval_sec
+        self._sleep = sleep
+        self.corrected: List[str] = []
+
+    def run(self, now: Optional[float] = None) -> Dict[str, Any]:
+        """Reconciles every post in the window; corrections are kept even if a later call fails.
+
+        Returns:
+            Dict[str, Any]: Counts of channels, pages, messages, corrected messages, added and
+                removed reactions, and failed channels, plus a 'status': "ok", "partial" (some
+                channels failed) or "empty_window" (no posts in the window, e.g. an empty or
+                wrong store). The corrected timestamps are in `corrected`.
+        """
+        since = (time.time() if now is None else now) - self.window_days * 86400
+        posted: Dict[str, Set[str]] = defaultdict(set)
+        for channel, ts in self.store.posted_messages(since):
+            if channel:
+                posted[channel].add(ts)
+        if not posted:
+            # 空・別環境のDBを読んでいると照合対象が無く、成功と区別がつかなくなる
+            logger.warning(
+                f"No notifier posts in the last {self.window_days} days to reconcile. "
+                "Check that PAPER_DB_PATH points to the store shared with the listener.")
+
+        stats = Counter({"channels": 0, "pages": 0, "messages": 0, "corrected": 0, "added": 0, "removed": 0,
+                         "failed_channels": 0})
+        for channel in sorted(posted):
+            stats["channels"] += 1
+            try:
+                self._reconcile_channel(channel, posted[channel], stats)
+            except (resilience.CircuitOpenError, resilience.DeadlineExceeded) as e:
+                logger.error(f"Stopping reaction reconciliation at {channel}: {e}")
+                stats["failed_channels"] += 1
+                break
+            except Exception as e:
+                logger.error(f"Failed to reconcile reactions in {channel}: {e}")
+                stats["failed_channels"] += 1
+        logger.info(f"Reconciled reactions: {dict(stats)}")
+        if not posted:
+            status = "empty_window"
+        elif stats["failed_channels"]:
+            status = "partial"
+        else:
+            status = "ok"
+        return {**stats, "status": status}
+
+    def _reconcile_channel(self, channel: str, posted: Set[str], stats: Counter) -> None:
+        oldest, latest = min(posted, key=float), max(posted, key=float)
+        pages = history_pages(
+            self.client, channel, oldest, latest, self.page_size, self.page_interval_sec, self._sleep)
+        for messages in pages:
+            stats["pages"] += 1
+            observed = {m["ts"]: slack_reactions(m) for m in messages if m.get("ts") in posted}
+            stored = self.store.reactions_by_message(observed)
+            for ts, (pairs, truncated) in observed.items():
+                stats["messages"] += 1
+                added, removed = diff_reactions(stored[ts], pairs, truncated)
+                if not added and not removed:
+                    continue
+                self.store.apply_reaction_changes(ts, added, removed)
+                self.corrected.append(ts)
+                stats["corrected"] += 1
+                stats["added"] += len(added)
+                stats["removed"] += len(removed)
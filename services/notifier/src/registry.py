@@ -0,0 +1,52 @@
+"""Registry of the Slack messages posted by the notifier.
+
+The listener receives reaction events for every message in the workspace. It
+checks this registry right after signature verification and drops events for
+other messages without opening the store or the Sheets client (see
+services/listener/src/registry.py).
+
+The registry is a sorted text file with one "channel:ts" key per line, written
+atomically to a shared location (e.g. the EFS mount of the local DB).
+"""
+import os
+import time
+from typing import Iterable, List, Optional, Tuple
+
+from storage import PaperStore
+
+# 投稿先チャンネルIDが不明な古い行 (チャンネル名で記録されていた行) はtsのみで照合する
+ANY_CHANNEL = "*"
+
+
+def _is_channel_id(channel: str) -> bool:
+    """Returns True for Slack conversation IDs (C…, G…, D…), as opposed to "#name"."""
+    return len(channel) > 1 and channel[0] in "CGD" and channel.isalnum() and channel.isupper()
+
+
+def registry_keys(messages: Iterable[Tuple[str, str]]) -> List[str]:
+    """Returns the sorted, de-duplicated registry keys of (channel, ts) pairs."""
+    return sorted({
+        f"{channel if _is_channel_id(channel) else ANY_CHANNEL}:{ts}" for channel, ts in messages
+    })
+
+
+def publish_registry(store: PaperStore, path: str, retention_days: Optional[int] = None) -> int:
+    """Writes the registry of posted messages.
+
+    Args:
+        store (PaperStore): The local store holding the posted papers.
+        path (str): Registry file path, shared with the listener.
+        retention_days (Optional[int], optional): Only register messages posted within
+            this many days (reactions to older posts are dropped). None keeps all.
+
+    Returns:
+        int: Number of registered messages.
+    """
+    since = time.time() - retention_days * 86400 if retention_days else 0.0
+    keys = registry_keys(store.posted_messages(since))
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        f.writelines(f"{key}\n" for key in keys)
+    os.replace(tmp_path, path)
+    return len(keys)
@@ -0,0 +1,319 @@
+"""Batched replication of the local store into the Google Sheets view."""
+import json
+import logging
+import os
+import re
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import google_auth_httplib2
+import httplib2
+from google.oauth2 import service_account
+from googleapiclient.discovery import build
+
+import config
+import resilience
+from deadline import RunBudget
+from storage import PaperStore
+
+logger = logging.getLogger(__name__)
+
+SPREADSHEET_ID = os.environ.get("SPREADSHEET_ID")
+GOOGLE_CREDS = os.environ.get("GOOGLE_SERVICE_ACCOUNT_JSON")
+
+
+def build_sheets_service() -> Optional[Any]:
+    """Builds a Google Sheets API client from the service account JSON.
+
+    Returns:
+        Optional[Any]: The Sheets service, or None if credentials are not configured.
+    """
+    if not GOOGLE_CREDS or not SPREADSHEET_ID:
+        return None
+    creds_info = json.loads(GOOGLE_CREDS)
+    creds = service_account.Credentials.from_service_account_info(creds_info)
+    return build('sheets', 'v4', credentials=creds)
+
+
+def _execute(request: Any, timeout: float) -> Dict[str, Any]:
+    """Executes a request over an HTTP connection bounded by the attempt timeout."""
+    credentials = getattr(request.http, "credentials", None)
+    if credentials is None:
+        return request.execute()
+    http = google_auth_httplib2.AuthorizedHttp(credentials, http=httplib2.Http(timeout=timeout))
+    return request.execute(http=http)
+
+
+def execute_with_retry(request: Any, idempotent: bool = True) -> Dict[str, Any]:
+    """Executes a Sheets API request through the shared "sheets" dependency.
+
+    Transient errors are retried with jittered exponential backoff within the
+    invocation deadline; the circuit breaker fails fast while Sheets is down.
+    Each attempt uses the attempt timeout as its socket timeout.
+
+    Args:
+        request (Any): A googleapiclient request object.
+        idempotent (bool, optional): False for appends and row inserts, which are only
+            retried when Sheets certainly did not process them (see resilience.not_sent).
+
+    Returns:
+        Dict[str, Any]: The API response.
+
+    Raises:
+        Exception: The last error, or resilience.CircuitOpenError / DeadlineExceeded.
+    """
+    return resilience.dependency("sheets").call(lambda timeout: _execute(request, timeout), idempotent)
+
+
+def _row_values(row: Dict[str, Any], row_id: int) -> List[Any]:
+    """Converts a stored paper row into the sheet column layout (A-I)."""
+    return [
+        row['published'],
+        row['title'],
+        '?' if row['theme_id'] is None else row['theme_id'],
+        '?' if row['importance'] is None else row['importance'],
+        row['summary'],
+        row['entry_id'],
+        row['slack_ts'],  # Column G: Slack Message Timestamp
+        '',  # Column H: Reactions (mirrored separately)
+        row_id,  # Column I: Stable Row ID
+    ]
+
+
+def a1_range(tab: Optional[str], cell_range: str) -> str:
+    """Prefixes an A1 range with the sheet tab name (None means the first sheet)."""
+    return f"'{tab}'!{cell_range}" if tab else cell_range
+
+
+def resolve_sheet_id(service: Any, tab: Optional[str]) -> int:
+    """Resolves the numeric sheetId of a tab (0 for the first sheet)."""
+    if not tab:
+        return 0
+    result = execute_with_retry(service.spreadsheets().get(
+        spreadsheetId=SPREADSHEET_ID, fields="sheets.properties(sheetId,title)"))
+    for sheet in result.get('sheets', []):
+        if sheet['properties']['title'] == tab:
+            return sheet['properties']['sheetId']
+    raise ValueError(f"Sheet tab not found: {tab}")
+
+
+def _first_row_number(updated_range: str) -> int:
+    """Returns the first row number of an A1 range such as "Sheet1!A12:I14"."""
+    match = re.search(r"[A-Z]+(\d+)", updated_range.rsplit("!", 1)[-1])
+    if not match:
+        raise ValueError(f"Unexpected range in append response: {updated_range}")
+    return int(match.group(1))
+
+
+def _append_papers(
+    service: Any, rows: List[Dict[str, Any]], first_row_id: int, tab: Optional[str],
+) -> List[Tuple[str, int, Optional[int]]]:
+    """Appends new papers below the last row; existing rows never move.
+
+    Returns:
+        List[Tuple[str, int, Optional[int]]]: (entry_id, row_id, sheet_row) per paper.
+    """
+    values = [_row_values(row, first_row_id + i) for i, row in enumerate(rows)]
+    result = execute_with_retry(service.spreadsheets().values().append(
+        spreadsheetId=SPREADSHEET_ID,
+        range=a1_range(tab, "A:I"),
+        valueInputOption="RAW",
+        insertDataOption="INSERT_ROWS",
+        body={'values': values}
+    ), idempotent=False)
+    first_row = _first_row_number(result['updates']['updatedRange'])
+    return [(row['entry_id'], first_row_id + i, first_row + i) for i, row in enumerate(rows)]
+
+
+def _insert_papers(
+    service: Any, rows: List[Dict[str, Any]], first_row_id: int, tab: Optional[str],
+) -> List[Tuple[str, int, Optional[int]]]:
+    """Legacy layout: inserts new papers at the top of the sheet (one insert and one write call).
+
+    Physical rows shift on every insert, so no sheet_row is recorded.
+
+    Returns:
+        List[Tuple[str, int, Optional[int]]]: (entry_id, row_id, None) per paper.
+    """
+    # 新しい論文が上に来るように、挿入順を逆にして2行目から書き込む
+    values = [_row_values(row, first_row_id + i) for i, row in enumerate(rows)][::-1]
+    execute_with_retry(service.spreadsheets().batchUpdate(
+        spreadsheetId=SPREADSHEET_ID,
+        body={'requests': [{
+            'insertDimension': {
+                'range': {
+                    'sheetId': resolve_sheet_id(service, tab),
+                    'dimension': 'ROWS',
+                    'startIndex': 1,
+                    'endIndex': 1 + len(values)
+                },
+                'inheritFromBefore': False
+            }
+        }]}
+    ), idempotent=False)
+    execute_with_retry(service.spreadsheets().values().update(
+        spreadsheetId=SPREADSHEET_ID,
+        range=a1_range(tab, "A2"),
+        valueInputOption="RAW",
+        body={'values': values}
+    ))
+    return [(row['entry_id'], first_row_id + i, None) for i, row in enumerate(rows)]
+
+
+def _mirror_reactions(
+    service: Any, store: PaperStore, slack_ts_list: List[str], sheet_tabs: Dict[str, Optional[str]],
+) -> Tuple[List[str], List[str]]:
+    """Writes the Reactions column for the given messages in a single batch update.
+
+    Rows with a known stable position are written directly; the G column of a tab is
+    only scanned for messages written by the legacy insert layout.
+
+    Returns:
+        Tuple[List[str], List[str]]: Timestamps that were found in the sheet and written,
+            and timestamps of messages without a posted paper, which can never be written.
+    """
+    targets = store.reaction_targets(slack_ts_list)
+    scanned: Dict[Optional[str], Dict[str, int]] = {}
+
+    data = []
+    written = []
+    orphans = []
+    for ts in slack_ts_list:
+        if ts not in targets:
+            orphans.append(ts)
+            continue
+        profile, row_number = targets[ts]
+        tab = sheet_tabs.get(profile)
+        if row_number is None:
+            if tab not in scanned:
+                result = execute_with_retry(service.spreadsheets().values().get(
+                    spreadsheetId=SPREADSHEET_ID, range=a1_range(tab, "G:G")))
+                scanned[tab] = {row[0]: i + 1 for i, row in enumerate(result.get('values', [])) if row}
+            row_number = scanned[tab].get(ts)
+        if row_number is None:
+            # 論文行がまだミラーされていない場合は次回に持ち越す
+            continue
+        data.append({'range': a1_range(tab, f"H{row_number}"), 'values': [[store.reaction_text(ts)]]})
+        written.append(ts)
+
+    if data:
+        execute_with_retry(service.spreadsheets().values().batchUpdate(
+            spreadsheetId=SPREADSHEET_ID,
+            body={'valueInputOption': 'RAW', 'data': data}
+        ))
+    return written, orphans
+
+
+def mirror_to_sheets(
+    store: PaperStore,
+    batch_size: int = config.REPLICATION_BATCH_SIZE,
+    write_mode: str = config.SHEET_WRITE_MODE,
+    sheet_tabs: Optional[Dict[str, Optional[str]]] = None,
+    budget: Optional[RunBudget] = None,
+) -> Dict[str, int]:
+    """Replicates pending papers and reactions from the store to Google Sheets.
+
+    Rows stay pending (and are retried on the next run) if a batch fails. Reactions
+    are paged in timestamp order until none are left or the budget runs out; those of
+    messages without a posted paper are marked as skipped instead of staying pending,
+    and those whose paper row is not in the sheet yet are retried on the next run.
+
+    Args:
+        store (PaperStore): The local system of record.
+        batch_size (int, optional): Maximum rows per batch.
+        write_mode (str, optional): "append" (stable rows, newest-first via filter view)
+            or "insert" (legacy, new rows at the top).
+        sheet_tabs (Optional[Dict[str, Optional[str]]], optional): Sheet tab per profile
+            name. Profiles without an entry are written to the first sheet.
+        budget (Optional[RunBudget], optional): Remaining-time budget; a reaction batch is only
+            started if it fits. Defaults to unlimited.
+
+    Returns:
+        Dict[str, int]: Number of mirrored 'papers' and 'reactions', and of 'skipped'
+            reaction messages.
+    """
+    budget = budget or RunBudget()
+    stats = {"papers": 0, "reactions": 0, "skipped": 0}
+    try:
+        service = build_sheets_service()
+    except Exception as e:
+        logger.error(f"Failed to build Sheets client: {e}")
+        return stats
+    if service is None:
+        logger.warning("GOOGLE_CREDS or SPREADSHEET_ID not set. Skipping sheet mirroring.")
+        return stats
+
+    sheet_tabs = sheet_tabs or {}
+    write = _append_papers if write_mode == "append" else _insert_papers
+    try:
+        while True:
+            rows = store.pending_papers(batch_size)
+            if not rows:
+                break
+            by_profile: Dict[str, List[Dict[str, Any]]] = {}
+            for row in rows:
+                by_profile.setdefault(row['profile'], []).append(row)
+            for profile, profile_rows in by_profile.items():
+                placements = write(service, profile_rows, store.next_row_id(profile), sheet_tabs.get(profile))
+                store.mark_papers_mirrored(profile, placements)
+                stats["papers"] += len(profile_rows)
+
+        # 書き込めなかった (論文行がまだシートに無い) メッセージで止まらないよう、tsの昇順にページングする
+        after = ""
+        while True:
+            pending_ts = store.pending_reaction_ts(batch_size, after)
+            if not pending_ts:
+                break
+            if not budget.can_start_cycle():
+                logger.warning("Not enough time left for another reaction batch. Continuing on the next run.")
+                break
+            batch_start = time.monotonic()
+            written, orphans = _mirror_reactions(service, store, pending_ts, sheet_tabs)
+            store.mark_reactions_mirrored(written)
+            store.mark_reactions_skipped(orphans)
+            stats["reactions"] += len(written)
+            stats["skipped"] += len(orphans)
+            after = pending_ts[-1]
+            budget.record_cycle(time.monotonic() - batch_start)
+    except Exception as e:
+        logger.error(f"Sheet mirroring failed, will retry on next run: {e}")
+
+    logger.info(f"Mirrored to sheets: {stats}")
+    return stats
+
+
+def mirror_reactions(
+    store: PaperStore, slack_ts_list: List[str], sheet_tabs: Optional[Dict[str, Optional[str]]] = None,
+) -> int:
+    """Writes the Reactions column of the given messages in a single batch update.
+
+    Used after a bulk correction (see reconcile.py). Messages that are not written
+    stay pending and are picked up by mirror_to_sheets.
+
+    Args:
+        store (PaperStore): The local system of record.
+        slack_ts_list (List[str]): Timestamps of the messages to write.
+        sheet_tabs (Optional[Dict[str, Optional[str]]], optional): Sheet tab per profile name.
+
+    Returns:
+        int: Number of messages written.
+    """
+    if not slack_ts_list:
+        return 0
+    try:
+        service = build_sheets_service()
+    except Exception as e:
+        logger.error(f"Failed to build Sheets client: {e}")
+        return 0
+    if service is None:
+        logger.warning("GOOGLE_CREDS or SPREADSHEET_ID not set. Skipping sheet mirroring.")
+        return 0
+
+    try:
+        written, orphans = _mirror_reactions(service, store, slack_ts_list, sheet_tabs or {})
+    except Exception as e:
+        logger.error(f"Reaction mirroring failed, will retry on next run: {e}")
+        return 0
+    store.mark_reactions_mirrored(written)
+    store.mark_reactions_skipped(orphans)
+    return len(written)
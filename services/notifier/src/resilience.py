@@ -0,0 +1,303 @@
+"""Shared resilience layer for external dependencies (arXiv feeds, OpenAI, Slack, Sheets).
+
+Every call goes through the dependency's circuit breaker and a retry policy
+chosen by error class, and is bounded by the invocation deadline:
+
+* transient errors (timeouts, connection errors, 5xx) are retried with jittered
+  exponential backoff and count towards the breaker;
+* rate limits are retried after Retry-After (or the backoff) and count as well;
+* permanent errors (other 4xx, invalid requests) are raised immediately.
+
+Calls that are not idempotent (appends, inserts, Slack posts) are only retried
+when the request is known not to have been processed: a rate-limit rejection or
+a failure to connect. Any other failure may have been applied by the server.
+
+An open breaker fails calls immediately with CircuitOpenError until its reset
+timeout has passed, then lets one trial call through (half-open).
+"""
+import logging
+import math
+import random
+import socket
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, TypeVar
+
+import config
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+TRANSIENT = "transient"
+RATE_LIMITED = "rate_limited"
+PERMANENT = "permanent"
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised without calling the dependency while its breaker is open."""
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when the invocation has no time left for another attempt."""
+
+
+class HTTPStatusError(Exception):
+    """An HTTP response that should be handled as a failure (for clients that do not raise).
+
+    Args:
+        status_code (int): HTTP status code.
+        retry_after (Optional[float], optional): Seconds from the Retry-After header.
+    """
+
+    def __init__(self, status_code: int, retry_after: Optional[float] = None):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+def _status_code(exc: BaseException) -> Optional[int]:
+    """Finds the HTTP status of an error raised by requests, openai, slack_sdk or googleapiclient."""
+    for candidate in (exc, getattr(exc, "response", None), getattr(exc, "resp", None)):
+        for attr in ("status_code", "status"):
+            value = getattr(candidate, attr, None)
+            if isinstance(value, int):
+                return value
+    return None
+
+
+def _retry_after(exc: BaseException) -> Optional[float]:
+    """Returns the Retry-After delay of a rate-limit error, if the server sent one."""
+    if getattr(exc, "retry_after", None) is not None:
+        return float(exc.retry_after)
+    headers = getattr(getattr(exc, "response", None), "headers", None)
+    try:
+        return float(headers.get("Retry-After")) if headers else None
+    except (TypeError, ValueError):
+        return None
+
+
+def classify(exc: BaseException) -> str:
+    """Returns the error class of an exception: TRANSIENT, RATE_LIMITED or PERMANENT."""
+    status = _status_code(exc)
+    if status == 429:
+        return RATE_LIMITED
+    if status is not None:
+        return TRANSIENT if status >= 500 or status == 408 else PERMANENT
+    name = type(exc).__name__
+    if isinstance(exc, OSError) or "Timeout" in name or "Connection" in name:
+        return TRANSIENT
+    return PERMANENT
+
+
+# 接続確立前に失敗した (リクエストが送られていない) ことが確実なエラー
+_NOT_SENT_ERRORS = (ConnectionRefusedError, socket.gaierror)
+_NOT_SENT_ERROR_NAMES = ("ConnectTimeout", "NewConnectionError", "NameResolutionError")
+
+
+def not_sent(exc: BaseException, error_class: str) -> bool:
+    """Returns True if the failed request was certainly not processed by the server.
+
+    A 429 is rejected before processing; connection and DNS failures happen before
+    the request is sent. The exception chain is searched, since clients wrap these.
+    """
+    if error_class == RATE_LIMITED:
+        return True
+    seen = set()
+    candidate: Optional[BaseException] = exc
+    while candidate is not None and id(candidate) not in seen:
+        seen.add(id(candidate))
+        if isinstance(candidate, _NOT_SENT_ERRORS) or type(candidate).__name__ in _NOT_SENT_ERROR_NAMES:
+            return True
+        # urllib の URLError は原因を reason に持つ
+        reason = getattr(candidate, "reason", None)
+        if not isinstance(reason, BaseException):
+            reason = None
+        candidate = candidate.__cause__ or candidate.__context__ or reason
+    return False
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker.
+
+    Args:
+        failure_threshold (int): Consecutive failures that open the circuit.
+        reset_timeout_sec (float): Time the circuit stays open before a trial call.
+        clock (Callable[[], float], optional): Monotonic clock.
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout_sec: float, clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout_sec = reset_timeout_sec
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        """Current state; an open circuit turns half-open once the reset timeout has passed."""
+        with self._lock:
+            if self._state == OPEN and self._clock() - self._opened_at >= self.reset_timeout_sec:
+                self._state = HALF_OPEN
+                self._trial_in_flight = False
+            return self._state
+
+    def allow(self) -> bool:
+        """Returns True if a call may be made now (only one trial call while half-open)."""
+        state = self.state
+        with self._lock:
+            if state == OPEN:
+                return False
+            if state == HALF_OPEN:
+                if self._trial_in_flight:
+                    return False
+                self._trial_in_flight = True
+            return True
+
+    def record_success(self) -> None:
+        """Closes the circuit."""
+        with self._lock:
+            self._state = CLOSED
+            self._failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        """Counts a failure; opens the circuit at the threshold or after a failed trial."""
+        with self._lock:
+            self._failures += 1
+            if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != OPEN:
+                    logger.warning(f"Circuit opened after {self._failures} consecutive failures.")
+                self._state = OPEN
+                self._opened_at = self._clock()
+                self._trial_in_flight = False
+
+
+_deadline: Optional[Callable[[], float]] = None
+
+
+def set_deadline(remaining_sec: Optional[Callable[[], float]]) -> None:
+    """Sets the function returning the seconds left in this invocation (None: unlimited)."""
+    global _deadline
+    _deadline = remaining_sec
+
+
+def remaining_sec() -> float:
+    """Returns the seconds left in this invocation, minus the safety margin."""
+    if _deadline is None:
+        return math.inf
+    return _deadline() - config.DEADLINE_MARGIN_SEC
+
+
+class Dependency:
+    """An external dependency with its breaker, retry policy and counters.
+
+    Args:
+        name (str): Dependency name (used in logs and metrics).
+        timeout_sec (float): Per-attempt timeout, shortened to the remaining deadline.
+        max_attempts (int): Attempts per call, including the first one.
+        failure_threshold (int): Consecutive failures that open the breaker.
+        reset_timeout_sec (float): Time the breaker stays open.
+        backoff_sec (float, optional): Base delay of the exponential backoff.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        timeout_sec: float,
+        max_attempts: int,
+        failure_threshold: int,
+        reset_timeout_sec: float,
+        backoff_sec: float = config.RETRY_BACKOFF_SEC,
+    ):
+        self.name = name
+        self.timeout_sec = timeout_sec
+        self.max_attempts = max_attempts
+        self.backoff_sec = backoff_sec
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout_sec)
+        self.counters = {"calls": 0, "failures": 0, "retries": 0, "rejected": 0, "deadline_exceeded": 0}
+
+    def available(self) -> bool:
+        """Returns False while the breaker is open (calls would fail immediately)."""
+        return self.breaker.state != OPEN
+
+    def _backoff(self, attempt: int, exc: BaseException, error_class: str) -> float:
+        delay = self.backoff_sec * (2 ** attempt) * random.uniform(0.5, 1.5)
+        if error_class == RATE_LIMITED:
+            delay = max(delay, _retry_after(exc) or 0.0)
+        return min(delay, config.RETRY_MAX_BACKOFF_SEC)
+
+    def call(self, fn: Callable[[float], T], idempotent: bool = True) -> T:
+        """Calls the dependency with breaker, retry and deadline handling.
+
+        Args:
+            fn (Callable[[float], T]): Performs one attempt; receives the attempt timeout in seconds.
+            idempotent (bool, optional): False retries only failures where the request was
+                certainly not processed (see not_sent), so it is never applied twice.
+
+        Returns:
+            T: The result of the first successful attempt.
+
+        Raises:
+            CircuitOpenError: The breaker is open.
+            DeadlineExceeded: No time is left for an attempt.
+            Exception: The error of the last attempt, or the first permanent error.
+        """
+        for attempt in range(self.max_attempts):
+            if not self.breaker.allow():
+                self.counters["rejected"] += 1
+                raise CircuitOpenError(f"{self.name} circuit is open")
+            timeout = min(self.timeout_sec, remaining_sec())
+            if timeout <= 0:
+                self.counters["deadline_exceeded"] += 1
+                raise DeadlineExceeded(f"No time left to call {self.name}")
+
+            self.counters["calls"] += 1
+            try:
+                result = fn(timeout)
+            except Exception as e:
+                self.counters["failures"] += 1
+                error_class = classify(e)
+                if error_class == PERMANENT:
+                    # 依存先は応答しているので、ブレーカーとしては成功扱い
+                    self.breaker.record_success()
+                    raise
+                self.breaker.record_failure()
+                if not idempotent and not not_sent(e, error_class):
+                    raise
+                delay = self._backoff(attempt, e, error_class)
+                if attempt == self.max_attempts - 1 or delay >= remaining_sec() or not self.available():
+                    raise
+                self.counters["retries"] += 1
+                logger.warning(f"{self.name} call failed ({error_class}: {e}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+            else:
+                self.breaker.record_success()
+                return result
+        raise AssertionError("unreachable")
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Returns the breaker state and counters."""
+        return {"state": self.breaker.state, **self.counters}
+
+
+_dependencies: Dict[str, Dependency] = {}
+
+
+def dependency(name: str) -> Dependency:
+    """Returns the process-wide Dependency configured in config.RESILIENCE[name]."""
+    if name not in _dependencies:
+        _dependencies[name] = Dependency(name, **config.RESILIENCE[name])
+    return _dependencies[name]
+
+
+def snapshot() -> Dict[str, Dict[str, Any]]:
+    """Returns breaker states and retry counters of every dependency used by this process."""
+    return {name: dep.snapshot() for name, dep in _dependencies.items()}
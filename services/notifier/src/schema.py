@@ -0,0 +1,129 @@
+"""Typed LLM result model with strict validation and cheap local repair."""
+import json
+import re
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, Optional, Tuple
+
+import config
+
+_NUMBER_RE = re.compile(r"-?\d+(?:\.\d+)?")
+_FENCE_RE = re.compile(r"```(?:json)?\s*(.*?)```", re.DOTALL)
+
+
+class SummaryValidationError(ValueError):
+    """Raised when an LLM response cannot be validated or repaired locally."""
+
+
+@dataclass
+class PaperSummary:
+    """Validated AI summary of a paper.
+
+    `importance` and `theme_id` are None only for fallback results (no LLM output).
+    """
+    summary: str
+    importance: Optional[int]
+    theme_id: Optional[int]
+    reason: str
+
+    @property
+    def is_fallback(self) -> bool:
+        """True if this result was not produced by the LLM."""
+        return self.importance is None
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Returns the summary as a plain dictionary."""
+        return asdict(self)
+
+
+def _extract_json(content: str) -> Tuple[Dict[str, Any], bool]:
+    """Decodes a JSON object, recovering it from code fences or surrounding text.
+
+    Args:
+        content (str): Raw LLM message content.
+
+    Returns:
+        Tuple[Dict[str, Any], bool]: The decoded object and whether recovery was needed.
+
+    Raises:
+        SummaryValidationError: If no JSON object can be recovered.
+    """
+    if not content:
+        raise SummaryValidationError("Empty response")
+    try:
+        data = json.loads(content)
+        if isinstance(data, dict):
+            return data, False
+    except ValueError:
+        pass
+
+    candidates = _FENCE_RE.findall(content)
+    start, end = content.find("{"), content.rfind("}")
+    if start != -1 and end > start:
+        candidates.append(content[start:end + 1])
+    for candidate in candidates:
+        try:
+            data = json.loads(candidate)
+        except ValueError:
+            continue
+        if isinstance(data, dict):
+            return data, True
+    raise SummaryValidationError("No JSON object found in response")
+
+
+def _coerce_int(value: Any) -> Optional[int]:
+    """Converts ints, floats and numeric strings (e.g. "4", "4/5", "4.0") to int."""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float):
+        return round(value)
+    if isinstance(value, str):
+        match = _NUMBER_RE.search(value)
+        if match:
+            return round(float(match.group()))
+    return None
+
+
+def parse_summary(content: str) -> Tuple[PaperSummary, bool]:
+    """Validates an LLM response and repairs it locally where possible.
+
+    Repairs: JSON wrapped in text or code fences, numeric strings, importance outside
+    1-5 (clamped), unknown or missing theme_id (mapped to 0), summary given as a list
+    of lines, and a missing reason.
+
+    Args:
+        content (str): Raw LLM message content.
+
+    Returns:
+        Tuple[PaperSummary, bool]: The validated result and whether any repair was applied.
+
+    Raises:
+        SummaryValidationError: If the summary or importance cannot be recovered.
+    """
+    data, repaired = _extract_json(content)
+
+    summary = data.get("summary")
+    if isinstance(summary, list):
+        summary = "\n".join(str(line) for line in summary)
+        repaired = True
+    if not isinstance(summary, str) or not summary.strip():
+        raise SummaryValidationError("Missing summary")
+
+    importance = _coerce_int(data.get("importance"))
+    if importance is None:
+        raise SummaryValidationError(f"Invalid importance: {data.get('importance')!r}")
+    clamped = min(5, max(1, importance))
+    repaired = repaired or clamped != data.get("importance")
+
+    theme_id = _coerce_int(data.get("theme_id"))
+    if theme_id not in config.THEME_LABELS:
+        theme_id = 0
+    repaired = repaired or theme_id != data.get("theme_id")
+
+    reason = data.get("reason")
+    if not isinstance(reason, str):
+        reason = "" if reason is None else str(reason)
+        repaired = True
+
+    return PaperSummary(summary=summary, importance=clamped, theme_id=theme_id, reason=reason), repaired
@@ -0,0 +1,107 @@
+"""Bounded-memory candidate selection.
+
+Matching streams every feed entry through one fixed-size reservoir per profile,
+so only O(k) candidates are held no matter how many entries match. Abstracts of
+admitted papers are written to a spill file and read back on access.
+"""
+import random
+import tempfile
+from contextlib import ExitStack
+from typing import Callable, Generic, Hashable, List, Optional, Set, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+class Reservoir(Generic[T]):
+    """Uniform random sample of fixed size over a stream (Algorithm R).
+
+    Only the keys of the items currently sampled are tracked, so duplicate detection
+    (`key in reservoir`) costs O(size) memory as well.
+
+    Args:
+        size (int): Maximum number of items kept.
+        key (Callable[[T], Hashable]): Identity of an item.
+        rng (Optional[random.Random], optional): Random source. Defaults to the module RNG.
+    """
+
+    def __init__(self, size: int, key: Callable[[T], Hashable], rng: Optional[random.Random] = None):
+        self.size = size
+        self.seen = 0
+        self._key = key
+        self._rng = rng or random
+        self._items: List[Optional[T]] = []
+        self._keys: Set[Hashable] = set()
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._keys
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def admit(self) -> Optional[int]:
+        """Counts one stream item and decides whether it enters the sample.
+
+        Returns:
+            Optional[int]: Slot to store the item in with put(), or None if it is dropped.
+        """
+        self.seen += 1
+        if len(self._items) < self.size:
+            self._items.append(None)
+            return len(self._items) - 1
+        slot = self._rng.randrange(self.seen)
+        return slot if slot < self.size else None
+
+    def put(self, slot: int, item: T) -> None:
+        """Stores an admitted item in its slot, evicting the previous one."""
+        evicted = self._items[slot]
+        if evicted is not None:
+            self._keys.discard(self._key(evicted))
+        self._items[slot] = item
+        self._keys.add(self._key(item))
+
+    def items(self) -> List[T]:
+        """Returns the sampled items in random order."""
+        items = list(self._items)
+        self._rng.shuffle(items)
+        return items
+
+
+class AbstractSpill:
+    """Append-only temporary file holding paper abstracts outside the heap.
+
+    The file is deleted by close(), at the end of a `with` block, or when the
+    spill is garbage collected (the papers referencing it keep it alive).
+    """
+
+    def __init__(self):
+        # 作成に成功したファイルだけを呼び出し元 (close) に引き渡す
+        with ExitStack() as stack:
+            self._file = stack.enter_context(tempfile.TemporaryFile())
+            self._stack = stack.pop_all()
+
+    def __enter__(self) -> "AbstractSpill":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    def __del__(self):
+        if hasattr(self, "_stack"):
+            self.close()
+
+    def close(self) -> None:
+        """Deletes the spill file; abstracts can no longer be read afterwards."""
+        self._stack.close()
+
+    def put(self, text: str) -> Tuple[int, int]:
+        """Writes a text and returns its (offset, length) reference."""
+        data = text.encode("utf-8")
+        offset = self._file.seek(0, 2)
+        self._file.write(data)
+        return offset, len(data)
+
+    def get(self, ref: Tuple[int, int]) -> str:
+        """Reads a text back by its reference."""
+        offset, length = ref
+        self._file.seek(offset)
+        return self._file.read(length).decode("utf-8")
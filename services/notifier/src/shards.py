@@ -0,0 +1,129 @@
+"""Coordinator/worker sharding of feed fetching and matching.
+
+The coordinator splits the feeds (or profiles) into shards, runs one worker per
+shard in parallel and merges the shortlisted candidates for the final selection.
+Workers run as separate Lambda invocations ({"mode": "worker", "shard": ...}) or
+as local processes.
+"""
+import json
+import logging
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from profiles import Profile
+
+logger = logging.getLogger(__name__)
+
+# A shard: {"feeds": [feed_url, ...], "profiles": [profile_name, ...], "archive": bool,
+#          "existing_ids": {profile_name: [entry_id, ...]}, "previous_ids": {feed_url: [entry_id, ...]}}
+Shard = Dict[str, Any]
+# A worker result: {"candidates": {profile_name: [paper_state, ...]}, "failed_feeds": [feed_url, ...],
+#                   "snapshots": [staged feed snapshot with its raw bytes, ...]}
+ShardResult = Dict[str, Any]
+
+
+def plan_shards(
+    feeds: List[str],
+    profiles: List[Profile],
+    shard_by: str = "feed",
+    existing_ids: Optional[Dict[str, Set[str]]] = None,
+    previous_ids: Optional[Dict[str, Set[str]]] = None,
+) -> List[Shard]:
+    """Splits the work into independent shards.
+
+    Args:
+        feeds (List[str]): Feed URLs.
+        profiles (List[Profile]): Profiles to evaluate.
+        shard_by (str, optional): "feed" (one shard per feed, all profiles) or
+            "profile" (one shard per profile, all feeds). Profile shards fetch the same
+            feeds concurrently, so they do not use the snapshot archive.
+        existing_ids (Optional[Dict[str, Set[str]]], optional): Posted paper IDs per profile,
+            passed to the workers so they need no access to the store.
+        previous_ids (Optional[Dict[str, Set[str]]], optional): Entry IDs of the latest
+            archived snapshot per feed, passed to feed shards so the workers need no
+            access to the archive.
+
+    Returns:
+        List[Shard]: The shards.
+    """
+    names = [p.name for p in profiles]
+    posted = {name: sorted((existing_ids or {}).get(name, ())) for name in names}
+    if shard_by == "feed":
+        return [{"feeds": [feed], "profiles": names, "archive": True, "existing_ids": posted,
+                 "previous_ids": {feed: sorted((previous_ids or {}).get(feed, ()))}} for feed in feeds]
+    if shard_by == "profile":
+        return [{"feeds": list(feeds), "profiles": [name], "archive": False, "existing_ids": {name: posted[name]}}
+                for name in names]
+    raise ValueError(f"Unknown shard_by: {shard_by}")
+
+
+def merge_results(results: List[ShardResult]) -> ShardResult:
+    """Merges worker results, keeping the first occurrence of each paper per profile."""
+    merged: Dict[str, List[Dict[str, Any]]] = {}
+    seen: Dict[str, set] = {}
+    failed: List[str] = []
+    snapshots: List[Dict[str, Any]] = []
+    for result in results:
+        for profile, papers in result["candidates"].items():
+            bucket = merged.setdefault(profile, [])
+            profile_seen = seen.setdefault(profile, set())
+            for paper in papers:
+                if paper["entry_id"] not in profile_seen:
+                    profile_seen.add(paper["entry_id"])
+                    bucket.append(paper)
+        failed.extend(url for url in result["failed_feeds"] if url not in failed)
+        snapshots.extend(result.get("snapshots", []))
+    return {"candidates": merged, "failed_feeds": failed, "snapshots": snapshots}
+
+
+class LocalShardInvoker:
+    """Runs each shard in a separate local process (CLI runs and tests).
+
+    Args:
+        worker (Callable[[Shard], ShardResult]): Picklable worker function.
+        max_workers (int, optional): Number of processes.
+    """
+
+    def __init__(self, worker: Callable[[Shard], ShardResult], max_workers: int = 4):
+        self.worker = worker
+        self.max_workers = max_workers
+
+    def __call__(self, shards: List[Shard]) -> List[ShardResult]:
+        with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+            return list(executor.map(self.worker, shards))
+
+
+class LambdaShardInvoker:
+    """Runs each shard as a synchronous invocation of a Lambda function.
+
+    boto3 is part of the Lambda runtime; it is imported lazily so local runs
+    without it still work.
+
+    Args:
+        function_name (str): Name or ARN of the notifier function.
+        max_workers (int, optional): Concurrent invocations.
+    """
+
+    def __init__(self, function_name: str, max_workers: int = 4):
+        import boto3
+
+        self.client = boto3.client("lambda")
+        self.function_name = function_name
+        self.max_workers = max_workers
+
+    def _invoke(self, shard: Shard) -> ShardResult:
+        response = self.client.invoke(
+            FunctionName=self.function_name,
+            InvocationType="RequestResponse",
+            Payload=json.dumps({"mode": "worker", "shard": shard}),
+        )
+        payload = json.loads(response["Payload"].read())
+        if response.get("FunctionError") or payload.get("statusCode") != 200:
+            # 失敗したシャードのフィードは取得失敗として扱う
+            logger.error(f"Shard {shard} failed: {payload}")
+            return {"candidates": {}, "failed_feeds": shard["feeds"], "snapshots": []}
+        return json.loads(payload["body"])
+
+    def __call__(self, shards: List[Shard]) -> List[ShardResult]:
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            return list(executor.map(self._invoke, shards))
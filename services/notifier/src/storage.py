@@ -0,0 +1,640 @@
+"""Local SQLite system of record for papers, Slack timestamps and reactions.
+
+Google Sheets is only a mirrored view of this store (see replication.py).
+The listener service opens the same database file but never creates tables;
+keep the tables and triggers it requires in sync with REQUIRED_TABLES and
+REQUIRED_TRIGGERS in services/listener/src/store.py. Reaction rollups are
+maintained by triggers on the reactions table, so every writer shares one
+implementation.
+"""
+import json
+import os
+import sqlite3
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from schema import PaperSummary
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS papers (
+    entry_id   TEXT NOT NULL,
+    profile    TEXT NOT NULL DEFAULT 'default',
+    published  TEXT,
+    title      TEXT,
+    theme_id   INTEGER,
+    importance INTEGER,
+    summary    TEXT,
+    reason     TEXT,
+    slack_ts   TEXT,
+    channel    TEXT,
+    created_at TEXT NOT NULL,
+    mirrored   INTEGER NOT NULL DEFAULT 0,
+    row_id     INTEGER,
+    sheet_row  INTEGER,
+    PRIMARY KEY (entry_id, profile)
+);
+CREATE INDEX IF NOT EXISTS idx_papers_entry_id ON papers (entry_id);
+CREATE INDEX IF NOT EXISTS idx_papers_slack_ts ON papers (slack_ts);
+CREATE INDEX IF NOT EXISTS idx_papers_mirrored ON papers (mirrored);
+CREATE INDEX IF NOT EXISTS idx_papers_created_at ON papers (created_at);
+
+CREATE TABLE IF NOT EXISTS reactions (
+    slack_ts   TEXT NOT NULL,
+    reaction   TEXT NOT NULL,
+    user       TEXT NOT NULL DEFAULT '',
+    created_at TEXT NOT NULL,
+    mirrored   INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (slack_ts, reaction, user)
+);
+CREATE INDEX IF NOT EXISTS idx_reactions_mirrored ON reactions (mirrored);
+
+CREATE TABLE IF NOT EXISTS reaction_rollup (
+    slack_ts   TEXT PRIMARY KEY,
+    profile    TEXT NOT NULL DEFAULT 'default',
+    theme_id   INTEGER NOT NULL DEFAULT -1,
+    counts     TEXT NOT NULL DEFAULT '{}',
+    reactions  INTEGER NOT NULL DEFAULT 0,
+    users      INTEGER NOT NULL DEFAULT 0,
+    score      REAL NOT NULL DEFAULT 0,
+    mirrored   INTEGER NOT NULL DEFAULT 0,
+    updated_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_reaction_rollup_mirrored ON reaction_rollup (mirrored);
+CREATE INDEX IF NOT EXISTS idx_reaction_rollup_updated_at ON reaction_rollup (updated_at);
+
+CREATE TABLE IF NOT EXISTS theme_engagement (
+    profile    TEXT NOT NULL,
+    theme_id   INTEGER NOT NULL,
+    posts      INTEGER NOT NULL DEFAULT 0,
+    score_sum  REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (profile, theme_id)
+);
+
+CREATE TABLE IF NOT EXISTS run_checkpoints (
+    profile    TEXT PRIMARY KEY,
+    state      TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS run_ledger (
+    run_date   TEXT NOT NULL,
+    profile    TEXT NOT NULL,
+    stage      TEXT NOT NULL,
+    owner      TEXT NOT NULL,
+    status     TEXT NOT NULL,
+    result     TEXT,
+    updated_at TEXT NOT NULL,
+    PRIMARY KEY (run_date, profile, stage)
+);
+CREATE TABLE IF NOT EXISTS feed_validators (
+    feed_url      TEXT PRIMARY KEY,
+    etag          TEXT,
+    last_modified TEXT,
+    updated_at    TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS post_queue (
+    profile    TEXT NOT NULL,
+    entry_id   TEXT NOT NULL,
+    paper      TEXT NOT NULL,
+    summary    TEXT,
+    queued_at  TEXT NOT NULL,
+    PRIMARY KEY (profile, entry_id)
+);
+"""
+
+DEFAULT_PROFILE = "default"
+# テーマ不明 (LLMフォールバック) の論文を集計するキー
+UNKNOWN_THEME = -1
+# 2回目以降のリアクション (同じユーザーの別の絵文字) の重み。ユニークユーザー1人 = 1.0
+EXTRA_REACTION_WEIGHT = 0.25
+# reactions / reaction_rollup の mirrored: 0 = 未反映, 1 = 反映済み, 2 = 投稿された論文が無くシートに反映できない
+MIRROR_SKIPPED = 2
+
+
+def _rollup_trigger(name: str, event: str, row: str) -> str:
+    """Builds a trigger that recomputes the rollup of the post whose reaction changed.
+
+    The theme score sum is adjusted by the change of the post's score. The listener
+    and the reconciler only write the reactions table; this is the single place
+    where rollups are maintained.
+    """
+    ts = f"{row}.slack_ts"
+    reactions = f"FROM reactions WHERE slack_ts = {ts}"
+    return f"""
+CREATE TRIGGER IF NOT EXISTS {name} AFTER {event} ON reactions
+BEGIN
+    INSERT OR IGNORE INTO reaction_rollup (slack_ts, profile, theme_id, updated_at) VALUES (
+        {ts},
+        COALESCE((SELECT profile FROM papers WHERE slack_ts = {ts} LIMIT 1), '{DEFAULT_PROFILE}'),
+        COALESCE((SELECT theme_id FROM papers WHERE slack_ts = {ts} LIMIT 1), {UNKNOWN_THEME}),
+        '');
+    INSERT INTO theme_engagement (profile, theme_id, score_sum)
+        SELECT profile, theme_id, -score FROM reaction_rollup WHERE slack_ts = {ts}
+        ON CONFLICT (profile, theme_id) DO UPDATE SET score_sum = score_sum + excluded.score_sum;
+    UPDATE reaction_rollup SET
+        counts = (SELECT json_group_object(reaction, n) FROM (
+            SELECT reaction, COUNT(*) AS n {reactions} GROUP BY reaction ORDER BY MIN(rowid))),
+        reactions = (SELECT COUNT(*) {reactions}),
+        users = (SELECT COUNT(DISTINCT user) {reactions}),
+        mirrored = 0,
+        updated_at = strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now')
+    WHERE slack_ts = {ts};
+    UPDATE reaction_rollup SET score = users + {EXTRA_REACTION_WEIGHT} * (reactions - users) WHERE slack_ts = {ts};
+    INSERT INTO theme_engagement (profile, theme_id, score_sum)
+        SELECT profile, theme_id, score FROM reaction_rollup WHERE slack_ts = {ts}
+        ON CONFLICT (profile, theme_id) DO UPDATE SET score_sum = score_sum + excluded.score_sum;
+END;
+"""
+
+
+# リアクションの追加・削除に合わせて集計を更新する (listener と reconciler で共通)
+SCHEMA += _rollup_trigger("reactions_rollup_insert", "INSERT", "NEW")
+SCHEMA += _rollup_trigger("reactions_rollup_delete", "DELETE", "OLD")
+
+# 既存DBに後から追加したカラム (テーブル作成済みの場合は ALTER TABLE で追加)
+_ADDED_COLUMNS = {"papers": {"row_id": "INTEGER", "sheet_row": "INTEGER"}}
+
+# プロファイル導入前のDBは主キーが entry_id のみのため、テーブルを作り直す
+_PAPER_COLUMNS = (
+    "entry_id, published, title, theme_id, importance, summary, reason,"
+    " slack_ts, channel, created_at, mirrored, row_id, sheet_row"
+)
+# 集計トリガーは papers を参照するため、名前変更で書き換えられないよう先に削除して作り直す
+_REBUILD_WITH_PROFILE = f"""
+DROP TRIGGER IF EXISTS reactions_rollup_insert;
+DROP TRIGGER IF EXISTS reactions_rollup_delete;
+ALTER TABLE papers RENAME TO papers_legacy;
+DROP INDEX IF EXISTS idx_papers_entry_id;
+DROP INDEX IF EXISTS idx_papers_slack_ts;
+DROP INDEX IF EXISTS idx_papers_mirrored;
+DROP INDEX IF EXISTS idx_papers_created_at;
+{SCHEMA}
+INSERT INTO papers ({_PAPER_COLUMNS}, profile) SELECT {_PAPER_COLUMNS}, '{DEFAULT_PROFILE}' FROM papers_legacy;
+DROP TABLE papers_legacy;
+"""
+
+
+# Lambdaのコンテナごとに消える領域。ここに置いたDBは未ミラーの行とリアクションごと失われる
+EPHEMERAL_DIRS = ("/tmp",)
+
+
+class StoreNotConfiguredError(RuntimeError):
+    """Raised when the store path is missing or points to storage that does not outlive a container."""
+
+
+def require_durable_path(path: Optional[str], name: str = "PAPER_DB_PATH") -> str:
+    """Returns the configured path, failing loudly if it is not durable storage.
+
+    Inside Lambda a database under /tmp disappears with the container; Sheets would
+    then re-seed the store and already posted papers would be posted again.
+    Object store URIs (e.g. s3://bucket/prefix) are durable and accepted as-is.
+
+    Args:
+        path (Optional[str]): The configured path.
+        name (str, optional): The setting the path comes from, for the error message.
+
+    Returns:
+        str: The path.
+
+    Raises:
+        StoreNotConfiguredError: If the path is unset, or under /tmp inside Lambda.
+    """
+    if not path:
+        raise StoreNotConfiguredError(
+            f"{name} is not set. Point it to durable shared storage (e.g. an EFS mount).")
+    if os.environ.get("AWS_LAMBDA_FUNCTION_NAME") and path != ":memory:" and "://" not in path:
+        real = os.path.realpath(path)
+        if any(real == d or real.startswith(d + os.sep) for d in EPHEMERAL_DIRS):
+            raise StoreNotConfiguredError(
+                f"{name}={path} is ephemeral Lambda storage. Mount durable storage (e.g. EFS) and use it.")
+    return path
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+class PaperStore:
+    """SQLite-backed store indexed on entry_id and slack_ts.
+
+    Args:
+        path (str): Path of the SQLite database file (":memory:" for tests).
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.conn = sqlite3.connect(path, timeout=10)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.executescript(SCHEMA)
+        self._upgrade_schema()
+
+    def _upgrade_schema(self) -> None:
+        """Upgrades databases created by an older schema version."""
+        for table, columns in _ADDED_COLUMNS.items():
+            existing = {row[1] for row in self.conn.execute(f"PRAGMA table_info({table})")}
+            for name, column_type in columns.items():
+                if name not in existing:
+                    self.conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {column_type}")
+        self.conn.commit()
+        if "profile" not in {row[1] for row in self.conn.execute("PRAGMA table_info(papers)")}:
+            self.conn.executescript(f"BEGIN; {_REBUILD_WITH_PROFILE} COMMIT;")
+
+    def close(self) -> None:
+        """Closes the underlying connection."""
+        self.conn.close()
+
+    def is_empty(self) -> bool:
+        """Returns True if no paper has been recorded yet."""
+        return self.conn.execute("SELECT 1 FROM papers LIMIT 1").fetchone() is None
+
+    def existing_ids(self, profile: str = DEFAULT_PROFILE) -> Set[str]:
+        """Returns the entry_ids already recorded for a profile (for deduplication)."""
+        rows = self.conn.execute("SELECT entry_id FROM papers WHERE profile = ?", (profile,))
+        return {row[0] for row in rows}
+
+    def import_ids(self, entry_ids: Iterable[str], profile: str = DEFAULT_PROFILE) -> None:
+        """Seeds the store with papers that already exist in the sheet.
+
+        Imported rows are marked as mirrored so they are never written back.
+
+        Args:
+            entry_ids (Iterable[str]): Paper URLs already present in Google Sheets.
+            profile (str, optional): Profile the sheet belongs to.
+        """
+        now = _now()
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO papers (entry_id, profile, created_at, mirrored) VALUES (?, ?, ?, 1)",
+                [(entry_id, profile, now) for entry_id in entry_ids],
+            )
+
+    def save_paper(
+        self, paper: Any, ai_data: PaperSummary, slack_ts: str, channel: str = "",
+        profile: str = DEFAULT_PROFILE,
+    ) -> None:
+        """Records a posted paper. The row is queued for mirroring to Sheets.
+
+        The theme's post count is only incremented the first time the paper is recorded
+        as posted for the profile; saving it again does not count it twice.
+
+        Args:
+            paper (Any): The paper object (title, entry_id, published).
+            ai_data (PaperSummary): The AI-generated summary and scoring.
+            slack_ts (str): Timestamp of the Slack message ("" if not posted).
+            channel (str, optional): Slack channel the paper was posted to.
+            profile (str, optional): Profile the paper was selected for.
+        """
+        with self.conn:
+            previous = self.conn.execute(
+                "SELECT slack_ts FROM papers WHERE entry_id = ? AND profile = ?", (paper.entry_id, profile)).fetchone()
+            self.conn.execute(
+                "INSERT OR REPLACE INTO papers (entry_id, profile, published, title, theme_id, importance,"
+                " summary, reason, slack_ts, channel, created_at, mirrored)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 0)",
+                (
+                    paper.entry_id,
+                    profile,
+                    paper.published.strftime('%Y-%m-%d'),
+                    paper.title,
+                    ai_data.theme_id,
+                    ai_data.importance,
+                    ai_data.summary,
+                    ai_data.reason,
+                    slack_ts,
+                    channel,
+                    _now(),
+                ),
+            )
+            self.conn.execute("DELETE FROM post_queue WHERE profile = ? AND entry_id = ?", (profile, paper.entry_id))
+            if slack_ts and not (previous and previous[0]):
+                # テーマごとの投稿数 (リアクションのスコア合計は Listener が更新する)。再保存では数えない
+                self.conn.execute(
+                    "INSERT INTO theme_engagement (profile, theme_id, posts) VALUES (?, ?, 1)"
+                    " ON CONFLICT (profile, theme_id) DO UPDATE SET posts = posts + 1",
+                    (profile, UNKNOWN_THEME if ai_data.theme_id is None else ai_data.theme_id))
+
+    def pending_papers(self, limit: int) -> List[Dict[str, Any]]:
+        """Returns papers not yet mirrored to Sheets, oldest first.
+
+        Args:
+            limit (int): Maximum number of rows to return.
+
+        Returns:
+            List[Dict[str, Any]]: Paper rows as dictionaries.
+        """
+        rows = self.conn.execute(
+            "SELECT * FROM papers WHERE mirrored = 0 ORDER BY created_at, rowid LIMIT ?", (limit,))
+        return [dict(row) for row in rows]
+
+    def next_row_id(self, profile: str = DEFAULT_PROFILE) -> int:
+        """Returns the next unused stable sheet row ID of a profile's sheet tab."""
+        row = self.conn.execute("SELECT MAX(row_id) FROM papers WHERE profile = ?", (profile,)).fetchone()
+        return (row[0] or 0) + 1
+
+    def mark_papers_mirrored(self, profile: str, placements: Iterable[Tuple[str, int, Optional[int]]]) -> None:
+        """Marks papers as written to Sheets and records where they were written.
+
+        Args:
+            profile (str): Profile whose sheet tab was written.
+            placements (Iterable[Tuple[str, int, Optional[int]]]): (entry_id, row_id, sheet_row)
+                tuples. sheet_row is None when the physical row is not stable (insert mode).
+        """
+        with self.conn:
+            self.conn.executemany(
+                "UPDATE papers SET mirrored = 1, row_id = ?, sheet_row = ? WHERE entry_id = ? AND profile = ?",
+                [(row_id, sheet_row, entry_id, profile) for entry_id, row_id, sheet_row in placements])
+
+    def assign_sheet_rows(
+        self, placements: Iterable[Tuple[str, int, int, str]], profile: str = DEFAULT_PROFILE,
+    ) -> None:
+        """Records row IDs and physical rows for papers found in an existing sheet.
+
+        Args:
+            placements (Iterable[Tuple[str, int, int, str]]): (entry_id, row_id, sheet_row,
+                slack_ts) tuples. slack_ts only fills in a missing value.
+            profile (str, optional): Profile the sheet belongs to.
+        """
+        now = _now()
+        with self.conn:
+            for entry_id, row_id, sheet_row, slack_ts in placements:
+                self.conn.execute(
+                    "INSERT OR IGNORE INTO papers (entry_id, profile, created_at, mirrored) VALUES (?, ?, ?, 1)",
+                    (entry_id, profile, now))
+                self.conn.execute(
+                    "UPDATE papers SET row_id = ?, sheet_row = ?,"
+                    " slack_ts = COALESCE(NULLIF(slack_ts, ''), ?) WHERE entry_id = ? AND profile = ?",
+                    (row_id, sheet_row, slack_ts or None, entry_id, profile))
+
+    def reaction_targets(self, slack_ts_list: Iterable[str]) -> Dict[str, Tuple[str, Optional[int]]]:
+        """Returns the profile and known physical sheet row of each posted message.
+
+        Returns:
+            Dict[str, Tuple[str, Optional[int]]]: slack_ts -> (profile, sheet_row or None).
+        """
+        result = {}
+        for ts in slack_ts_list:
+            row = self.conn.execute(
+                "SELECT profile, sheet_row FROM papers WHERE slack_ts = ? LIMIT 1", (ts,)).fetchone()
+            if row:
+                result[ts] = (row[0], row[1])
+        return result
+
+    def add_reaction(self, slack_ts: str, reaction: str, user: str = "") -> bool:
+        """Records a reaction on a posted message.
+
+        Args:
+            slack_ts (str): Timestamp of the reacted message.
+            reaction (str): Reaction display name or emoji.
+            user (str, optional): Slack user ID of the reacting user.
+
+        Returns:
+            bool: True if the reaction was new, False if it was already recorded.
+        """
+        with self.conn:
+            cursor = self.conn.execute(
+                "INSERT OR IGNORE INTO reactions (slack_ts, reaction, user, created_at) VALUES (?, ?, ?, ?)",
+                (slack_ts, reaction, user, _now()),
+            )
+        return cursor.rowcount > 0
+
+    def reaction_text(self, slack_ts: str) -> str:
+        """Returns the "Reactions" column text: distinct reactions in first-seen order."""
+        rows = self.conn.execute(
+            "SELECT reaction FROM reactions WHERE slack_ts = ? GROUP BY reaction ORDER BY MIN(rowid)",
+            (slack_ts,),
+        )
+        return ", ".join(row[0] for row in rows)
+
+    def posted_messages(self, since_ts: float = 0.0) -> List[Tuple[str, str]]:
+        """Returns (channel, slack_ts) of every message posted at or after `since_ts` (epoch seconds)."""
+        rows = self.conn.execute(
+            "SELECT DISTINCT channel, slack_ts FROM papers WHERE slack_ts != '' AND CAST(slack_ts AS REAL) >= ?",
+            (since_ts,))
+        return [(row[0] or "", row[1]) for row in rows]
+
+    def reactions_by_message(self, slack_ts_list: Iterable[str]) -> Dict[str, Set[Tuple[str, str]]]:
+        """Returns the recorded (reaction, user) pairs of each message (empty if none)."""
+        result: Dict[str, Set[Tuple[str, str]]] = {}
+        for ts in slack_ts_list:
+            rows = self.conn.execute("SELECT reaction, user FROM reactions WHERE slack_ts = ?", (ts,))
+            result[ts] = {(row[0], row[1]) for row in rows}
+        return result
+
+    def apply_reaction_changes(
+        self, slack_ts: str, added: Iterable[Tuple[str, str]], removed: Iterable[Tuple[str, str]],
+    ) -> None:
+        """Adds and removes (reaction, user) pairs of one message in one transaction.
+
+        The schema's triggers update the post's rollup and theme score sum, as for
+        the listener's single events. The message is queued for mirroring to Sheets.
+        """
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO reactions (slack_ts, reaction, user, created_at) VALUES (?, ?, ?, ?)",
+                [(slack_ts, reaction, user, _now()) for reaction, user in added])
+            self.conn.executemany(
+                "DELETE FROM reactions WHERE slack_ts = ? AND reaction = ? AND user = ?",
+                [(slack_ts, reaction, user) for reaction, user in removed])
+
+    def pending_reaction_ts(self, limit: int, after: str = "") -> List[str]:
+        """Returns message timestamps whose reactions changed (added or removed) since the last mirror.
+
+        Args:
+            limit (int): Maximum number of timestamps.
+            after (str, optional): Only return timestamps after this one (in ascending
+                order), so a caller can page past messages it could not mirror yet.
+        """
+        rows = self.conn.execute(
+            "SELECT slack_ts FROM reactions WHERE mirrored = 0 AND slack_ts > ?"
+            " UNION SELECT slack_ts FROM reaction_rollup WHERE mirrored = 0 AND slack_ts > ?"
+            " ORDER BY slack_ts LIMIT ?", (after, after, limit))
+        return [row[0] for row in rows]
+
+    def mark_reactions_mirrored(self, slack_ts_list: Iterable[str]) -> None:
+        """Marks all reactions of the given messages as written to Sheets."""
+        params = [(ts,) for ts in slack_ts_list]
+        with self.conn:
+            self.conn.executemany("UPDATE reactions SET mirrored = 1 WHERE slack_ts = ?", params)
+            self.conn.executemany("UPDATE reaction_rollup SET mirrored = 1 WHERE slack_ts = ?", params)
+
+    def mark_reactions_skipped(self, slack_ts_list: Iterable[str]) -> None:
+        """Marks reactions of messages without a posted paper as not to be mirrored.
+
+        A later reaction change on such a message makes it pending again.
+        """
+        params = [(ts,) for ts in slack_ts_list]
+        with self.conn:
+            self.conn.executemany(
+                f"UPDATE reactions SET mirrored = {MIRROR_SKIPPED} WHERE slack_ts = ?", params)
+            self.conn.executemany(
+                f"UPDATE reaction_rollup SET mirrored = {MIRROR_SKIPPED} WHERE slack_ts = ?", params)
+
+    def engagement(self, slack_ts: str) -> Optional[Dict[str, Any]]:
+        """Returns the reaction rollup of a post maintained by the listener (primary-key lookup).
+
+        Returns:
+            Optional[Dict[str, Any]]: 'counts' per reaction, 'reactions', distinct 'users' and
+                'score', or None if the post has no reactions yet.
+        """
+        row = self.conn.execute(
+            "SELECT counts, reactions, users, score FROM reaction_rollup WHERE slack_ts = ?", (slack_ts,)).fetchone()
+        if row is None:
+            return None
+        return {"counts": json.loads(row[0]), "reactions": row[1], "users": row[2], "score": row[3]}
+
+    def theme_engagement(self, profile: str = DEFAULT_PROFILE) -> Dict[int, Tuple[int, float]]:
+        """Returns (posts, summed engagement score) per theme_id of a profile."""
+        rows = self.conn.execute(
+            "SELECT theme_id, posts, score_sum FROM theme_engagement WHERE profile = ?", (profile,))
+        return {row[0]: (row[1], row[2]) for row in rows}
+
+    def papers_between(self, since: str, until: str) -> List[Dict[str, Any]]:
+        """Returns papers recorded in (since, until] (ISO timestamps), oldest first."""
+        rows = self.conn.execute(
+            "SELECT entry_id, profile, published, title, theme_id, importance, summary, reason, slack_ts, channel,"
+            " created_at FROM papers WHERE created_at > ? AND created_at <= ? ORDER BY created_at",
+            (since, until))
+        return [dict(row) for row in rows]
+
+    def reaction_rollups_between(self, since: str, until: str) -> List[Dict[str, Any]]:
+        """Returns reaction rollups updated in (since, until] (ISO timestamps), oldest first."""
+        rows = self.conn.execute(
+            "SELECT slack_ts, profile, theme_id, counts, reactions, users, score, updated_at FROM reaction_rollup"
+            " WHERE updated_at > ? AND updated_at <= ? ORDER BY updated_at",
+            (since, until))
+        return [{**dict(row), "counts": json.loads(row["counts"])} for row in rows]
+
+    def feed_validators(self, feed_url: str) -> Tuple[Optional[str], Optional[str]]:
+        """Returns the (ETag, Last-Modified) of the last successful fetch of a feed."""
+        row = self.conn.execute(
+            "SELECT etag, last_modified FROM feed_validators WHERE feed_url = ?", (feed_url,)).fetchone()
+        return (row[0], row[1]) if row else (None, None)
+
+    def save_feed_validators(self, feed_url: str, etag: Optional[str], last_modified: Optional[str]) -> None:
+        """Stores the cache validators of a feed for the next conditional request."""
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO feed_validators (feed_url, etag, last_modified, updated_at) VALUES (?, ?, ?, ?)",
+                (feed_url, etag, last_modified, _now()))
+
+    def enqueue(self, profile: str, paper: Dict[str, Any], summary: Optional[Dict[str, Any]]) -> None:
+        """Queues a matched paper for the scheduled post; it is removed when the paper is saved.
+
+        Args:
+            profile (str): Profile name.
+            paper (Dict[str, Any]): Serialized paper (entry_id, title, summary, published).
+            summary (Optional[Dict[str, Any]]): Validated LLM result, or None to summarize at posting time.
+        """
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO post_queue (profile, entry_id, paper, summary, queued_at) VALUES (?, ?, ?, ?, ?)",
+                (profile, paper["entry_id"], json.dumps(paper, ensure_ascii=False),
+                 json.dumps(summary, ensure_ascii=False) if summary else None, _now()))
+
+    def queued(self, profile: str) -> List[Tuple[Dict[str, Any], Optional[Dict[str, Any]]]]:
+        """Returns the (paper, summary) pairs queued for a profile, oldest first."""
+        rows = self.conn.execute(
+            "SELECT paper, summary FROM post_queue WHERE profile = ? ORDER BY queued_at", (profile,))
+        return [(json.loads(row[0]), json.loads(row[1]) if row[1] else None) for row in rows]
+
+    def prune_queue(self, max_age_hours: float) -> int:
+        """Drops queued papers that were not posted within max_age_hours."""
+        cutoff = (datetime.now(timezone.utc) - timedelta(hours=max_age_hours)).isoformat()
+        with self.conn:
+            return self.conn.execute("DELETE FROM post_queue WHERE queued_at < ?", (cutoff,)).rowcount
+
+    def posted_since(self, profile: str, since: str) -> int:
+        """Returns the number of papers posted to Slack for a profile since an ISO timestamp."""
+        row = self.conn.execute(
+            "SELECT COUNT(*) FROM papers WHERE profile = ? AND slack_ts != '' AND created_at >= ?",
+            (profile, since)).fetchone()
+        return row[0]
+
+    def save_checkpoint(self, profile: str, state: Dict[str, Any]) -> None:
+        """Stores the unfinished work of a profile so the next invocation can resume it.
+
+        Args:
+            profile (str): Profile name.
+            state (Dict[str, Any]): JSON-serializable resume state.
+        """
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO run_checkpoints (profile, state, updated_at) VALUES (?, ?, ?)",
+                (profile, json.dumps(state, ensure_ascii=False), _now()))
+
+    def load_checkpoint(self, profile: str, max_age_hours: float) -> Optional[Dict[str, Any]]:
+        """Returns the resume state of a profile, discarding checkpoints older than max_age_hours."""
+        row = self.conn.execute(
+            "SELECT state, updated_at FROM run_checkpoints WHERE profile = ?", (profile,)).fetchone()
+        if row is None:
+            return None
+        if datetime.fromisoformat(row[1]) < datetime.now(timezone.utc) - timedelta(hours=max_age_hours):
+            self.clear_checkpoint(profile)
+            return None
+        return json.loads(row[0])
+
+    def clear_checkpoint(self, profile: str) -> None:
+        """Removes the checkpoint of a profile once its work is complete."""
+        with self.conn:
+            self.conn.execute("DELETE FROM run_checkpoints WHERE profile = ?", (profile,))
+
+    def claim_stage(
+        self, run_date: str, profile: str, stage: str, owner: str, lease_sec: Optional[float] = None,
+    ) -> bool:
+        """Atomically claims a run stage in the ledger.
+
+        A stage can be claimed if it was never claimed, is already held by the same owner,
+        or is held by another owner whose claim is older than lease_sec. Completed stages
+        are never claimed again.
+
+        Args:
+            run_date (str): Run date (YYYY-MM-DD, UTC).
+            profile (str): Profile name.
+            stage (str): Stage name, e.g. "run" or "post:<entry_id>".
+            owner (str): Unique ID of the claiming invocation.
+            lease_sec (Optional[float], optional): Age after which another owner's claim
+                may be taken over. None means it is never taken over.
+
+        Returns:
+            bool: True if the caller now holds the stage.
+        """
+        now = _now()
+        with self.conn:
+            cursor = self.conn.execute(
+                "INSERT OR IGNORE INTO run_ledger (run_date, profile, stage, owner, status, updated_at)"
+                " VALUES (?, ?, ?, ?, 'running', ?)", (run_date, profile, stage, owner, now))
+            if cursor.rowcount:
+                return True
+            expired = (datetime.now(timezone.utc) - timedelta(seconds=lease_sec)).isoformat() if lease_sec else ""
+            cursor = self.conn.execute(
+                "UPDATE run_ledger SET owner = ?, updated_at = ?"
+                " WHERE run_date = ? AND profile = ? AND stage = ? AND status = 'running'"
+                " AND (owner = ? OR updated_at < ?)",
+                (owner, now, run_date, profile, stage, owner, expired))
+        return cursor.rowcount > 0
+
+    def complete_stage(
+        self, run_date: str, profile: str, stage: str, owner: str, result: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        """Marks a stage as done, optionally with a JSON-serializable result."""
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO run_ledger (run_date, profile, stage, owner, status, result, updated_at)"
+                " VALUES (?, ?, ?, ?, 'done', ?, ?)",
+                (run_date, profile, stage, owner, None if result is None else json.dumps(result, ensure_ascii=False),
+                 _now()))
+
+    def release_stage(self, run_date: str, profile: str, stage: str, owner: str) -> None:
+        """Gives up an unfinished claim so another invocation can take the stage."""
+        with self.conn:
+            self.conn.execute(
+                "DELETE FROM run_ledger WHERE run_date = ? AND profile = ? AND stage = ? AND owner = ?"
+                " AND status = 'running'", (run_date, profile, stage, owner))
+
+    def stage_result(self, run_date: str, profile: str, stage: str) -> Optional[Dict[str, Any]]:
+        """Returns the result recorded for a completed stage, or None."""
+        row = self.conn.execute(
+            "SELECT result FROM run_ledger WHERE run_date = ? AND profile = ? AND stage = ? AND status = 'done'",
+            (run_date, profile, stage)).fetchone()
+        return json.loads(row[0]) if row and row[0] else None
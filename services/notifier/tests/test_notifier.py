@@ -1,3 +1,4 @@
+import json
 import os
 import sys
 import pytest
@@ -7,9 +8,14 @@ from unittest.mock import MagicMock, patch
 sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
 
 from main import build_slack_blocks, generate_paper_summary, main
+from schema import PaperSummary, SummaryValidationError, parse_summary
+from storage import PaperStore
 
 @pytest.fixture
-def mock_env(monkeypatch):
+def mock_env(monkeypatch, tmp_path):
+    monkeypatch.setattr("main.PAPER_DB_PATH", str(tmp_path / "papers.sqlite3"))
+    monkeypatch.setattr("main.FEED_ARCHIVE_DIR", str(tmp_path / "feed_archive"))
+    monkeypatch.setattr("resilience._dependencies", {})
     monkeypatch.setenv("SLACK_API_TOKEN", "mock_token")
     monkeypatch.setenv("SPREADSHEET_ID", "mock_sheet_id")
     monkeypatch.setenv("GOOGLE_SERVICE_ACCOUNT_JSON", "{}")
@@ -26,12 +32,12 @@ def mock_paper():
     return paper
 
 def test_build_slack_blocks(mock_paper):
-    ai_data = {
-        "theme_id": 1,
-        "importance": 5,
-        "summary": "AI Generated Summary",
-        "reason": "AI Generated Reason"
-    }
+    ai_data = PaperSummary(
+        theme_id=1,
+        importance=5,
+        summary="AI Generated Summary",
+        reason="AI Generated Reason"
+    )
     
     blocks, text = build_slack_blocks(mock_paper, ai_data, 1)
     
@@ -60,8 +66,8 @@ def test_generate_paper_summary_success(mock_env):
         
         result = generate_paper_summary("Title", "Abstract")
         
-        assert result["summary"] == "Short sum"
-        assert result["importance"] == 3
+        assert result.summary == "Short sum"
+        assert result.importance == 3
 
 def test_generate_paper_summary_failure(mock_env):
     # Test when API call fails
@@ -74,18 +80,18 @@ def test_generate_paper_summary_failure(mock_env):
         result = generate_paper_summary("Title", "Abstract")
         
         # Fallback behavior
-        assert "Abstract" in result["summary"]
-        assert result["importance"] == "?"
+        assert "Abstract" in result.summary
+        assert result.importance is None
 
 @patch("main.requests.get")
 @patch("main.feedparser.parse")
 @patch("main.matches_query")
 @patch("main.slack_client")
 @patch("main.generate_paper_summary")
-@patch("main.save_to_sheets")
+@patch("main.mirror_to_sheets")
 @patch("main.get_existing_paper_ids")
 @patch("main.config.SLACK_PROMPT_CHANNEL", "#mock-prompt-channel")
-def test_main_flow(mock_get_existing, mock_save, mock_gen_summary, mock_slack, mock_matches, mock_feedparser, mock_requests, mock_env):
+def test_main_flow(mock_get_existing, mock_mirror, mock_gen_summary, mock_slack, mock_matches, mock_feedparser, mock_requests, mock_env):
     # Setup
     mock_get_existing.return_value = set() # No existing papers
     mock_matches.return_value = True
@@ -102,9 +108,9 @@ def test_main_flow(mock_get_existing, mock_save, mock_gen_summary, mock_slack, m
     mock_feedparser.return_value = mock_feed
     
     # Mock AI
-    mock_gen_summary.return_value = {
-        "summary": "AI Sum", "importance": 4, "theme_id": 0, "reason": "R"
-    }
+    mock_gen_summary.return_value = PaperSummary(
+        summary="AI Sum", importance=4, theme_id=0, reason="R"
+    )
     
     # Mock Slack Response (for ts)
     mock_slack.chat_postMessage.return_value = {"ts": "1234.5678"}
@@ -117,8 +123,12 @@ def test_main_flow(mock_get_existing, mock_save, mock_gen_summary, mock_slack, m
     call_args = mock_slack.chat_postMessage.call_args_list[0]
     assert call_args.kwargs["channel"] == "channel"
     
-    # Verify Sheet Save called
-    mock_save.assert_called()
+    # Verify the paper is recorded locally; Sheets is left to the replication job
+    import main as notifier_main
+    store = PaperStore(notifier_main.PAPER_DB_PATH)
+    assert store.existing_ids() == {"http://arxiv.org/abs/2601.0001"}
+    assert store.pending_papers(10)[0]["slack_ts"] == "1234.5678"
+    mock_mirror.assert_not_called()
     
     # Verify Gemini Prompt Bundle
     last_call = mock_slack.chat_postMessage.call_args_list[-1]
@@ -157,9 +167,9 @@ def test_main_no_new_papers(mock_get_existing, mock_slack, mock_matches, mock_fe
 @patch("main.matches_query")
 @patch("main.slack_client")
 @patch("main.generate_paper_summary")
-@patch("main.save_to_sheets")
+@patch("main.mirror_to_sheets")
 @patch("main.get_existing_paper_ids")
-def test_main_slack_error_handling(mock_get_existing, mock_save, mock_gen, mock_slack, mock_matches, mock_feedparser, mock_requests, mock_env):
+def test_main_slack_error_handling(mock_get_existing, mock_mirror, mock_gen, mock_slack, mock_matches, mock_feedparser, mock_requests, mock_env):
     """Test scenario where Slack posting fails"""
     from slack_sdk.errors import SlackApiError
     
@@ -176,7 +186,7 @@ def test_main_slack_error_handling(mock_get_existing, mock_save, mock_gen, mock_
     }]
     mock_feedparser.return_value = mock_feed
     
-    mock_gen.return_value = {}
+    mock_gen.return_value = PaperSummary(summary="AI Sum", importance=None, theme_id=None, reason="")
     
     # Mock Slack raising error
     mock_response = {"ok": False, "error": "rate_limited"}
@@ -188,6 +198,1429 @@ def test_main_slack_error_handling(mock_get_existing, mock_save, mock_gen, mock_
     # Verify we attempted to post
     mock_slack.chat_postMessage.assert_called()
     
-    # If slack fails, save_to_sheets might or might not be called based on error handling.
-    # Currently, it falls into except block before save_to_sheets.
-    mock_save.assert_not_called()
+    # If slack fails, the loop falls into the except block before recording the paper.
+    import main as notifier_main
+    assert PaperStore(notifier_main.PAPER_DB_PATH).existing_ids() == set()
+
+def test_generate_paper_summary_hedge_wins(mock_env):
+    """A slow primary request is hedged and the faster hedge result is used"""
+    import threading
+    import main as notifier_main
+
+    release = threading.Event()
+    timeouts = []
+
+    def fake_create(**kwargs):
+        timeouts.append(kwargs["timeout"])
+        completion = MagicMock()
+        if fake_create.calls == 0:
+            fake_create.calls += 1
+            release.wait(2)
+            completion.choices[0].message.content = '{"summary": "slow", "importance": 1, "theme_id": 0, "reason": "r"}'
+        else:
+            completion.choices[0].message.content = '{"summary": "fast", "importance": 4, "theme_id": 1, "reason": "r"}'
+        return completion
+    fake_create.calls = 0
+
+    notifier_main.llm_metrics.reset()
+    with patch("main.openai.OpenAI") as mock_openai, \
+         patch("main.OPENAI_API_KEY", "mock_key"), \
+         patch.object(notifier_main.llm_latency, "threshold", return_value=0.05):
+        mock_openai.return_value.chat.completions.create.side_effect = fake_create
+        result = generate_paper_summary("Title", "Abstract")
+    release.set()
+
+    assert result.summary == "fast"
+    metrics = notifier_main.get_llm_metrics()
+    assert metrics["hedges_fired"] == 1
+    assert metrics["hedge_wins"] == 1
+    # Both requests carry the time left until the shared deadline, so the loser is cut off by it
+    assert len(timeouts) == 2 and 0 < timeouts[1] < timeouts[0] <= notifier_main.config.LLM_TIMEOUT_SEC
+
+def test_hedged_call_times_queued_requests_from_their_start_and_cancels_them_on_exit(monkeypatch):
+    """A request queued behind busy threads gets the time left when it starts; one still queued is cancelled"""
+    import threading
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+    import hedging
+
+    executor = ThreadPoolExecutor(max_workers=1)
+    submitted = []
+
+    def submit(fn, *args):
+        submitted.append(executor.submit(fn, *args))
+        return submitted[-1]
+
+    monkeypatch.setattr(hedging, "_executor", MagicMock(submit=submit))
+    busy = threading.Event()
+    timeouts = []
+
+    def record(timeout):
+        timeouts.append(timeout)
+        return "ok"
+
+    executor.submit(time.sleep, 0.2)
+    assert hedging.hedged_call(record, None, 1.0, 1.0) == ("ok", "primary")
+    assert 0 < timeouts[0] <= 0.85
+
+    executor.submit(busy.wait, 2)
+    with pytest.raises(TimeoutError):
+        hedging.hedged_call(record, None, 1.0, 0.1)
+    assert submitted[-1].cancelled()
+    busy.set()
+    executor.shutdown(wait=True)
+    assert len(timeouts) == 1
+
+def test_generate_paper_summary_tier_fallback(mock_env):
+    """A failing primary model degrades to the cheaper tier before the raw abstract"""
+    import main as notifier_main
+
+    def fake_create(model, **kwargs):
+        if model == "primary-model":
+            raise Exception("API Error")
+        completion = MagicMock()
+        completion.choices[0].message.content = '{"summary": "cheap", "importance": 2, "theme_id": 0, "reason": "r"}'
+        return completion
+
+    notifier_main.llm_metrics.reset()
+    with patch("main.openai.OpenAI") as mock_openai, \
+         patch("main.OPENAI_API_KEY", "mock_key"), \
+         patch("main.config.LLM_FALLBACK_MODELS", ["cheap-model"]):
+        mock_openai.return_value.chat.completions.create.side_effect = fake_create
+        result = generate_paper_summary("Title", "Abstract", model="primary-model")
+
+    assert result.summary == "cheap"
+    metrics = notifier_main.get_llm_metrics()
+    assert metrics["tier_fallbacks"] == 1
+    assert metrics["raw_fallbacks"] == 0
+
+def test_parse_summary_local_repair():
+    """Wrapped JSON, numeric strings and out-of-range values are repaired without a re-request"""
+    content = 'Here you go:\n```json\n{"summary": "S", "importance": "7", "theme_id": "9"}\n```'
+    result, repaired = parse_summary(content)
+
+    assert repaired is True
+    assert result.importance == 5
+    assert result.theme_id == 0
+    assert result.reason == ""
+
+    result, repaired = parse_summary('{"summary": "S", "importance": 3, "theme_id": 1, "reason": "R"}')
+    assert repaired is False
+    assert result == PaperSummary(summary="S", importance=3, theme_id=1, reason="R")
+
+    with pytest.raises(SummaryValidationError):
+        parse_summary('{"summary": "S", "importance": "high"}')
+
+def test_generate_paper_summary_rerequests_on_unrepairable_output(mock_env):
+    """The model is re-requested only when local repair fails"""
+    import main as notifier_main
+
+    bad = MagicMock()
+    bad.choices[0].message.content = "Sorry, I cannot answer."
+    good = MagicMock()
+    good.choices[0].message.content = '{"summary": "OK", "importance": "4", "theme_id": 3}'
+
+    notifier_main.llm_metrics.reset()
+    with patch("main.openai.OpenAI") as mock_openai, \
+         patch("main.OPENAI_API_KEY", "mock_key"):
+        mock_openai.return_value.chat.completions.create.side_effect = [bad, good]
+        result = generate_paper_summary("Title", "Abstract")
+
+    assert result.summary == "OK"
+    assert result.importance == 4
+    metrics = notifier_main.get_llm_metrics()
+    assert metrics["rerequests"] == 1
+    assert metrics["local_repairs"] == 1
+
+@patch("replication.build_sheets_service")
+def test_mirror_to_sheets_batches_papers_and_reactions(mock_build, mock_paper):
+    """Pending rows are written in batched calls and marked as mirrored"""
+    from replication import mirror_to_sheets
+
+    store = PaperStore(":memory:")
+    store.save_paper(mock_paper, PaperSummary("S", 4, 1, "R"), "1234.5678", "channel")
+    mock_sheets = mock_build.return_value.spreadsheets.return_value
+
+    stats = mirror_to_sheets(store, write_mode="insert")
+    assert stats["papers"] == 1
+    mock_sheets.batchUpdate.assert_called_once()
+    values = mock_sheets.values.return_value.update.call_args[1]["body"]["values"]
+    assert values[0][5] == "http://arxiv.org/abs/2601.0001"
+    assert store.pending_papers(10) == []
+
+    store.add_reaction("1234.5678", "🎉", "U1")
+    store.add_reaction("1234.5678", "👍", "U2")
+    mock_sheets.values.return_value.get.return_value.execute.return_value = {
+        "values": [["Slack TS"], ["1234.5678"]]
+    }
+    stats = mirror_to_sheets(store)
+    assert stats["reactions"] == 1
+    body = mock_sheets.values.return_value.batchUpdate.call_args[1]["body"]
+    assert body["data"] == [{"range": "H2", "values": [["🎉, 👍"]]}]
+    assert store.pending_reaction_ts(10) == []
+
+@patch("replication.build_sheets_service")
+def test_mirror_to_sheets_skips_orphan_reactions_and_pages_past_them(mock_build, mock_paper):
+    """Reactions to messages without a paper are skipped instead of blocking later batches"""
+    from deadline import RunBudget
+    from replication import mirror_to_sheets
+
+    store = PaperStore(":memory:")
+    store.save_paper(mock_paper, PaperSummary("S", 4, 1, "R"), "9.0", "channel")
+    for ts in ("1.0", "2.0", "3.0"):
+        store.add_reaction(ts, "🎉", "U1")
+    store.add_reaction("9.0", "👍", "U1")
+    mock_values = mock_build.return_value.spreadsheets.return_value.values.return_value
+    mock_values.append.return_value.execute.return_value = {"updates": {"updatedRange": "Sheet1!A2:I2"}}
+
+    assert mirror_to_sheets(store, batch_size=2, budget=RunBudget(remaining_ms=lambda: 0))["reactions"] == 0
+    assert store.pending_reaction_ts(10) == ["1.0", "2.0", "3.0", "9.0"]
+
+    stats = mirror_to_sheets(store, batch_size=2)
+    assert (stats["reactions"], stats["skipped"]) == (1, 3)
+    assert mock_values.batchUpdate.call_args[1]["body"]["data"] == [{"range": "H2", "values": [["👍"]]}]
+    assert store.pending_reaction_ts(10) == []
+
+    # A later change makes a skipped message pending again
+    store.add_reaction("2.0", "👀", "U2")
+    assert store.pending_reaction_ts(10) == ["2.0"]
+
+@patch("replication.build_sheets_service")
+def test_mirror_to_sheets_append_mode_uses_stable_rows(mock_build, mock_paper):
+    """Append mode never shifts rows, so reactions are written without scanning column G"""
+    from replication import mirror_to_sheets
+
+    store = PaperStore(":memory:")
+    store.save_paper(mock_paper, PaperSummary("S", 4, 1, "R"), "1234.5678", "channel")
+    mock_values = mock_build.return_value.spreadsheets.return_value.values.return_value
+    mock_values.append.return_value.execute.return_value = {"updates": {"updatedRange": "Sheet1!A12:I12"}}
+
+    mirror_to_sheets(store, write_mode="append", sheet_tabs={"default": "Papers"})
+    assert mock_values.append.call_args[1]["range"] == "'Papers'!A:I"
+    appended = mock_values.append.call_args[1]["body"]["values"][0]
+    assert appended[8] == 1  # Row ID
+    mock_build.return_value.spreadsheets.return_value.batchUpdate.assert_not_called()
+
+    store.add_reaction("1234.5678", "🎉", "U1")
+    mirror_to_sheets(store, write_mode="append", sheet_tabs={"default": "Papers"})
+    mock_values.get.assert_not_called()
+    body = mock_values.batchUpdate.call_args[1]["body"]
+    assert body["data"] == [{"range": "'Papers'!H12", "values": [["🎉"]]}]
+
+def test_migrate_sheet_reorders_oldest_first_with_row_ids():
+    """The migration reverses legacy newest-first rows, numbers them and records positions"""
+    from migrate_sheet import migrate_sheet
+
+    service = MagicMock()
+    mock_values = service.spreadsheets.return_value.values.return_value
+    mock_values.get.return_value.execute.return_value = {"values": [
+        ["2026-01-02", "Newer", 1, 3, "s", "http://arxiv.org/abs/2", "2.0", "🎉"],
+        ["2026-01-01", "Older", 0, 2, "s", "http://arxiv.org/abs/1", "1.0"],
+    ]}
+    store = PaperStore(":memory:")
+
+    assert migrate_sheet(service, store) == {"rows": 2, "filter_views": 1}
+    data = mock_values.batchUpdate.call_args[1]["body"]["data"]
+    assert data[1]["values"][0][1] == "Older"
+    assert data[1]["values"][0][8] == 1
+    assert data[1]["values"][1][7] == "🎉"
+    assert data[1]["values"][1][8] == 2
+    assert store.reaction_targets(["1.0", "2.0"]) == {"1.0": ("default", 2), "2.0": ("default", 3)}
+    assert store.next_row_id() == 3
+    filter_view = service.spreadsheets.return_value.batchUpdate.call_args[1]["body"]["requests"][0]
+    assert filter_view["addFilterView"]["filter"]["sortSpecs"][0]["sortOrder"] == "DESCENDING"
+
+def test_migrate_sheet_adds_missing_filter_view_to_migrated_rows():
+    """A rerun after a failed filter view request keeps the rows and only adds the view"""
+    from migrate_sheet import FILTER_VIEW_TITLE, migrate_sheet
+
+    service = MagicMock()
+    sheets = service.spreadsheets.return_value
+    sheets.values.return_value.get.return_value.execute.return_value = {"values": [
+        ["2026-01-01", "Older", 0, 2, "s", "http://arxiv.org/abs/1", "1.0", "", 1],
+    ]}
+    sheets.get.return_value.execute.return_value = {"sheets": [{"properties": {"sheetId": 0, "title": "Sheet1"}}]}
+
+    assert migrate_sheet(service) == {"rows": 0, "filter_views": 1}
+    sheets.values.return_value.batchUpdate.assert_not_called()
+    assert sheets.batchUpdate.call_args[1]["body"]["requests"][0]["addFilterView"]["filter"]["title"] == FILTER_VIEW_TITLE
+
+    sheets.batchUpdate.reset_mock()
+    sheets.get.return_value.execute.return_value = {"sheets": [{
+        "properties": {"sheetId": 0, "title": "Sheet1"}, "filterViews": [{"title": FILTER_VIEW_TITLE}]}]}
+    assert migrate_sheet(service) == {"rows": 0, "filter_views": 0}
+    sheets.batchUpdate.assert_not_called()
+
+@patch("main.time.sleep")
+@patch("main.requests.get")
+@patch("main.feedparser.parse")
+@patch("main.slack_client")
+@patch("main.generate_paper_summary")
+@patch("main.mirror_to_sheets")
+@patch("main.get_existing_paper_ids")
+def test_run_profiles_shares_fetch_and_llm_results(mock_get_existing, mock_mirror, mock_gen, mock_slack,
+                                                    mock_feedparser, mock_requests, mock_sleep, mock_env):
+    """All profiles are evaluated over one fetch per feed and share LLM results"""
+    import main as notifier_main
+    from profiles import Profile
+
+    mock_get_existing.return_value = set()
+    mock_requests.return_value.status_code = 200
+    mock_feed = MagicMock()
+    mock_feed.entries = [
+        {'title': 'GNN for 6G', 'summary': 'Traffic', 'link': 'http://arxiv.org/abs/1', 'published_parsed': None},
+        {'title': 'GNN for Privacy', 'summary': 'Data', 'link': 'http://arxiv.org/abs/2', 'published_parsed': None},
+    ]
+    mock_feedparser.return_value = mock_feed
+    mock_gen.return_value = PaperSummary(summary="S", importance=3, theme_id=1, reason="R")
+    mock_slack.chat_postMessage.return_value = {"ts": "1.0"}
+
+    profiles = [
+        Profile(name="network", keywords_ai='"GNN"', keywords_domain='"6G"', slack_channel="#net", num_papers=5),
+        Profile(name="graph", keywords_ai='"GNN"', keywords_domain="", slack_channel="#graph", num_papers=5,
+                sheet_tab="Graph"),
+    ]
+    notifier_main.run_profiles(profiles)
+
+    assert mock_requests.call_count == len(notifier_main.RSS_FEEDS)
+    assert mock_feedparser.call_count == len(notifier_main.RSS_FEEDS)
+    # Paper 1 matches both profiles but is summarized only once
+    assert sorted(c.args[0] for c in mock_gen.call_args_list) == ["GNN for 6G", "GNN for Privacy"]
+    channels = [c.kwargs["channel"] for c in mock_slack.chat_postMessage.call_args_list]
+    assert channels.count("#net") == 1
+    assert channels.count("#graph") == 2
+
+    store = PaperStore(notifier_main.PAPER_DB_PATH)
+    assert store.existing_ids("network") == {"http://arxiv.org/abs/1"}
+    assert store.existing_ids("graph") == {"http://arxiv.org/abs/1", "http://arxiv.org/abs/2"}
+    mock_mirror.assert_not_called()
+
+    # The separately scheduled replication job mirrors each profile to its tab
+    mock_mirror.return_value = {"papers": 3, "reactions": 0}
+    with patch("main.load_profiles", return_value=profiles):
+        notifier_main.lambda_handler({"mode": "replicate"}, None)
+    assert mock_mirror.call_args.kwargs["sheet_tabs"] == {"network": None, "graph": "Graph"}
+
+def test_store_requires_durable_path(monkeypatch, tmp_path):
+    """The store fails loudly without a path, and on ephemeral Lambda storage"""
+    import main as notifier_main
+    from storage import StoreNotConfiguredError
+
+    monkeypatch.setattr("main.PAPER_DB_PATH", None)
+    with pytest.raises(StoreNotConfiguredError):
+        notifier_main.open_store()
+
+    monkeypatch.setattr("main.PAPER_DB_PATH", "/tmp/arxiv_papers.sqlite3")
+    monkeypatch.setenv("AWS_LAMBDA_FUNCTION_NAME", "arxiv-notifier")
+    with pytest.raises(StoreNotConfiguredError):
+        notifier_main.lambda_handler({"mode": "replicate"}, None)
+
+    monkeypatch.setattr("main.PAPER_DB_PATH", "/mnt/data/papers.sqlite3")
+    with patch("main.PaperStore") as mock_store:
+        notifier_main.open_store()
+    mock_store.assert_called_once_with("/mnt/data/papers.sqlite3")
+
+def test_feed_archive_requires_durable_path(monkeypatch, mock_env):
+    """Differential processing refuses a per-container /tmp archive in Lambda; it needs no path when disabled"""
+    import main as notifier_main
+    from storage import StoreNotConfiguredError
+
+    monkeypatch.setenv("AWS_LAMBDA_FUNCTION_NAME", "arxiv-notifier")
+    monkeypatch.setattr("main.FEED_ARCHIVE_DIR", "/tmp/feed_archive")
+    with pytest.raises(StoreNotConfiguredError, match="FEED_ARCHIVE_DIR"):
+        notifier_main.open_archive()
+    monkeypatch.setattr("main.FEED_ARCHIVE_DIR", None)
+    with pytest.raises(StoreNotConfiguredError, match="FEED_ARCHIVE_DIR"):
+        notifier_main.open_archive()
+
+    monkeypatch.setattr("config.DIFFERENTIAL_PROCESSING", False)
+    assert notifier_main.open_archive() is None
+
+def test_paper_store_upgrades_pre_profile_database(tmp_path):
+    """A database keyed on entry_id alone is rebuilt with a per-profile key"""
+    import sqlite3
+
+    db_path = str(tmp_path / "legacy.sqlite3")
+    conn = sqlite3.connect(db_path)
+    conn.executescript("""
+        CREATE TABLE papers (entry_id TEXT PRIMARY KEY, published TEXT, title TEXT, theme_id INTEGER,
+            importance INTEGER, summary TEXT, reason TEXT, slack_ts TEXT, channel TEXT,
+            created_at TEXT NOT NULL, mirrored INTEGER NOT NULL DEFAULT 0);
+        CREATE INDEX idx_papers_slack_ts ON papers (slack_ts);
+        INSERT INTO papers (entry_id, slack_ts, created_at, mirrored) VALUES ('http://arxiv.org/abs/1', '1.0', 'now', 1);
+    """)
+    conn.commit()
+    conn.close()
+
+    store = PaperStore(db_path)
+    assert store.existing_ids("default") == {"http://arxiv.org/abs/1"}
+    assert store.reaction_targets(["1.0"]) == {"1.0": ("default", None)}
+    store.import_ids(["http://arxiv.org/abs/1"], "other")
+    assert store.existing_ids("other") == {"http://arxiv.org/abs/1"}
+    # The rollup triggers survive the rebuild and still read the papers table
+    store.apply_reaction_changes("1.0", [("🎉", "U1")], [])
+    assert store.engagement("1.0")["score"] == 1.0
+
+def test_select_new_entries_diffs_against_previous_snapshot(tmp_path):
+    """Only entries absent from the previous committed snapshot are matched; raw bytes are archived"""
+    import main as notifier_main
+    from feed_archive import FeedArchive
+
+    archive = FeedArchive(str(tmp_path))
+    feed_url = "http://export.arxiv.org/rss/cs"
+    day1 = [{"link": "http://arxiv.org/abs/1"}, {"link": "http://arxiv.org/abs/2"}]
+    day2 = day1[1:] + [
+        {"link": "http://arxiv.org/abs/3"},
+        {"link": "http://arxiv.org/abs/4", "arxiv_announce_type": "replace"},
+    ]
+
+    entries, snapshot = notifier_main.select_new_entries(feed_url, b"<rss>1</rss>", day1, archive)
+    assert entries == day1
+    # A staged snapshot is not the diff base until it is committed
+    assert archive.previous_ids(feed_url) == set()
+    assert notifier_main.select_new_entries(feed_url, b"<rss>1</rss>", day1, archive)[0] == day1
+    notifier_main.commit_snapshots(archive, [snapshot])
+    with patch("main.config.SKIP_REPLACE_ANNOUNCEMENTS", True):
+        new_entries, snapshot = notifier_main.select_new_entries(feed_url, b"<rss>2</rss>", day2, archive)
+    assert new_entries == [{"link": "http://arxiv.org/abs/3"}]
+    notifier_main.commit_snapshots(archive, [snapshot])
+
+    snapshots = list(archive.iter_snapshots(feed_url))
+    assert [s.read_raw() for s in snapshots] == [b"<rss>1</rss>", b"<rss>2</rss>"]
+    assert archive.previous_ids(feed_url) == {
+        "http://arxiv.org/abs/2", "http://arxiv.org/abs/3", "http://arxiv.org/abs/4"}
+
+@patch("main.time.sleep")
+@patch("main.requests.get")
+@patch("main.feedparser.parse")
+@patch("main.slack_client")
+@patch("main.generate_paper_summary")
+@patch("main.get_existing_paper_ids")
+def test_snapshot_is_committed_only_after_posting(mock_get_existing, mock_gen, mock_slack, mock_feedparser,
+                                                  mock_requests, mock_sleep, mock_env):
+    """A run that fails before posting leaves the diff base alone, so the next run sees the same entries"""
+    import main as notifier_main
+    from feed_archive import FeedArchive
+    from profiles import Profile
+
+    mock_get_existing.return_value = set()
+    mock_requests.return_value.status_code = 200
+    mock_requests.return_value.content = b"<rss/>"
+    mock_feed = MagicMock(bozo=False)
+    mock_feed.entries = [{'title': 'GNN paper', 'summary': 'Abstract', 'link': 'http://arxiv.org/abs/1',
+                          'published_parsed': None}]
+    mock_feedparser.return_value = mock_feed
+    mock_gen.return_value = PaperSummary(summary="S", importance=3, theme_id=1, reason="R")
+    mock_slack.chat_postMessage.return_value = {"ts": "1.0"}
+    profile = Profile(name="default", keywords_ai='"GNN"', keywords_domain="", slack_channel="#papers", num_papers=1)
+    archive = FeedArchive(notifier_main.FEED_ARCHIVE_DIR)
+
+    with patch("main.post_profile", side_effect=RuntimeError("crashed")), pytest.raises(RuntimeError):
+        notifier_main.run_profiles([profile])
+    assert archive.previous_ids(notifier_main.RSS_FEEDS[0]) == set()
+
+    # The crashed run still holds today's claim until its lease expires; retry as another day
+    assert notifier_main.run_profiles([profile], run_date="2026-01-02") is True
+    assert PaperStore(notifier_main.PAPER_DB_PATH).existing_ids("default") == {"http://arxiv.org/abs/1"}
+    assert archive.previous_ids(notifier_main.RSS_FEEDS[0]) == {"http://arxiv.org/abs/1"}
+
+@patch("main.time.sleep")
+@patch("main.requests.get")
+@patch("main.feedparser.parse")
+@patch("main.slack_client")
+@patch("main.generate_paper_summary")
+@patch("main.mirror_to_sheets")
+@patch("main.get_existing_paper_ids")
+def test_run_profiles_checkpoints_and_resumes_when_out_of_time(mock_get_existing, mock_mirror, mock_gen, mock_slack,
+                                                               mock_feedparser, mock_requests, mock_sleep, mock_env):
+    """A run stops before a cycle that cannot finish and the next run resumes without refetching or reposting"""
+    import main as notifier_main
+    from deadline import RunBudget
+    from profiles import Profile
+
+    mock_get_existing.return_value = set()
+    mock_requests.return_value.status_code = 200
+    mock_feed = MagicMock()
+    mock_feed.entries = [
+        {'title': f'GNN paper {i}', 'summary': 'Abstract', 'link': f'http://arxiv.org/abs/{i}', 'published_parsed': None}
+        for i in range(3)
+    ]
+    mock_feedparser.return_value = mock_feed
+    mock_gen.return_value = PaperSummary(summary="S", importance=3, theme_id=1, reason="R")
+    mock_slack.chat_postMessage.side_effect = [{"ts": f"{i}.0"} for i in range(3)]
+    profile = Profile(name="default", keywords_ai='"GNN"', keywords_domain="", slack_channel="#papers", num_papers=3)
+
+    # Enough time for exactly one 30s cycle on top of the 30s reserve
+    remaining = [70_000, 50_000]
+    budget = RunBudget(lambda: remaining.pop(0) if len(remaining) > 1 else remaining[0],
+                       cycle_estimate_sec=30, reserve_sec=30)
+    assert notifier_main.run_profiles([profile], budget) is False
+
+    store = PaperStore(notifier_main.PAPER_DB_PATH)
+    assert len(store.existing_ids("default")) == 1
+    checkpoint = store.load_checkpoint("default", max_age_hours=1)
+    assert checkpoint["remaining"] == 2
+    assert len(checkpoint["queue"]) == 2
+
+    assert notifier_main.run_profiles([profile]) is True
+
+    # Feeds were only fetched by the first invocation
+    assert mock_requests.call_count == len(notifier_main.RSS_FEEDS)
+    assert len(store.existing_ids("default")) == 3
+    assert store.load_checkpoint("default", max_age_hours=1) is None
+    # The prompt bundle is posted once, with the URLs of both invocations
+    prompt = mock_slack.chat_postMessage.call_args_list[-1].kwargs
+    assert prompt["channel"] == notifier_main.config.SLACK_PROMPT_CHANNEL
+    assert len(prompt["text"].splitlines()) == 4
+
+@patch("main.schedule_followup")
+@patch("main.time.sleep")
+@patch("main.requests.get")
+@patch("main.feedparser.parse")
+@patch("main.slack_client")
+@patch("main.generate_paper_summary")
+@patch("main.get_existing_paper_ids")
+def test_budget_exhausted_run_resumes_in_followup_invocation(mock_get_existing, mock_gen, mock_slack, mock_feedparser,
+                                                              mock_requests, mock_sleep, mock_followup, mock_env):
+    """An invocation that runs out of time schedules a follow-up, which finishes the same run"""
+    import main as notifier_main
+    from profiles import Profile
+
+    mock_get_existing.return_value = set()
+    mock_requests.return_value.status_code = 200
+    mock_feed = MagicMock()
+    mock_feed.entries = [
+        {'title': f'GNN paper {i}', 'summary': 'Abstract', 'link': f'http://arxiv.org/abs/{i}', 'published_parsed': None}
+        for i in range(3)
+    ]
+    mock_feedparser.return_value = mock_feed
+    mock_gen.return_value = PaperSummary(summary="S", importance=3, theme_id=1, reason="R")
+    mock_slack.chat_postMessage.side_effect = [{"ts": f"{i}.0"} for i in range(4)]
+    profile = Profile(name="default", keywords_ai='"GNN"', keywords_domain="", slack_channel="#papers", num_papers=3)
+
+    # Enough time for one 30s cycle on top of the 30s reserve (the deadline margin applies to calls only)
+    remaining = [70_000, 70_000, 50_000]
+    short = MagicMock(function_name="arxiv-notifier")
+    short.get_remaining_time_in_millis.side_effect = lambda: remaining.pop(0) if len(remaining) > 1 else remaining[0]
+    with patch("config.PROFILES", [profile.__dict__]), patch("config.RUN_CYCLE_ESTIMATE_SEC", 30):
+        response = notifier_main.lambda_handler({}, short)
+        assert "後続の呼び出し" in json.loads(response["body"])
+        function_name, followup_event = mock_followup.call_args.args
+        assert function_name == "arxiv-notifier"
+        assert followup_event["followup"] == 1
+
+        long = MagicMock(function_name="arxiv-notifier")
+        long.get_remaining_time_in_millis.return_value = 900_000
+        response = notifier_main.lambda_handler(followup_event, long)
+
+    assert json.loads(response["body"]) == 'Slackへの投稿が完了しました。'
+    assert mock_followup.call_count == 1
+    assert mock_requests.call_count == len(notifier_main.RSS_FEEDS)
+    assert len(PaperStore(notifier_main.PAPER_DB_PATH).existing_ids("default")) == 3
+
+def test_run_ledger_claims_are_idempotent(tmp_path):
+    """Stages are claimed once per day; only an expired profile run can be taken over"""
+    from ledger import RunLedger
+
+    store = PaperStore(str(tmp_path / "papers.sqlite3"))
+    first = RunLedger(store, run_date="2026-01-01", owner="a")
+    second = RunLedger(store, run_date="2026-01-01", owner="b")
+
+    assert first.claim_run("default")
+    assert first.claim_run("default")  # re-entrant for the same owner
+    assert not second.claim_run("default")
+
+    assert first.claim("default", "post:1")
+    assert not second.claim("default", "post:1")
+    first.complete("default", "post:1", {"slack_ts": "1.0"})
+    assert first.result("default", "post:1") == {"slack_ts": "1.0"}
+    assert not first.claim("default", "post:1")
+
+    # A crashed owner's run claim is taken over once the lease expires
+    store.conn.execute("UPDATE run_ledger SET updated_at = '2000-01-01T00:00:00+00:00' WHERE stage = 'run'")
+    assert second.claim_run("default")
+    second.complete_run("default")
+    assert not first.claim_run("default")
+    assert RunLedger(store, run_date="2026-01-02", owner="a").claim_run("default")
+
+    # Post and summary stages are leases as well
+    assert second.claim("default", "post:2")
+    assert not first.claim("default", "post:2")
+    store.conn.execute("UPDATE run_ledger SET updated_at = '2000-01-01T00:00:00+00:00' WHERE stage = 'post:2'")
+    assert first.claim("default", "post:2")
+
+class FakeDynamoDB:
+    """In-memory DynamoDB client evaluating the ledger's condition expressions"""
+
+    class ConditionalCheckFailed(Exception):
+        def __init__(self):
+            super().__init__("The conditional request failed")
+            self.response = {"Error": {"Code": "ConditionalCheckFailedException"}}
+
+    def __init__(self):
+        self.items = {}
+
+    def _check(self, key, condition, values=None):
+        import ledger
+
+        item = self.items.get(key)
+        if condition == ledger.CLAIM_NEW:
+            ok = item is None
+        elif condition == ledger.CLAIM_HELD:
+            ok = item is not None and item["status"]["S"] == "running" and (
+                item["owner"] == values[":owner"]
+                or float(item["updated_at"]["N"]) < float(values[":expired"]["N"]))
+        elif condition == ledger.RELEASE_OWN:
+            ok = item is not None and item["status"]["S"] == "running" and item["owner"] == values[":owner"]
+        else:
+            ok = condition is None
+        if not ok:
+            raise self.ConditionalCheckFailed()
+
+    def put_item(self, TableName, Item, ConditionExpression=None):
+        self._check(Item["pk"]["S"], ConditionExpression)
+        self.items[Item["pk"]["S"]] = Item
+
+    def update_item(self, TableName, Key, UpdateExpression, ConditionExpression, ExpressionAttributeNames,
+                    ExpressionAttributeValues):
+        self._check(Key["pk"]["S"], ConditionExpression, ExpressionAttributeValues)
+        self.items[Key["pk"]["S"]].update(owner=ExpressionAttributeValues[":owner"],
+                                          updated_at=ExpressionAttributeValues[":now"])
+
+    def delete_item(self, TableName, Key, ConditionExpression, ExpressionAttributeNames, ExpressionAttributeValues):
+        self._check(Key["pk"]["S"], ConditionExpression, ExpressionAttributeValues)
+        del self.items[Key["pk"]["S"]]
+
+    def get_item(self, TableName, Key, ConsistentRead):
+        return {"Item": self.items[Key["pk"]["S"]]} if Key["pk"]["S"] in self.items else {}
+
+def test_dynamo_ledger_claims_with_conditional_writes():
+    """The shared DynamoDB ledger gives a stage to one owner at a time and lets expired leases be taken over"""
+    from ledger import DynamoLedgerTable, RunLedger
+
+    table = DynamoLedgerTable("ledger", client=FakeDynamoDB())
+    first = RunLedger(table, run_date="2026-01-01", owner="a")
+    second = RunLedger(table, run_date="2026-01-01", owner="b")
+
+    assert first.claim_run("default")
+    assert first.claim_run("default")
+    assert not second.claim_run("default")
+    second.release_run("default")  # not the owner: no effect
+    assert not second.claim_run("default")
+
+    assert first.claim("default", "post:1")
+    first.complete("default", "post:1", {"slack_ts": "1.0"})
+    assert first.result("default", "post:1") == {"slack_ts": "1.0"}
+    assert not second.claim("default", "post:1")
+
+    table.client.items["2026-01-01#default#run"]["updated_at"] = {"N": "0"}
+    assert second.claim_run("default")
+    first.release_run("default")
+    assert not first.claim_run("default")
+
+def test_open_ledger_requires_the_shared_table_in_lambda(mock_env, monkeypatch):
+    """Lambda invocations refuse the per-container ledger"""
+    import main as notifier_main
+    from storage import StoreNotConfiguredError
+
+    monkeypatch.setenv("AWS_LAMBDA_FUNCTION_NAME", "arxiv-notifier")
+    with pytest.raises(StoreNotConfiguredError):
+        notifier_main.open_ledger(PaperStore(":memory:"))
+    monkeypatch.setattr("main.RUN_LEDGER_TABLE", "arxiv-run-ledger")
+    with patch("main.DynamoLedgerTable") as mock_table:
+        assert notifier_main.open_ledger(PaperStore(":memory:")).store is mock_table.return_value
+    mock_table.assert_called_once_with("arxiv-run-ledger")
+
+@patch("main.time.sleep")
+@patch("main.requests.get")
+@patch("main.feedparser.parse")
+@patch("main.slack_client")
+@patch("main.generate_paper_summary")
+@patch("main.mirror_to_sheets")
+@patch("main.get_existing_paper_ids")
+def test_sharded_run_merges_worker_shortlists_and_is_idempotent(mock_get_existing, mock_mirror, mock_gen, mock_slack,
+                                                                mock_feedparser, mock_requests, mock_sleep, mock_env):
+    """Feed shards run in worker processes; a repeated run of the day posts nothing"""
+    import main as notifier_main
+    from profiles import Profile
+    from shards import LocalShardInvoker
+
+    mock_get_existing.return_value = set()
+    mock_requests.return_value.status_code = 200
+    mock_feed = MagicMock()
+    mock_feed.entries = [
+        {'title': f'GNN paper {i}', 'summary': 'Abstract', 'link': f'http://arxiv.org/abs/{i}', 'published_parsed': None}
+        for i in range(3)
+    ]
+    mock_feedparser.return_value = mock_feed
+    mock_gen.return_value = PaperSummary(summary="S", importance=3, theme_id=1, reason="R")
+    mock_slack.chat_postMessage.return_value = {"ts": "1.0"}
+    profile = Profile(name="default", keywords_ai='"GNN"', keywords_domain="", slack_channel="#papers", num_papers=5)
+
+    with patch("config.PROFILES", [profile.__dict__]):
+        assert notifier_main.run_profiles([profile], invoker=LocalShardInvoker(notifier_main.run_worker))
+        # The coordinator only fetched through the worker processes
+        assert mock_requests.call_count == 0
+
+        # Every feed shard returns the same three entries; they are merged per paper
+        store = PaperStore(notifier_main.PAPER_DB_PATH)
+        assert store.existing_ids("default") == {f"http://arxiv.org/abs/{i}" for i in range(3)}
+        assert mock_slack.chat_postMessage.call_count == 4  # 3 papers + prompt bundle
+
+        assert notifier_main.run_profiles([profile], invoker=LocalShardInvoker(notifier_main.run_worker))
+        assert mock_slack.chat_postMessage.call_count == 4
+        assert mock_gen.call_count == 3
+
+def test_workers_take_posted_ids_from_the_shard_payload(mock_env, monkeypatch):
+    """Workers exclude the posted papers sent by the coordinator without opening a store"""
+    import main as notifier_main
+    from profiles import Profile
+    from shards import plan_shards
+
+    profile = Profile(name="default", keywords_ai='"GNN"', keywords_domain="", slack_channel="#papers", num_papers=5)
+    shards = plan_shards(["http://feed"], [profile], "feed", {"default": {"http://arxiv.org/abs/0"}})
+    assert shards[0]["existing_ids"] == {"default": ["http://arxiv.org/abs/0"]}
+
+    monkeypatch.setattr("main.PAPER_DB_PATH", None)
+    mock_feed = MagicMock()
+    mock_feed.entries = [
+        {'title': f'GNN paper {i}', 'summary': 'Abstract', 'link': f'http://arxiv.org/abs/{i}', 'published_parsed': None}
+        for i in range(2)
+    ]
+    with patch("config.PROFILES", [profile.__dict__]), patch("main.requests.get") as mock_get, \
+            patch("main.feedparser.parse", return_value=mock_feed):
+        mock_get.return_value.status_code = 200
+        result = notifier_main.run_worker(dict(shards[0], archive=False))
+    assert [p["entry_id"] for p in result["candidates"]["default"]] == ["http://arxiv.org/abs/1"]
+
+@patch("main.time.sleep")
+@patch("main.requests.get")
+@patch("main.feedparser.parse")
+@patch("main.slack_client")
+@patch("main.generate_paper_summary")
+@patch("main.mirror_to_sheets")
+@patch("main.get_existing_paper_ids")
+def test_worker_snapshots_are_archived_by_the_coordinator(mock_get_existing, mock_mirror, mock_gen, mock_slack,
+                                                          mock_feedparser, mock_requests, mock_sleep,
+                                                          mock_env, monkeypatch, tmp_path):
+    """Workers with their own archive directory return the raw feed; the coordinator archives and commits it"""
+    import main as notifier_main
+    from feed_archive import FeedArchive
+    from profiles import Profile
+
+    monkeypatch.setattr("main.RSS_FEEDS", ["http://feed"])
+    mock_get_existing.return_value = set()
+    mock_requests.return_value.status_code = 200
+    mock_requests.return_value.content = b"<rss>1</rss>"
+    mock_feed = MagicMock(bozo=False)
+    mock_feed.entries = [{'title': 'GNN paper', 'summary': 'Abstract', 'link': 'http://arxiv.org/abs/1',
+                          'published_parsed': None}]
+    mock_feedparser.return_value = mock_feed
+    mock_gen.return_value = PaperSummary(summary="S", importance=3, theme_id=1, reason="R")
+    mock_slack.chat_postMessage.return_value = {"ts": "1.0"}
+    profile = Profile(name="default", keywords_ai='"GNN"', keywords_domain="", slack_channel="#papers", num_papers=1)
+    coordinator_dir = notifier_main.FEED_ARCHIVE_DIR
+    worker_dir = str(tmp_path / "worker_tmp")
+    shard_payloads = []
+
+    def invoke_elsewhere(shards):
+        # Workers run in another container: a different (empty) archive directory
+        shard_payloads.extend(shards)
+        with patch("main.FEED_ARCHIVE_DIR", worker_dir):
+            return [json.loads(json.dumps(notifier_main.run_worker(shard))) for shard in shards]
+
+    with patch("config.PROFILES", [profile.__dict__]):
+        assert notifier_main.run_profiles([profile], invoker=invoke_elsewhere)
+    archive = FeedArchive(coordinator_dir)
+    assert archive.previous_ids("http://feed") == {"http://arxiv.org/abs/1"}
+    assert [s.read_raw() for s in archive.iter_snapshots("http://feed")] == [b"<rss>1</rss>"]
+    assert not os.path.exists(worker_dir)
+
+    # The next run sends the committed snapshot to the workers, which skip its entries
+    mock_requests.return_value.content = b"<rss>2</rss>"
+    with patch("config.PROFILES", [profile.__dict__]):
+        assert notifier_main.run_profiles([profile], invoker=invoke_elsewhere, run_date="2026-01-02")
+    assert shard_payloads[-1]["previous_ids"] == {"http://feed": ["http://arxiv.org/abs/1"]}
+    assert mock_gen.call_count == 1
+    assert [s.read_raw() for s in archive.iter_snapshots("http://feed")] == [b"<rss>1</rss>", b"<rss>2</rss>"]
+
+def test_match_profiles_keeps_bounded_sample_with_spilled_abstracts():
+    """Streaming many matches keeps O(k) candidates whose abstracts are read back from the spill file"""
+    import tracemalloc
+    import main as notifier_main
+    from profiles import Profile
+
+    profile = Profile(name="default", keywords_ai='"GNN"', keywords_domain="", slack_channel="#papers", num_papers=3)
+
+    def stream(n):
+        for i in range(n):
+            yield {'title': f'GNN paper {i}', 'summary': f'Abstract {i} ' + 'x' * 2000,
+                   'link': f'http://arxiv.org/abs/{i}', 'published_parsed': None}
+
+    def peak(n):
+        tracemalloc.start()
+        result = notifier_main.match_profiles([("feed", stream(n))], [profile], sizes={"default": 5})
+        _, peak_bytes = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return result["default"], peak_bytes
+
+    small_sample, small_peak = peak(500)
+    large_sample, large_peak = peak(5000)
+
+    assert (small_sample.seen, len(small_sample.items())) == (500, 5)
+    assert large_sample.seen == 5000
+    papers = large_sample.items()
+    assert len(papers) == 5
+    assert len({p.entry_id for p in papers}) == 5
+    assert papers[0].summary.startswith(f"Abstract {papers[0].entry_id.rsplit('/', 1)[1]} ")
+    assert not hasattr(papers[0], "__dict__")
+    # Ten times the stream must not mean ten times the memory
+    assert large_peak < small_peak * 2
+
+def test_feeds_are_matched_one_at_a_time(mock_env):
+    """Each feed is matched and dropped before the next one is downloaded"""
+    import main as notifier_main
+    from profiles import Profile
+    from selection import AbstractSpill
+
+    profile = Profile(name="default", keywords_ai='"GNN"', keywords_domain="", slack_channel="#papers", num_papers=3)
+    events = []
+
+    def get(url, **kwargs):
+        events.append(("get", url))
+        return MagicMock(status_code=200 if url != "http://feed/2" else 503, content=url.encode())
+
+    def parse(content):
+        i = content.decode().rsplit("/", 1)[1]
+        return MagicMock(bozo=False, entries=[{'title': f'GNN paper {i}', 'summary': 'Abstract',
+                                               'link': f'http://arxiv.org/abs/{i}', 'published_parsed': None}])
+
+    def matches(text, *args):
+        events.append(("match", text.split()[2]))
+        return True
+
+    stats = {}
+    urls = ["http://feed/1", "http://feed/2", "http://feed/3"]
+    with patch("main.requests.get", side_effect=get), patch("main.feedparser.parse", side_effect=parse), \
+            patch("main.matches_query", side_effect=matches), patch("main.time.sleep"), \
+            patch.dict(notifier_main.config.RESILIENCE["feeds"], max_attempts=1):
+        result = notifier_main.match_profiles(notifier_main.fetch_feeds(urls, stats=stats), [profile])
+    assert events == [("get", "http://feed/1"), ("match", "1"), ("get", "http://feed/2"),
+                      ("get", "http://feed/3"), ("match", "3")]
+    assert stats == {"failed": ["http://feed/2"], "unchanged": []}
+    assert result["default"].seen == 2
+
+    with AbstractSpill() as spill:
+        ref = spill.put("abstract")
+        assert spill.get(ref) == "abstract"
+    assert spill._file.closed
+
+def test_dependency_retries_by_error_class_and_breaker_fails_fast():
+    """Transient errors are retried, permanent ones are not, and an open breaker rejects calls until reset"""
+    import resilience
+
+    clock = [0.0]
+    dep = resilience.Dependency("test", timeout_sec=5, max_attempts=3, failure_threshold=3,
+                                reset_timeout_sec=60, backoff_sec=0)
+    dep.breaker._clock = lambda: clock[0]
+
+    def failing(exc):
+        def call(timeout):
+            raise exc
+        return call
+
+    attempts = iter([TimeoutError("slow"), resilience.HTTPStatusError(503), "ok"])
+
+    def flaky(timeout):
+        result = next(attempts)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    with patch("resilience.time.sleep") as mock_sleep:
+        assert dep.call(flaky) == "ok"
+    assert mock_sleep.call_count == 2
+    assert dep.snapshot()["retries"] == 2
+
+    with pytest.raises(resilience.HTTPStatusError):
+        dep.call(failing(resilience.HTTPStatusError(404)))
+    assert dep.snapshot()["calls"] == 4  # not retried
+    assert dep.breaker.state == resilience.CLOSED
+
+    with patch("resilience.time.sleep"), pytest.raises(ConnectionError):
+        dep.call(failing(ConnectionError("down")))
+    assert dep.breaker.state == resilience.OPEN
+    with pytest.raises(resilience.CircuitOpenError):
+        dep.call(lambda timeout: "never called")
+    assert dep.snapshot()["rejected"] == 1
+
+    clock[0] = 61
+    assert dep.breaker.state == resilience.HALF_OPEN
+    assert dep.call(lambda timeout: "trial") == "trial"
+    assert dep.breaker.state == resilience.CLOSED
+
+    # Attempt timeouts are shortened to the invocation deadline
+    resilience.set_deadline(lambda: 7.0)
+    try:
+        assert dep.call(lambda timeout: timeout) == 2.0
+        resilience.set_deadline(lambda: 4.0)
+        with pytest.raises(resilience.DeadlineExceeded):
+            dep.call(lambda timeout: "too late")
+    finally:
+        resilience.set_deadline(None)
+
+def test_non_idempotent_calls_retry_only_unsent_requests(mock_env):
+    """Posts and appends are not repeated after a timeout, only after a rejection or a failed connect"""
+    import urllib.error
+
+    import main as notifier_main
+    import resilience
+
+    dep = resilience.Dependency("test", timeout_sec=5, max_attempts=3, failure_threshold=5,
+                                reset_timeout_sec=60, backoff_sec=0)
+    calls = []
+
+    def failing_once(exc):
+        def call(timeout):
+            calls.append(timeout)
+            if len(calls) == 1:
+                raise exc
+            return "ok"
+        return call
+
+    with pytest.raises(TimeoutError):
+        dep.call(failing_once(TimeoutError("read timed out")), idempotent=False)
+    assert len(calls) == 1
+
+    with patch("resilience.time.sleep"):
+        calls.clear()
+        assert dep.call(failing_once(resilience.HTTPStatusError(429, 0)), idempotent=False) == "ok"
+        calls.clear()
+        refused = urllib.error.URLError(ConnectionRefusedError(111, "refused"))
+        assert dep.call(failing_once(refused), idempotent=False) == "ok"
+    assert len(calls) == 2
+
+    # The Slack client gets the attempt timeout, and a timed-out post is not sent again
+    with patch("main.slack_client") as mock_slack:
+        mock_slack.chat_postMessage.side_effect = TimeoutError("read timed out")
+        with pytest.raises(TimeoutError):
+            notifier_main.post_to_slack(channel="#c", text="t")
+        assert mock_slack.chat_postMessage.call_count == 1
+        assert mock_slack.timeout == notifier_main.config.RESILIENCE["slack"]["timeout_sec"]
+
+def test_sheets_requests_use_the_attempt_timeout(mock_env):
+    """Sheets requests run over an HTTP connection bounded by the attempt timeout"""
+    import replication
+
+    request = MagicMock()
+    request.execute.return_value = {"ok": True}
+    assert replication.execute_with_retry(request) == {"ok": True}
+    http = request.execute.call_args.kwargs["http"]
+    assert http.http.timeout == replication.config.RESILIENCE["sheets"]["timeout_sec"]
+
+@patch("main.time.sleep")
+@patch("main.requests.get")
+@patch("main.slack_client")
+@patch("main.get_existing_paper_ids")
+def test_feed_breaker_skips_remaining_feeds_when_arxiv_is_down(mock_get_existing, mock_slack, mock_requests,
+                                                              mock_sleep, mock_env):
+    """Once the feed breaker opens, the remaining feeds are skipped without waiting for timeouts"""
+    import requests
+    import main as notifier_main
+
+    mock_get_existing.return_value = set()
+    mock_requests.side_effect = requests.exceptions.ConnectTimeout("connect timeout")
+
+    notifier_main.main("#papers", "query", 5, 1)
+
+    assert mock_requests.call_count == 3  # 2 attempts for the first feed, 1 for the second
+    assert notifier_main.resilience.snapshot()["feeds"]["state"] == "open"
+    assert notifier_main.resilience.snapshot()["feeds"]["rejected"] == 2
+    assert "全フィード" in mock_slack.chat_postMessage.call_args.kwargs["text"]
+
+def test_saving_a_posted_paper_twice_counts_one_post(mock_paper):
+    """Re-saving a posted paper updates its row without incrementing the theme's post count"""
+    store = PaperStore(":memory:")
+    store.save_paper(mock_paper, PaperSummary(summary="S", importance=3, theme_id=1, reason="R"), "")
+    assert store.theme_engagement() == {}
+
+    for _ in range(2):
+        store.save_paper(mock_paper, PaperSummary(summary="S2", importance=3, theme_id=1, reason="R"), "1.0")
+    assert store.theme_engagement() == {1: (1, 0.0)}
+    assert [row[0] for row in store.conn.execute("SELECT summary FROM papers")] == ["S2"]
+
+def test_theme_weights_follow_materialized_engagement(tmp_path, mock_paper):
+    """Posts counted by the notifier and scores summed by the listener become O(1) theme weights"""
+    from engagement import ThemeWeights
+
+    store = PaperStore(str(tmp_path / "papers.sqlite3"))
+    for i in range(3):
+        mock_paper.entry_id = f"http://arxiv.org/abs/{i}"
+        store.save_paper(mock_paper, PaperSummary(summary="S", importance=3, theme_id=1, reason="R"), f"{i}.0")
+        mock_paper.entry_id = f"http://arxiv.org/abs/1{i}"
+        store.save_paper(mock_paper, PaperSummary(summary="S", importance=3, theme_id=3, reason="R"), f"1{i}.0")
+    store.save_paper(mock_paper, PaperSummary(summary="S", importance=None, theme_id=None, reason="R"), "")
+    # Score sums as maintained by the listener's reaction rollup
+    store.conn.execute("UPDATE theme_engagement SET score_sum = 6 WHERE theme_id = 1")
+    store.conn.execute("UPDATE theme_engagement SET score_sum = 0 WHERE theme_id = 3")
+    store.conn.execute(
+        "INSERT INTO reaction_rollup (slack_ts, counts, reactions, users, score, updated_at)"
+        " VALUES ('0.0', '{\"🎉\": 2}', 2, 2, 2.0, 'now')")
+
+    assert store.theme_engagement() == {1: (3, 6.0), 3: (3, 0.0)}
+    assert store.engagement("0.0") == {"counts": {"🎉": 2}, "reactions": 2, "users": 2, "score": 2.0}
+    assert store.pending_reaction_ts(10) == ["0.0"]
+
+    weights = ThemeWeights.from_store(store, "default")
+    assert weights.weight(1) == 1.0
+    assert weights.weight(3) == pytest.approx(0.3)
+    assert weights.weight(0) == 1.0  # never posted
+    assert weights.weight(None) == 1.0
+
+@patch("main.time.sleep")
+@patch("main.random.random", return_value=0.9)
+@patch("main.slack_client")
+@patch("main.generate_paper_summary")
+def test_post_profile_defers_low_engagement_themes(mock_gen, mock_slack, mock_random, mock_sleep, mock_env):
+    """A paper of a rarely reacted theme is deferred before it is summarized and posted after the others"""
+    from datetime import datetime, timezone
+    import main as notifier_main
+    from profiles import Profile
+
+    store = PaperStore(notifier_main.PAPER_DB_PATH)
+    store.conn.executemany(
+        "INSERT INTO theme_engagement (profile, theme_id, posts, score_sum) VALUES ('default', ?, 5, ?)",
+        [(1, 10.0), (3, 0.0)])
+    store.conn.commit()
+
+    papers = [notifier_main.Paper(f"Paper {i}", abstract, f"http://arxiv.org/abs/{i}", datetime.now(timezone.utc))
+              for i, abstract in enumerate(["Federated learning with privacy", "Contrastive embedding"])]
+    mock_gen.side_effect = lambda title, abstract, **kwargs: PaperSummary(
+        summary="S", importance=3, theme_id=3 if title == "Paper 0" else 1, reason="R")
+    mock_slack.chat_postMessage.return_value = {"ts": "1.0"}
+    profile = Profile(name="default", keywords_ai="", keywords_domain="", slack_channel="#papers", num_papers=2)
+
+    with patch("main.random.shuffle"):
+        sent, finished = notifier_main.post_profile(profile, papers, set(), store, {})
+
+    assert (sent, finished) == (2, True)
+    posted_titles = [c.kwargs["text"] for c in mock_slack.chat_postMessage.call_args_list[:2]]
+    assert "Paper 1" in posted_titles[0] and "Paper 0" in posted_titles[1]
+    # The theme is estimated from keywords, so the deferred paper is summarized only once, when it is posted
+    assert [c.args[0] for c in mock_gen.call_args_list] == ["Paper 1", "Paper 0"]
+
+def test_estimate_theme_from_keywords():
+    """Keyword rules give a theme without the LLM; unmatched papers count as other"""
+    from engagement import estimate_theme
+
+    assert estimate_theme("Differential Privacy for Trajectories", "") == 3
+    assert estimate_theme("Traffic", "We learn a self-supervised embedding") == 1
+    assert estimate_theme("Traffic Prediction", "A graph model") == 0
+
+def test_publish_registry_lists_recent_posts_by_channel_id(tmp_path, mock_paper):
+    """The registry holds sorted channel:ts keys of recent posts; rows recorded with a channel name match any channel"""
+    import time
+    from registry import publish_registry
+
+    now = int(time.time())
+    store = PaperStore(str(tmp_path / "papers.sqlite3"))
+    for i, (ts, channel) in enumerate([(f"{now}.0002", "C123"), (f"{now - 10}.0001", "#general"),
+                                       (f"{now - 400 * 86400}.0003", "C123"), ("", "C123")]):
+        mock_paper.entry_id = f"http://arxiv.org/abs/{i}"
+        store.save_paper(mock_paper, PaperSummary("S", 4, 1, "R"), ts, channel)
+
+    path = tmp_path / "shared" / "posted_messages.txt"
+    assert publish_registry(store, str(path), retention_days=180) == 2
+    assert path.read_text().splitlines() == [f"*:{now - 10}.0001", f"C123:{now}.0002"]
+
+@patch("main.time.sleep")
+@patch("main.slack_client")
+@patch("main.generate_paper_summary")
+def test_post_profile_publishes_registry_after_each_post(mock_gen, mock_slack, mock_sleep, mock_env, monkeypatch,
+                                                         tmp_path):
+    """Each post is in the registry before the next paper is handled, even if the invocation dies later"""
+    import time
+    from datetime import datetime, timezone
+    import main as notifier_main
+    from profiles import Profile
+
+    path = tmp_path / "posted_messages.txt"
+    monkeypatch.setattr("main.POSTED_REGISTRY_PATH", str(path))
+    store = PaperStore(notifier_main.PAPER_DB_PATH)
+    papers = [notifier_main.Paper(f"Paper {i}", "Abstract", f"http://arxiv.org/abs/{i}", datetime.now(timezone.utc))
+              for i in range(2)]
+    mock_gen.return_value = PaperSummary(summary="S", importance=3, theme_id=1, reason="R")
+    ts = f"{time.time():.4f}"
+    registered = []
+
+    def post(**kwargs):
+        registered.append(path.read_text().splitlines() if path.exists() else [])
+        if len(registered) == 2:
+            raise KeyboardInterrupt  # Lambda killed the invocation
+        return {"ts": ts, "channel": "C123"}
+
+    mock_slack.chat_postMessage.side_effect = post
+    profile = Profile(name="default", keywords_ai="", keywords_domain="", slack_channel="#papers", num_papers=2)
+    with pytest.raises(KeyboardInterrupt):
+        notifier_main.post_profile(profile, papers, set(), store, {})
+
+    assert registered == [[], [f"C123:{ts}"]]
+    assert path.read_text().splitlines() == [f"C123:{ts}"]
+
+def _pdf_with_pages(pages):
+    """Builds a minimal PDF with one line of text per page."""
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for text in pages:
+        stream = f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents {len(objects)} 0 R"
+                       " /Resources << /Font << /F1 3 0 R >> >> >>")
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>"
+    out, offsets = b"%PDF-1.4\n", []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1")
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1")
+    out += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode("latin-1")
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode("latin-1")
+    return out
+
+
+@pytest.fixture
+def pdf_server():
+    """Local HTTP stand-in for arxiv.org/pdf: serves `routes` and records every requested path."""
+    import threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    routes, hits = {}, []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            hits.append(self.path)
+            body = routes.get(self.path)
+            self.send_response(200 if body is not None else 404)
+            self.send_header("Content-Length", str(len(body or b"")))
+            self.end_headers()
+            self.wfile.write(body or b"")
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}", routes, hits
+    server.shutdown()
+    server.server_close()
+
+
+def test_pdf_cache_downloads_once_and_enforces_size_cap(pdf_server, tmp_path):
+    """PDFs are stored by content hash, looked up by URL, and oversized downloads leave nothing behind"""
+    from fulltext import PdfCache, PdfTooLargeError
+
+    base_url, routes, hits = pdf_server
+    routes["/pdf/a"] = routes["/pdf/a-mirror"] = b"%PDF-1.4 same bytes"
+    routes["/pdf/huge"] = b"x" * 2048
+    cache = PdfCache(str(tmp_path / "pdf_cache"))
+
+    digest = cache.download(f"{base_url}/pdf/a", max_bytes=1024, timeout=5)
+    assert cache.lookup(f"{base_url}/pdf/a") == digest
+    assert cache.download(f"{base_url}/pdf/a-mirror", max_bytes=1024, timeout=5) == digest
+    assert os.listdir(tmp_path / "pdf_cache" / "objects") == [f"{digest}.pdf"]
+    assert cache.lookup(f"{base_url}/pdf/unknown") is None
+
+    with pytest.raises(PdfTooLargeError):
+        cache.download(f"{base_url}/pdf/huge", max_bytes=1024, timeout=5)
+    assert sorted(os.listdir(tmp_path / "pdf_cache")) == ["objects", "refs"]
+    assert hits == ["/pdf/a", "/pdf/a-mirror", "/pdf/huge"]
+
+
+def test_enrich_full_text_extracts_introduction_and_conclusion(pdf_server, tmp_path, mock_env, monkeypatch):
+    """Selected papers get an intro/conclusion excerpt; the second run is served from the cache"""
+    from fulltext import enrich_full_text
+
+    base_url, routes, hits = pdf_server
+    monkeypatch.setattr("config.FULLTEXT_PDF_URL", base_url + "/pdf/{arxiv_id}")
+    monkeypatch.setattr("config.FULLTEXT_HEAD_PAGES", 1)
+    monkeypatch.setattr("config.FULLTEXT_TAIL_PAGES", 1)
+    routes["/pdf/2601.0001"] = _pdf_with_pages(
+        ["1 Introduction We study traffic.", "3 Method Middle pages are skipped.", "6 Conclusion It works."])
+
+    entry_ids = ["http://arxiv.org/abs/2601.0001", "http://arxiv.org/abs/2601.0404"]
+    excerpts = enrich_full_text(entry_ids, str(tmp_path / "pdf_cache"))
+    assert list(excerpts) == ["http://arxiv.org/abs/2601.0001"]
+    assert "Introduction We study traffic." in excerpts[entry_ids[0]]
+    assert "Conclusion It works." in excerpts[entry_ids[0]]
+    assert "Middle" not in excerpts[entry_ids[0]]
+
+    assert enrich_full_text(entry_ids[:1], str(tmp_path / "pdf_cache")) == excerpts
+    assert hits.count("/pdf/2601.0001") == 1
+
+def test_history_export_is_incremental_and_partitioned_by_month(tmp_path, mock_paper):
+    """Typed month partitions; each run only exports rows recorded after the previous watermark"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    from export import HistoryExporter
+
+    store = PaperStore(str(tmp_path / "papers.sqlite3"))
+    for entry_id, ts, created_at in [("1", "1.0", "2026-01-31T23:00:00+00:00"), ("2", "2.0", "2026-02-01T09:00:00+00:00")]:
+        mock_paper.entry_id = f"http://arxiv.org/abs/{entry_id}"
+        store.save_paper(mock_paper, PaperSummary("S", 4, 1, "R"), ts, "C123")
+        store.conn.execute("UPDATE papers SET created_at = ? WHERE slack_ts = ?", (created_at, ts))
+    store.conn.execute(
+        "INSERT INTO reaction_rollup (slack_ts, theme_id, counts, reactions, users, score, updated_at)"
+        " VALUES ('1.0', 1, '{\"🎉\": 2}', 2, 2, 2.0, '2026-02-02T00:00:00+00:00')")
+    store.conn.commit()
+
+    exporter = HistoryExporter(store, str(tmp_path / "export"), settle_sec=0)
+    assert exporter.run() == {"papers": 2, "reactions": 1, "files": 3}
+
+    january = pq.read_table(tmp_path / "export" / "papers" / "month=2026-01")
+    assert january.column("entry_id").to_pylist() == ["http://arxiv.org/abs/1"]
+    assert january.schema.field("published").type == pa.date32()
+    assert january.schema.field("importance").type == pa.int32()
+    reactions = pq.read_table(tmp_path / "export" / "reactions" / "month=2026-02")
+    assert reactions.column("counts").to_pylist() == [[("🎉", 2)]]
+
+    assert exporter.run() == {"papers": 0, "reactions": 0, "files": 0}
+    mock_paper.entry_id = "http://arxiv.org/abs/3"
+    store.save_paper(mock_paper, PaperSummary("S", None, None, "R"), "3.0", "C123")
+    assert exporter.run() == {"papers": 1, "reactions": 0, "files": 1}
+    assert len(list((tmp_path / "export" / "papers").glob("month=*/part-*.parquet"))) == 3
+
+def test_history_export_requires_durable_root(tmp_path, monkeypatch):
+    """The export root must be configured; ephemeral Lambda storage is rejected, S3 URIs are not checked"""
+    from export import HistoryExporter
+    from storage import StoreNotConfiguredError, require_durable_path
+
+    store = PaperStore(":memory:")
+    with pytest.raises(StoreNotConfiguredError, match="EXPORT_DIR"):
+        HistoryExporter(store, None)
+    monkeypatch.setenv("AWS_LAMBDA_FUNCTION_NAME", "notifier")
+    with pytest.raises(StoreNotConfiguredError, match="ephemeral"):
+        HistoryExporter(store, "/tmp/export")
+    assert require_durable_path("s3://bucket/export", "EXPORT_DIR") == "s3://bucket/export"
+
+@patch("main.requests.get")
+@patch("main.feedparser.parse")
+@patch("main.generate_paper_summary")
+def test_poll_saves_feed_validators_only_after_queueing(mock_gen, mock_feedparser, mock_requests, mock_env, monkeypatch):
+    """A poll stopped by the budget keeps the old validators, so the next poll downloads and re-matches the feed"""
+    import main as notifier_main
+    from deadline import RunBudget
+    from profiles import Profile
+
+    monkeypatch.setattr("main.RSS_FEEDS", ["http://feed"])
+    mock_requests.return_value = MagicMock(status_code=200, content=b"<rss/>", headers={"ETag": '"v1"'})
+    mock_feed = MagicMock()
+    mock_feed.entries = [{'title': 'GNN for 6G', 'summary': 'Traffic', 'link': 'http://arxiv.org/abs/1',
+                          'published_parsed': None}]
+    mock_feedparser.return_value = mock_feed
+    mock_gen.return_value = PaperSummary(summary="S", importance=3, theme_id=1, reason="R")
+    profiles = [Profile(name="network", keywords_ai='"GNN"', keywords_domain='"6G"', slack_channel="#net", num_papers=1)]
+
+    exhausted = RunBudget(remaining_ms=lambda: 0)
+    assert notifier_main.poll_profiles(profiles, exhausted)["queued"] == 0
+    assert PaperStore(notifier_main.PAPER_DB_PATH).feed_validators("http://feed") == (None, None)
+
+    assert notifier_main.poll_profiles(profiles)["queued"] == 1
+    assert "If-None-Match" not in mock_requests.call_args.kwargs["headers"]
+    assert PaperStore(notifier_main.PAPER_DB_PATH).feed_validators("http://feed") == ('"v1"', None)
+
+@patch("main.enrich_full_text")
+@patch("main.requests.get")
+@patch("main.feedparser.parse")
+@patch("main.generate_paper_summary")
+def test_poll_enriches_only_the_shortlist(mock_gen, mock_feedparser, mock_requests, mock_enrich, mock_env, monkeypatch):
+    """Polls fetch full text only for the papers filling the remaining slots, not for the spares"""
+    import main as notifier_main
+    from profiles import Profile
+
+    monkeypatch.setattr("config.FULLTEXT_ENRICHMENT", True)
+    monkeypatch.setattr("config.SELECTION_SPARE_CANDIDATES", 2)
+    monkeypatch.setattr("main.RSS_FEEDS", ["http://feed"])
+    mock_requests.return_value = MagicMock(status_code=200, content=b"<rss/>", headers={})
+    mock_feed = MagicMock()
+    mock_feed.entries = [{'title': f'GNN for 6G {i}', 'summary': 'Traffic', 'link': f'http://arxiv.org/abs/{i}',
+                          'published_parsed': None} for i in range(5)]
+    mock_feedparser.return_value = mock_feed
+    mock_enrich.return_value = {}
+    mock_gen.return_value = PaperSummary(summary="S", importance=3, theme_id=1, reason="R")
+    profiles = [Profile(name="network", keywords_ai='"GNN"', keywords_domain='"6G"', slack_channel="#net", num_papers=1)]
+
+    assert notifier_main.poll_profiles(profiles)["queued"] == 3
+    (shortlist, _), _ = mock_enrich.call_args
+    assert len(shortlist) == 1
+    assert mock_gen.call_count == 3
+
+@patch("main.time.sleep")
+@patch("main.requests.get")
+@patch("main.feedparser.parse")
+@patch("main.slack_client")
+@patch("main.generate_paper_summary")
+@patch("main.mirror_to_sheets")
+@patch("main.get_existing_paper_ids")
+def test_poll_queues_summaries_and_scheduled_run_posts_them_without_llm(
+        mock_get_existing, mock_mirror, mock_gen, mock_slack, mock_feedparser, mock_requests, mock_sleep, mock_env):
+    """Polls use conditional requests and queue summarized matches; the scheduled run posts them without the LLM"""
+    import main as notifier_main
+    from profiles import Profile
+
+    mock_get_existing.return_value = set()
+    changed = MagicMock(status_code=200, content=b"<rss/>", headers={"ETag": '"v1"'})
+    unchanged = MagicMock(status_code=304, headers={})
+    mock_requests.return_value = changed
+    mock_feed = MagicMock()
+    mock_feed.entries = [{'title': 'GNN for 6G', 'summary': 'Traffic', 'link': 'http://arxiv.org/abs/1',
+                          'published_parsed': None}]
+    mock_feedparser.return_value = mock_feed
+    mock_gen.return_value = PaperSummary(summary="S", importance=3, theme_id=1, reason="R")
+    mock_slack.chat_postMessage.return_value = {"ts": "1.0", "channel": "C1"}
+    profiles = [Profile(name="network", keywords_ai='"GNN"', keywords_domain='"6G"', slack_channel="#net", num_papers=1)]
+    feeds = len(notifier_main.RSS_FEEDS)
+
+    assert notifier_main.poll_profiles(profiles) == {"unchanged_feeds": 0, "failed_feeds": 0, "queued": 1, "posted": 0}
+    mock_slack.chat_postMessage.assert_not_called()
+
+    mock_requests.return_value = unchanged
+    assert notifier_main.poll_profiles(profiles)["unchanged_feeds"] == feeds
+    assert mock_requests.call_args.kwargs["headers"]["If-None-Match"] == '"v1"'
+    assert mock_feedparser.call_count == feeds
+    assert mock_gen.call_count == 1
+
+    mock_requests.return_value = changed
+    assert notifier_main.run_profiles(profiles) is True
+    assert mock_gen.call_count == 1
+    assert mock_slack.chat_postMessage.call_args_list[0].kwargs["channel"] == "#net"
+    store = PaperStore(notifier_main.PAPER_DB_PATH)
+    assert store.existing_ids("network") == {"http://arxiv.org/abs/1"}
+    assert store.queued("network") == []
+
+@patch("main.time.sleep")
+@patch("main.requests.get")
+@patch("main.feedparser.parse")
+@patch("main.slack_client")
+@patch("main.generate_paper_summary")
+@patch("main.mirror_to_sheets")
+@patch("main.get_existing_paper_ids")
+@patch("main.config.POLL_POST_IMMEDIATELY", True)
+def test_poll_posts_immediately_within_daily_quota(
+        mock_get_existing, mock_mirror, mock_gen, mock_slack, mock_feedparser, mock_requests, mock_sleep, mock_env):
+    """In immediate mode new matches are posted as soon as they are polled, up to num_papers per day"""
+    import main as notifier_main
+    from profiles import Profile
+
+    mock_get_existing.return_value = set()
+    mock_requests.return_value = MagicMock(status_code=200, content=b"<rss/>", headers={})
+    mock_feed = MagicMock()
+    mock_feed.entries = [
+        {'title': 'GNN for 6G', 'summary': 'Traffic', 'link': 'http://arxiv.org/abs/1', 'published_parsed': None},
+        {'title': 'GNN for 5G', 'summary': 'Mobile', 'link': 'http://arxiv.org/abs/2', 'published_parsed': None},
+    ]
+    mock_feedparser.return_value = mock_feed
+    mock_gen.return_value = PaperSummary(summary="S", importance=3, theme_id=1, reason="R")
+    mock_slack.chat_postMessage.return_value = {"ts": "1.0", "channel": "C1"}
+    profiles = [Profile(name="network", keywords_ai='"GNN"', keywords_domain='"6G" OR "5G"', slack_channel="#net",
+                        num_papers=1)]
+
+    assert notifier_main.poll_profiles(profiles)["posted"] == 1
+    assert notifier_main.poll_profiles(profiles)["posted"] == 0
+    store = PaperStore(notifier_main.PAPER_DB_PATH)
+    assert len(store.existing_ids("network")) == 1
+    assert len(store.queued("network")) == 1
+
+class FakeSlackHistory:
+    """conversations.history over an in-memory channel, newest first, with one rate-limited call"""
+
+    def __init__(self, messages):
+        self.messages = sorted(messages, key=lambda m: float(m["ts"]), reverse=True)
+        self.calls = []
+        self.rate_limited = False
+
+    def conversations_history(self, channel, oldest, latest, inclusive, limit, cursor=None):
+        from slack_sdk.errors import SlackApiError
+
+        self.calls.append(cursor)
+        if not self.rate_limited:
+            self.rate_limited = True
+            raise SlackApiError("ratelimited", MagicMock(status_code=429, headers={"Retry-After": "2"}))
+        window = [m for m in self.messages if float(oldest) <= float(m["ts"]) <= float(latest)]
+        start = int(cursor or 0)
+        page = window[start:start + limit]
+        has_more = start + limit < len(window)
+        return {"messages": page, "has_more": has_more,
+                "response_metadata": {"next_cursor": str(start + limit) if has_more else ""}}
+
+@patch("resilience.time.sleep")
+@patch("replication.build_sheets_service")
+def test_reconciler_corrects_missed_reactions_in_one_batched_sheet_update(mock_build, mock_sleep, tmp_path,
+                                                                         mock_paper, mock_env):
+    """Paged history is diffed against the store; corrections update rollups and are written in one batch"""
+    import time
+    from reconcile import ReactionReconciler
+    from replication import mirror_reactions
+
+    now = int(time.time())
+    missed, extra, truncated, unchanged, old = (f"{now - d}.000100" for d in (300, 200, 100, 50, 30 * 86400))
+    store = PaperStore(str(tmp_path / "papers.sqlite3"))
+    for i, ts in enumerate((missed, extra, truncated, unchanged, old)):
+        mock_paper.entry_id = f"http://arxiv.org/abs/{i}"
+        store.save_paper(mock_paper, PaperSummary("S", 4, 1, "R"), ts, "C1")
+    store.apply_reaction_changes(missed, {("🎉", "U1")}, set())
+    store.apply_reaction_changes(extra, {("🔥", "U3")}, set())
+    store.apply_reaction_changes(truncated, {("👍", "U4")}, set())
+    store.apply_reaction_changes(unchanged, {("👀", "U2")}, set())
+    store.mark_reactions_mirrored([missed, extra, truncated, unchanged])
+
+    slack = FakeSlackHistory([
+        {"ts": missed, "reactions": [{"name": "tada", "users": ["U1"], "count": 1},
+                                     {"name": "eyes", "users": ["U2", "U5"], "count": 2}]},
+        {"ts": f"{now - 150}.000100", "text": "someone else's message"},
+        {"ts": extra},
+        # Slack lists only some users of a popular reaction: unlisted recorded users are kept
+        {"ts": truncated, "reactions": [{"name": "+1", "users": ["U1"], "count": 5}]},
+        {"ts": unchanged, "reactions": [{"name": "eyes", "users": ["U2"], "count": 1}]},
+    ])
+    page_sleeps = []
+    reconciler = ReactionReconciler(store, slack, page_size=2, page_interval_sec=1.5, sleep=page_sleeps.append)
+
+    stats = reconciler.run()
+    assert stats == {"channels": 1, "pages": 3, "messages": 4, "corrected": 3, "added": 3, "removed": 1,
+                     "failed_channels": 0, "status": "ok"}
+    assert slack.calls == [None, None, "2", "4"]
+    assert mock_sleep.call_args[0][0] >= 2  # waited for Retry-After
+    assert page_sleeps == [1.5, 1.5]
+    assert store.reactions_by_message([missed, extra, truncated]) == {
+        missed: {("🎉", "U1"), ("👀", "U2"), ("👀", "U5")},
+        extra: set(),
+        truncated: {("👍", "U1"), ("👍", "U4")},
+    }
+    assert store.engagement(missed) == {"counts": {"🎉": 1, "👀": 2}, "reactions": 3, "users": 3, "score": 3.0}
+    assert store.engagement(extra)["score"] == 0
+    assert store.theme_engagement() == {1: (5, 6.0)}
+
+    mock_values = mock_build.return_value.spreadsheets.return_value.values.return_value
+    mock_values.get.return_value.execute.return_value = {"values": [["Slack TS"], [missed], [extra], [truncated]]}
+    assert mirror_reactions(store, reconciler.corrected) == 3
+    mock_values.batchUpdate.assert_called_once()
+    assert mock_values.batchUpdate.call_args[1]["body"]["data"] == [  # history is returned newest first
+        {"range": "H4", "values": [["👍"]]},
+        {"range": "H3", "values": [[""]]},
+        {"range": "H2", "values": [["🎉, 👀"]]},
+    ]
+    assert store.pending_reaction_ts(10) == []
+    assert reconciler.run()["corrected"] == 0
+
+def test_reconciler_reports_an_empty_window(caplog):
+    """A store without posts in the window is reported as such instead of as a successful run"""
+    from reconcile import ReactionReconciler
+
+    slack = FakeSlackHistory([])
+    with caplog.at_level("WARNING", logger="reconcile"):
+        stats = ReactionReconciler(PaperStore(":memory:"), slack).run()
+    assert stats["status"] == "empty_window"
+    assert stats["channels"] == 0
+    assert slack.calls == []
+    assert "No notifier posts" in caplog.text